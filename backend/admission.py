@@ -0,0 +1,258 @@
+import asyncio
+import json
+import math
+import os
+import time
+from contextlib import asynccontextmanager
+
+from cache import LRUCache
+from metrics import ADMISSION_REJECTIONS, ADMISSION_WAIT_SECONDS, ADMISSIONS_IN_FLIGHT, record_stage
+
+class Overloaded(Exception):
+    """Raised when a request cannot be admitted; `retry_after` is in seconds."""
+
+    def __init__(self, reason, retry_after):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = retry_after
+
+# Concurrency gate
+
+class AdmissionGate:
+    """Bounds how many documents are extracted and analyzed at once in this process.
+
+    A slot is taken per document, around its extraction and analysis only, so
+    slow uploads and slow SSE readers do not hold one. Up to `max_concurrency`
+    documents run; up to `max_queue` more wait, each for at most `max_wait`
+    seconds. Anything beyond that is rejected at once with Overloaded, so a
+    spike turns into fast retries instead of every request slowing down
+    together. Retry-After is estimated from recent service times.
+    """
+
+    def __init__(self, max_concurrency=4, max_queue=8, max_wait=5.0):
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+        self.active = 0
+        self.waiting = 0
+        self.admitted = 0
+        self.rejected = {"queue_full": 0, "wait_timeout": 0}
+        # Moving average of how long an admitted request holds its slot
+        self.service_seconds = 1.0
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            max_concurrency=int(os.environ.get('ADMISSION_MAX_CONCURRENCY', str(min(8, 2 * (os.cpu_count() or 1))))),
+            max_queue=int(os.environ.get('ADMISSION_MAX_QUEUE', '16')),
+            max_wait=float(os.environ.get('ADMISSION_MAX_WAIT', '5')),
+        )
+
+    def retry_after(self):
+        """Seconds until a slot is likely free for a request arriving now."""
+        backlog = (self.waiting + 1) / self.max_concurrency
+        return max(1, math.ceil(backlog * self.service_seconds))
+
+    def reject(self, reason):
+        self.rejected[reason] += 1
+        ADMISSION_REJECTIONS.labels(reason).inc()
+        raise Overloaded(reason, self.retry_after())
+
+    @asynccontextmanager
+    async def admit(self, blocking=False, max_wait=None):
+        """Hold a slot for the duration of the block.
+
+        With `blocking` the caller is never turned away for a full queue and
+        waits for a slot for as long as it takes, or for at most `max_wait`
+        seconds when given: for batch items and queued jobs, whose documents
+        would otherwise fail only because others arrived first.
+        """
+        # Counted rather than read off the semaphore: `waiting` covers requests
+        # whose acquire has not run yet
+        if not blocking and self.active + self.waiting >= self.max_concurrency + self.max_queue:
+            self.reject("queue_full")
+        queued = time.perf_counter()
+        self.waiting += 1
+        try:
+            if max_wait is None:
+                max_wait = None if blocking else self.max_wait
+            await asyncio.wait_for(self._semaphore.acquire(), timeout=max_wait)
+        except asyncio.TimeoutError:
+            self.reject("wait_timeout")
+        finally:
+            self.waiting -= 1
+        started = time.perf_counter()
+        ADMISSION_WAIT_SECONDS.observe(started - queued)
+        record_stage("admission_wait", started - queued)
+        self.active += 1
+        self.admitted += 1
+        try:
+            with ADMISSIONS_IN_FLIGHT.track_inprogress():
+                yield
+        finally:
+            self.active -= 1
+            self._semaphore.release()
+            self.service_seconds += 0.2 * (time.perf_counter() - started - self.service_seconds)
+
+    def stats(self):
+        return {
+            "max_concurrency": self.max_concurrency,
+            "max_queue": self.max_queue,
+            "max_wait": self.max_wait,
+            "active": self.active,
+            "waiting": self.waiting,
+            "admitted": self.admitted,
+            "rejected": dict(self.rejected),
+            "service_seconds": self.service_seconds,
+        }
+
+# Per-client rate limits
+
+class TokenBucketLimiter:
+    """Token bucket per client key, held in this process.
+
+    Each client may make `burst` requests at once and `rate` per second after
+    that. Buckets of idle clients are dropped after `idle_ttl` seconds.
+    """
+
+    def __init__(self, rate, burst, max_clients=100_000, idle_ttl=3600, clock=time.monotonic):
+        self.rate = rate
+        self.burst = burst
+        self.clock = clock
+        self.limited = 0
+        self._buckets = LRUCache(max_size=max_clients, ttl=idle_ttl, clock=clock)
+
+    async def acquire(self, key):
+        """0 when a request from `key` may proceed, else the seconds until it may."""
+        now = self.clock()
+        tokens, updated = self._buckets.get(key) or (self.burst, now)
+        tokens = min(self.burst, tokens + (now - updated) * self.rate)
+        if tokens < 1:
+            self._buckets.set(key, (tokens, now))
+            self.limited += 1
+            return (1 - tokens) / self.rate
+        self._buckets.set(key, (tokens - 1, now))
+        return 0.0
+
+    async def aclose(self):
+        pass
+
+    def stats(self):
+        return {"backend": "memory", "rate": self.rate, "burst": self.burst,
+                "clients": len(self._buckets), "limited": self.limited}
+
+# KEYS[1] bucket hash; ARGV: rate, burst, now (seconds), ttl. Returns the wait in
+# milliseconds, 0 when a token was taken.
+_TOKEN_BUCKET_SCRIPT = """
+local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'updated')
+local rate, burst, now = tonumber(ARGV[1]), tonumber(ARGV[2]), tonumber(ARGV[3])
+local tokens = tonumber(bucket[1]) or burst
+local updated = tonumber(bucket[2]) or now
+tokens = math.min(burst, tokens + math.max(0, now - updated) * rate)
+local wait = 0
+if tokens < 1 then
+    wait = math.ceil((1 - tokens) / rate * 1000)
+else
+    tokens = tokens - 1
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'updated', tostring(now))
+redis.call('EXPIRE', KEYS[1], ARGV[4])
+return wait
+"""
+
+class RedisTokenBucketLimiter:
+    """Token bucket per client key in Redis, shared by every worker process.
+
+    The refill and take happen in one Lua script, so concurrent requests from
+    the same client across workers cannot both spend the last token.
+    """
+
+    def __init__(self, url, rate, burst, prefix="resume-ratelimit", idle_ttl=3600):
+        import redis.asyncio
+
+        self.redis = redis.asyncio.from_url(url)
+        self.rate = rate
+        self.burst = burst
+        self.prefix = prefix
+        self.idle_ttl = idle_ttl
+        self.limited = 0
+        self._take = self.redis.register_script(_TOKEN_BUCKET_SCRIPT)
+
+    async def acquire(self, key):
+        """0 when a request from `key` may proceed, else the seconds until it may."""
+        wait_ms = await self._take(keys=[f"{self.prefix}:{key}"], args=[self.rate, self.burst, time.time(), self.idle_ttl])
+        if wait_ms:
+            self.limited += 1
+        return int(wait_ms) / 1000
+
+    async def aclose(self):
+        await self.redis.aclose()
+
+    def stats(self):
+        return {"backend": "redis", "rate": self.rate, "burst": self.burst, "limited": self.limited}
+
+def create_rate_limiter():
+    """Limiter from RATE_LIMIT_PER_MINUTE (Redis-backed when RATE_LIMIT_REDIS_URL is set), or None."""
+    per_minute = float(os.environ.get('RATE_LIMIT_PER_MINUTE', '0'))
+    if per_minute <= 0:
+        return None
+    rate = per_minute / 60
+    burst = int(os.environ.get('RATE_LIMIT_BURST', str(max(1, int(per_minute // 6)))))
+    url = os.environ.get('RATE_LIMIT_REDIS_URL')
+    if url:
+        return RedisTokenBucketLimiter(url, rate, burst)
+    return TokenBucketLimiter(rate, burst)
+
+# Middleware
+
+class RateLimitMiddleware:
+    """ASGI middleware applying the per-client rate limiter to `endpoints`.
+
+    Runs before the body is read, so rejected uploads cost almost nothing.
+    Rate limited clients get 429 with Retry-After. Queued uploads (`?async=1`)
+    are limited like the others. The admission gate is not applied here but
+    around each document's extraction and analysis.
+    """
+
+    def __init__(self, app, endpoints, limiter, client_header="x-real-ip"):
+        self.app = app
+        self.endpoints = endpoints
+        self.limiter = limiter
+        self.client_header = client_header.lower().encode() if client_header else None
+
+    def client_key(self, scope):
+        if self.client_header:
+            for name, value in scope["headers"]:
+                if name == self.client_header:
+                    return value.decode("latin-1")
+        client = scope.get("client")
+        return client[0] if client else "unknown"
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] not in self.endpoints or scope["method"] != "POST":
+            await self.app(scope, receive, send)
+            return
+        wait = await self.limiter.acquire(self.client_key(scope))
+        if wait:
+            ADMISSION_REJECTIONS.labels("rate_limited").inc()
+            await self.reject(send, 429, "Too many requests. Please slow down.", wait)
+            return
+        await self.app(scope, receive, send)
+
+    async def reject(self, send, status, detail, retry_after):
+        body = json.dumps({"detail": detail}).encode()
+        await send({
+            "type": "http.response.start",
+            "status": status,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+                (b"retry-after", str(retry_after_header(retry_after)).encode()),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
+
+def retry_after_header(seconds):
+    """Whole seconds, at least 1, for a Retry-After header."""
+    return max(1, math.ceil(seconds))
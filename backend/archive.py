@@ -0,0 +1,65 @@
+"""Archive expired `resume_analyses` and `status_checks` documents, or restore an archive.
+
+Run from the backend directory. One archiver per deployment is enough:
+
+    ARCHIVE_DIR=/var/archive RETENTION_DAYS=365 python archive.py run
+    ARCHIVE_DIR=/var/archive RETENTION_DAYS=365 python archive.py run --once
+
+`run` archives every ARCHIVE_INTERVAL_SECONDS until stopped; `--once` suits
+cron. Each run also deletes GridFS resume texts past the analyses' TTL. `restore` loads archive files or directories back into the collections
+they came from (or into `--collection`):
+
+    python archive.py restore /var/archive/resume_analyses/2025-10-01
+"""
+import argparse
+import asyncio
+import logging
+import os
+import signal
+import sys
+
+import server
+from retention import Archiver, restore
+
+async def run(once):
+    if not server.retention_policy.archive_dir:
+        logging.error("archive.py run needs ARCHIVE_DIR")
+        return 1
+    await server.connect_db()
+    archiver = Archiver.from_env(server.db, server.analysis_store)
+    await archiver.policy.ensure_indexes(server.db)
+    if once:
+        counts = await archiver.run_once()
+        logging.info(f"Archived {counts}")
+    else:
+        task = asyncio.ensure_future(archiver.run_forever(float(os.environ.get('ARCHIVE_INTERVAL_SECONDS', '3600'))))
+        stop = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for signum in (signal.SIGTERM, signal.SIGINT):
+            loop.add_signal_handler(signum, stop.set)
+        await stop.wait()
+        logging.info("Stopping archiver")
+        task.cancel()
+    await server.shutdown_db_client()
+    return 0
+
+async def run_restore(paths, collection, batch_size):
+    await server.connect_db()
+    count = await restore(server.db, server.analysis_store, paths, collection, batch_size, policy=server.retention_policy)
+    logging.info(f"Restored {count} documents")
+    await server.shutdown_db_client()
+    return 0
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Archive expired documents or restore an archive")
+    commands = parser.add_subparsers(dest="command", required=True)
+    run_parser = commands.add_parser("run", help="archive expired documents")
+    run_parser.add_argument("--once", action="store_true", help="archive once and exit")
+    restore_parser = commands.add_parser("restore", help="load archive files back into Mongo")
+    restore_parser.add_argument("paths", nargs="+", help="archive files or directories")
+    restore_parser.add_argument("--collection", help="restore into this collection instead")
+    restore_parser.add_argument("--batch-size", type=int, default=500)
+    args = parser.parse_args()
+    if args.command == "run":
+        sys.exit(asyncio.run(run(args.once)))
+    sys.exit(asyncio.run(run_restore(args.paths, args.collection, args.batch_size)))
@@ -0,0 +1,38 @@
+"""Rebuild the analytics rollups (`stats_daily`, `stats_buzzwords`) from `resume_analyses`.
+
+Run from the backend directory, e.g. after deploying the rollups or changing
+the buzzword list:
+
+    python backfill_rollups.py --since 2026-01-01 --batch-size 500
+
+Days before today (UTC) are recounted in batches and replaced; today is left
+to the running API processes. Leave out days whose analyses were archived.
+"""
+import argparse
+import asyncio
+import logging
+import sys
+import time
+from datetime import datetime
+
+import server
+
+async def main(since, until, batch_size):
+    await server.connect_db()
+    await server.rollups.ensure_indexes()
+    started = time.perf_counter()
+    count = await server.rollups.backfill(server.analysis_store, since, until, batch_size=batch_size)
+    logging.info(f"Counted {count} analyses into the rollups in {time.perf_counter() - started:.1f}s")
+    await server.shutdown_db_client()
+    return 0
+
+def parse_day(value):
+    return datetime.strptime(value, "%Y-%m-%d")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Rebuild the analytics rollups from stored analyses")
+    parser.add_argument("--since", type=parse_day, help="first day to recount (YYYY-MM-DD)")
+    parser.add_argument("--until", type=parse_day, help="day to stop before (YYYY-MM-DD); defaults to today")
+    parser.add_argument("--batch-size", type=int, default=500)
+    args = parser.parse_args()
+    sys.exit(asyncio.run(main(args.since, args.until, args.batch_size)))
@@ -0,0 +1,160 @@
+import os
+import time
+from collections import OrderedDict
+from datetime import datetime
+
+from storage import pack_text, unpack_text
+
+# In-process LRU
+
+class LRUCache:
+    """Least-recently-used cache bounded by total size and entry age.
+
+    `sizeof` weighs each value (1 per entry by default), so the same class can
+    bound a cache by entry count or by characters of text held.
+    """
+
+    def __init__(self, max_size=1024, ttl=None, sizeof=None, clock=time.monotonic):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.sizeof = sizeof or (lambda value: 1)
+        self.clock = clock
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        entry = self._entries.get(key)
+        if entry is not None and self.ttl is not None and self.clock() - entry[2] > self.ttl:
+            self._remove(key)
+            entry = None
+        if entry is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[0]
+
+    def set(self, key, value):
+        size = self.sizeof(value)
+        if size > self.max_size:
+            # Never let one oversized value flush the whole cache
+            return
+        if key in self._entries:
+            self._remove(key)
+        self._entries[key] = (value, size, self.clock())
+        self.size += size
+        while self.size > self.max_size:
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+            self.evictions += 1
+
+    def _remove(self, key):
+        _, size, _ = self._entries.pop(key)
+        self.size -= size
+
+    def stats(self):
+        return {
+            "entries": len(self._entries),
+            "size": self.size,
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+# Content-addressed cache for extraction and analysis results
+
+class AnalysisCache:
+    """Cache of extracted text and finished analyses keyed by the upload's digest.
+
+    Each stage is looked up in an in-process LRU first and then in Mongo:
+    extracted text lives compressed in `extracted_texts` (keyed by digest) and
+    analyses are found through the AnalysisStore by (file_hash, analysis_version).
+    Text is cached independently of the analysis so a new analysis version can
+    reuse text without reparsing the document.
+    """
+
+    def __init__(self, store, text_cache=None, analysis_cache=None):
+        self.store = store
+        self.text_cache = text_cache or LRUCache(max_size=32_000_000, ttl=3600, sizeof=len)
+        self.analysis_cache = analysis_cache or LRUCache(max_size=4096, ttl=3600)
+        self.text_db_hits = 0
+        self.analysis_db_hits = 0
+
+    @classmethod
+    def from_env(cls, store):
+        ttl = float(os.environ.get('CACHE_TTL_SECONDS', '3600'))
+        return cls(
+            store,
+            text_cache=LRUCache(
+                max_size=int(os.environ.get('CACHE_TEXT_MAX_CHARS', '32000000')),
+                ttl=ttl,
+                sizeof=len,
+            ),
+            analysis_cache=LRUCache(
+                max_size=int(os.environ.get('CACHE_ANALYSIS_MAX_ENTRIES', '4096')),
+                ttl=ttl,
+            ),
+        )
+
+    @property
+    def db(self):
+        # Shares the store's database, so both follow `AnalysisStore.use_database`
+        return self.store.db
+
+    async def ensure_indexes(self):
+        await self.db.resume_analyses.create_index(
+            [("file_hash", 1), ("analysis_version", 1)],
+            name="file_hash_analysis_version",
+        )
+
+    async def get_text(self, digest):
+        text = self.text_cache.get(digest)
+        if text is not None:
+            return text
+        document = await self.db.extracted_texts.find_one({"_id": digest}, {"file_type": 0, "timestamp": 0})
+        if document is None:
+            return None
+        self.text_db_hits += 1
+        text = unpack_text(document)
+        self.text_cache.set(digest, text)
+        return text
+
+    async def put_text(self, digest, file_type, text):
+        self.text_cache.set(digest, text)
+        await self.db.extracted_texts.update_one(
+            {"_id": digest},
+            {"$setOnInsert": {**pack_text(text, self.store.codec), "file_type": file_type, "timestamp": datetime.utcnow()}},
+            upsert=True,
+        )
+
+    async def get_analysis(self, digest, version):
+        key = (digest, version)
+        analysis = self.analysis_cache.get(key)
+        if analysis is not None:
+            return analysis
+        document = await self.store.find_by_hash(digest, version)
+        if document is None:
+            return None
+        analysis = {field: document[field] for field in ("id", "roast", "review", "timestamp")}
+        self.analysis_db_hits += 1
+        self.analysis_cache.set(key, analysis)
+        return analysis
+
+    def put_analysis(self, digest, version, analysis):
+        self.analysis_cache.set((digest, version), analysis)
+
+    def stats(self):
+        text = self.text_cache.stats()
+        text["db_hits"] = self.text_db_hits
+        text["db_misses"] = text["misses"] - self.text_db_hits
+        analysis = self.analysis_cache.stats()
+        analysis["db_hits"] = self.analysis_db_hits
+        analysis["db_misses"] = analysis["misses"] - self.analysis_db_hits
+        return {"text": text, "analysis": analysis}
@@ -0,0 +1,184 @@
+import html
+import os
+import re
+from typing import NamedTuple, Optional
+from urllib.parse import parse_qs, urljoin, urlparse
+
+from cache import LRUCache
+
+# Link parsing
+
+FILE_ID = r"[-\w]{10,}"
+LINK_PATTERNS = [
+    # drive.google.com/file/d/<id>/view, docs.google.com/document/d/<id>/edit, ...
+    re.compile(rf"/(?:file|document)/(?:u/\d+/)?d/({FILE_ID})"),
+]
+
+class DriveError(Exception):
+    """Raised when a Drive link cannot be resolved to a downloadable file."""
+
+class DriveFileTooLarge(DriveError):
+    """Raised as soon as a download grows past the configured maximum size."""
+
+class DriveLink(NamedTuple):
+    file_id: str
+    # Google Docs documents have no file to download and are exported as DOCX instead
+    is_document: bool = False
+
+def parse_drive_link(link):
+    """The DriveLink for any common Drive/Docs share link, or a bare file id."""
+    link = (link or "").strip()
+    if re.fullmatch(FILE_ID, link):
+        return DriveLink(link)
+    url = urlparse(link)
+    if url.hostname not in ("drive.google.com", "docs.google.com", "drive.usercontent.google.com"):
+        raise DriveError(f"Not a Google Drive link: {link!r}")
+    for pattern in LINK_PATTERNS:
+        match = pattern.search(url.path)
+        if match:
+            return DriveLink(match.group(1), is_document="/document/" in url.path)
+    # drive.google.com/open?id=<id>, /uc?id=<id>&export=download
+    file_ids = parse_qs(url.query).get("id")
+    if file_ids and re.fullmatch(FILE_ID, file_ids[0]):
+        return DriveLink(file_ids[0])
+    raise DriveError(f"No file id in Google Drive link: {link!r}")
+
+# Confirmation page parsing
+
+FORM_ACTION = re.compile(r'<form[^>]*\baction="([^"]+)"', re.IGNORECASE)
+HIDDEN_INPUT = re.compile(r'<input[^>]*\btype="hidden"[^>]*>', re.IGNORECASE)
+INPUT_ATTRIBUTE = re.compile(r'\b(name|value)="([^"]*)"')
+CONFIRM_LINK = re.compile(r'href="(/uc\?export=download[^"]*confirm=[^"]*)"')
+
+def confirmation_request(page, page_url):
+    """The (url, params) that confirm a download from Drive's "can't scan for viruses" page.
+
+    Newer pages carry a form whose hidden inputs hold the confirm token; older
+    ones link to the download with `confirm=` in the query. None if neither.
+    """
+    action = FORM_ACTION.search(page)
+    if action:
+        params = {}
+        for element in HIDDEN_INPUT.findall(page):
+            attributes = dict(INPUT_ATTRIBUTE.findall(element))
+            if "name" in attributes:
+                params[attributes["name"]] = html.unescape(attributes.get("value", ""))
+        return urljoin(page_url, html.unescape(action.group(1))), params
+    link = CONFIRM_LINK.search(page)
+    if link:
+        return urljoin(page_url, html.unescape(link.group(1))), {}
+    return None
+
+# Download client
+
+class DriveFile(NamedTuple):
+    content: bytes
+    etag: Optional[str] = None
+    last_modified: Optional[str] = None
+
+class GoogleDriveClient:
+    """Downloads publicly shared Drive files over one pooled async HTTP client.
+
+    Downloads are streamed and abandoned as soon as they pass `max_size`. Files
+    are cached by id; a cached file is revalidated with If-None-Match /
+    If-Modified-Since and reused on 304 Not Modified.
+    """
+
+    def __init__(self, drive_url="https://drive.google.com", docs_url="https://docs.google.com",
+                 max_size=10 * 1024 * 1024, timeout=15.0, max_connections=16, cache_bytes=64 * 1024 * 1024):
+        self.drive_url = drive_url.rstrip("/")
+        self.docs_url = docs_url.rstrip("/")
+        self.max_size = max_size
+        self.timeout = timeout
+        self.max_connections = max_connections
+        self.cache = LRUCache(max_size=cache_bytes, sizeof=lambda file: len(file.content))
+        self.downloads = 0
+        self.revalidated = 0
+        self._client = None
+
+    @classmethod
+    def from_env(cls, max_size):
+        return cls(
+            drive_url=os.environ.get('GDRIVE_URL', 'https://drive.google.com'),
+            docs_url=os.environ.get('GDRIVE_DOCS_URL', 'https://docs.google.com'),
+            max_size=max_size,
+            timeout=float(os.environ.get('GDRIVE_TIMEOUT', '15')),
+            max_connections=int(os.environ.get('GDRIVE_MAX_CONNECTIONS', '16')),
+            cache_bytes=int(os.environ.get('GDRIVE_CACHE_BYTES', str(64 * 1024 * 1024))),
+        )
+
+    @property
+    def client(self):
+        if self._client is None:
+            import httpx
+
+            self._client = httpx.AsyncClient(
+                timeout=httpx.Timeout(self.timeout),
+                limits=httpx.Limits(max_connections=self.max_connections, max_keepalive_connections=self.max_connections),
+                follow_redirects=True,
+                headers={"User-Agent": "resume-roaster"},
+            )
+        return self._client
+
+    def download_url(self, link):
+        if link.is_document:
+            return f"{self.docs_url}/document/d/{link.file_id}/export", {"format": "docx"}
+        return f"{self.drive_url}/uc", {"export": "download", "id": link.file_id}
+
+    async def download(self, gdrive_link):
+        """The DriveFile for a share link, from the cache when Drive says it is unchanged."""
+        link = parse_drive_link(gdrive_link)
+        cached = self.cache.get(link.file_id)
+        headers = {}
+        if cached is not None:
+            if cached.etag:
+                headers["If-None-Match"] = cached.etag
+            if cached.last_modified:
+                headers["If-Modified-Since"] = cached.last_modified
+
+        url, params = self.download_url(link)
+        # At most one confirmation page before the file itself
+        for _ in range(2):
+            result = await self._fetch(url, params, headers)
+            if result is None:
+                self.revalidated += 1
+                return cached
+            if isinstance(result, DriveFile):
+                self.downloads += 1
+                self.cache.set(link.file_id, result)
+                return result
+            page, page_url = result
+            confirmation = confirmation_request(page, page_url)
+            if confirmation is None:
+                break
+            url, params = confirmation
+        raise DriveError(f"Google Drive file {link.file_id} is not publicly downloadable")
+
+    async def _fetch(self, url, params, headers):
+        """GET `url`: None on 304, (html, url) for an HTML page, else the DriveFile."""
+        async with self.client.stream("GET", url, params=params, headers=headers) as response:
+            if response.status_code == 304:
+                return None
+            if response.status_code in (401, 403, 404):
+                raise DriveError(f"Google Drive answered {response.status_code} for {url}")
+            response.raise_for_status()
+            declared = response.headers.get("Content-Length")
+            if declared and declared.isdigit() and int(declared) > self.max_size:
+                raise DriveFileTooLarge(f"Drive file exceeds the {self.max_size} byte limit")
+            body = bytearray()
+            async for chunk in response.aiter_bytes():
+                body.extend(chunk)
+                if len(body) > self.max_size:
+                    raise DriveFileTooLarge(f"Drive file exceeds the {self.max_size} byte limit")
+            if response.headers.get("Content-Type", "").startswith("text/html"):
+                # A sign-in, quota or "can't scan for viruses" page, not the file
+                return body.decode(response.encoding or "utf-8", errors="replace"), str(response.url)
+            return DriveFile(bytes(body), response.headers.get("ETag"), response.headers.get("Last-Modified"))
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    def stats(self):
+        return {"downloads": self.downloads, "revalidated": self.revalidated, "cache": self.cache.stats()}
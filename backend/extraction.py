@@ -0,0 +1,597 @@
+import asyncio
+import io
+import logging
+import multiprocessing
+import os
+import time
+from typing import NamedTuple, Optional
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+# PyPDF2 and python-docx are imported on first use (or by `preload_parsers`),
+# keeping them out of the web process's import time
+
+class BufferReader(io.RawIOBase):
+    """Seekable read-only file over a bytes-like object that never copies it."""
+
+    def __init__(self, buffer):
+        self._view = memoryview(buffer)
+        self._position = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def readinto(self, b):
+        end = min(self._position + len(b), len(self._view))
+        count = end - self._position
+        b[:count] = self._view[self._position:end]
+        self._position = end
+        return count
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_CUR:
+            offset += self._position
+        elif whence == io.SEEK_END:
+            offset += len(self._view)
+        self._position = max(0, offset)
+        return self._position
+
+    def tell(self):
+        return self._position
+
+    def close(self):
+        self._view.release()
+        super().close()
+
+def open_source(file_content):
+    """Open extractor input, which is either a file path or a bytes-like object."""
+    if isinstance(file_content, (str, os.PathLike)):
+        return open(file_content, "rb")
+    return BufferReader(file_content)
+
+# Text extractors
+
+class PageResult(NamedTuple):
+    number: int
+    # "text", "empty" (nothing extracted), "image" (no fonts, e.g. a scan),
+    # "ocr" (an image page read by the OCR fallback) or "error"
+    status: str
+    chars: int = 0
+    seconds: float = 0.0
+    error: Optional[str] = None
+    # Digest of an image page's content, the OCR cache key
+    digest: Optional[str] = None
+
+class ExtractionResult(NamedTuple):
+    text: str
+    # Page count, when the format has pages (PDF)
+    pages: Optional[int] = None
+    # True when `text` is a fallback message rather than the document's text
+    failed: bool = False
+    # One PageResult per page that was looked at (PDF)
+    page_results: tuple = ()
+    # True when the page or character budget cut the document short
+    truncated: bool = False
+    # Numbers of the pages whose text came from OCR
+    ocr_pages: tuple = ()
+
+# Budgets for PDF extraction: the analysis never needs more than a few thousand words
+PDF_MAX_PAGES = 50
+PDF_MAX_CHARS = 30_000
+
+PDF_SCANNED_MESSAGE = "Unable to extract text from this PDF. It might be scanned or image-based."
+PDF_CORRUPTED_MESSAGE = "Unable to extract text from this PDF. It might be corrupted or password-protected."
+
+class PdfChunk(NamedTuple):
+    page_count: int
+    # Text of each page in `page_results`, "" where there was none
+    texts: list
+    page_results: list
+
+def _resolve(value):
+    return value.get_object() if value is not None else None
+
+def page_has_fonts(page):
+    """Whether the page (or a form it draws) has fonts; without one it cannot show text.
+
+    Only looks at resource dictionaries, so image-only (scanned) pages are
+    recognized without parsing their content streams.
+    """
+    resources = _resolve(page.get("/Resources")) or {}
+    if "/Font" in resources:
+        return True
+    for xobject in (_resolve(resources.get("/XObject")) or {}).values():
+        xobject = _resolve(xobject)
+        if xobject.get("/Subtype") == "/Form" and "/Font" in (_resolve(xobject.get("/Resources")) or {}):
+            return True
+    return False
+
+def page_digest(page):
+    """Digest of what an image-only page draws: its size, content stream and images."""
+    import hashlib
+
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(repr([float(value) for value in page.mediabox]).encode())
+    contents = page.get_contents()
+    if contents is not None:
+        digest.update(contents.get_data())
+    resources = _resolve(page.get("/Resources")) or {}
+    for name, xobject in sorted((_resolve(resources.get("/XObject")) or {}).items()):
+        xobject = _resolve(xobject)
+        if xobject.get("/Subtype") == "/Image":
+            digest.update(name.encode())
+            digest.update(xobject.get_data())
+    return digest.hexdigest()
+
+def extract_pdf_pages(file_content, start, stop, max_chars=None, digests=False):
+    """Extract pages [start, stop) of a PDF, stopping early once `max_chars` are collected.
+
+    This is the unit of work the extraction pool runs in parallel. Errors on a
+    page are recorded in its PageResult; only an unreadable file raises.
+    Image-only pages get a `page_digest` (the OCR cache key) only with `digests`.
+    """
+    import PyPDF2
+
+    texts, results = [], []
+    chars = 0
+    with open_source(file_content) as source:
+        pdf_reader = PyPDF2.PdfReader(source)
+        page_count = len(pdf_reader.pages)
+        for number in range(start, min(stop, page_count)):
+            if max_chars is not None and chars >= max_chars:
+                break
+            began = time.perf_counter()
+            page_text = ""
+            digest = None
+            try:
+                page = pdf_reader.pages[number]
+                if not page_has_fonts(page):
+                    status = "image"
+                    if digests:
+                        digest = page_digest(page)
+                else:
+                    page_text = page.extract_text() or ""
+                    status = "text" if page_text else "empty"
+                error = None
+            except Exception as e:
+                status, error = "error", str(e)
+            texts.append(page_text)
+            results.append(PageResult(number, status, len(page_text), time.perf_counter() - began, error, digest))
+            chars += len(page_text) + 1 if page_text else 0
+    return PdfChunk(page_count, texts, results)
+
+def assemble_pdf(page_count, texts, page_results, max_chars=None):
+    """Join extracted pages once into an ExtractionResult, applying the budgets."""
+    for result in page_results:
+        if result.status == "error":
+            logging.error(f"Error extracting text from PDF page {result.number + 1}: {result.error}")
+    text = "".join(page_text + "\n" for page_text in texts if page_text)
+    truncated = len(page_results) < page_count
+    if max_chars is not None and len(text) > max_chars:
+        text = text[:max_chars]
+        truncated = True
+    # If neither PyPDF2 nor OCR found any text, provide a fallback message
+    if not text.strip():
+        return ExtractionResult(PDF_SCANNED_MESSAGE, page_count, failed=True, page_results=tuple(page_results))
+    ocr_pages = tuple(result.number for result in page_results if result.status == "ocr")
+    return ExtractionResult(text, page_count, page_results=tuple(page_results), truncated=truncated, ocr_pages=ocr_pages)
+
+def read_pdf(file_content, max_pages=PDF_MAX_PAGES, max_chars=PDF_MAX_CHARS):
+    """Extract text and per-page results from PDF file content, within the budgets."""
+    try:
+        chunk = extract_pdf_pages(file_content, 0, max_pages, max_chars)
+    except Exception as e:
+        logging.error(f"Error extracting text from PDF: {e}")
+        return ExtractionResult(PDF_CORRUPTED_MESSAGE, failed=True)
+    return assemble_pdf(chunk.page_count, chunk.texts, chunk.page_results, max_chars)
+
+def extract_text_from_pdf(file_content):
+    """Extract text from PDF file content."""
+    return read_pdf(file_content).text
+
+# DOCX limits: document.xml is inflated while it is parsed, so a small upload
+# could otherwise expand without bound (a "zip bomb")
+DOCX_MAX_XML_BYTES = int(os.environ.get('DOCX_MAX_XML_BYTES', str(32 * 1024 * 1024)))
+DOCX_MAX_RATIO = int(os.environ.get('DOCX_MAX_RATIO', '200'))
+
+DOCX_EMPTY_MESSAGE = "Unable to extract text from this DOCX. It might be empty or contain only images."
+DOCX_CORRUPTED_MESSAGE = "Unable to extract text from this DOCX. It might be corrupted or in an unsupported format."
+DOCX_TOO_LARGE_MESSAGE = "Unable to extract text from this DOCX. It expands to more data than we accept."
+
+WORD_NS = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+W_P, W_T, W_TAB, W_BR, W_CR = (WORD_NS + tag for tag in ("p", "t", "tab", "br", "cr"))
+W_TBL, W_TR, W_TC = (WORD_NS + tag for tag in ("tbl", "tr", "tc"))
+W_TYPE = WORD_NS + "type"
+# Drawings repeat text boxes in a legacy "fallback" copy, which is skipped
+MC_FALLBACK = "{http://schemas.openxmlformats.org/markup-compatibility/2006}Fallback"
+
+class DocxTooLarge(Exception):
+    """Raised when a DOCX part inflates past DOCX_MAX_XML_BYTES or DOCX_MAX_RATIO."""
+
+class LimitedReader(io.RawIOBase):
+    """Read-only wrapper raising DocxTooLarge once more than `limit` bytes are read."""
+
+    def __init__(self, raw, limit):
+        self._raw = raw
+        self._remaining = limit
+
+    def readable(self):
+        return True
+
+    def readinto(self, b):
+        count = self._raw.readinto(b)
+        self._remaining -= count
+        if self._remaining < 0:
+            raise DocxTooLarge("document.xml inflates past the size limit")
+        return count
+
+def check_docx_limits(archive, max_bytes=DOCX_MAX_XML_BYTES, max_ratio=DOCX_MAX_RATIO):
+    """Reject archives whose declared sizes exceed the limits, before inflating anything."""
+    total = sum(info.file_size for info in archive.infolist())
+    compressed = sum(info.compress_size for info in archive.infolist())
+    if total > max_bytes * 4 or archive.getinfo("word/document.xml").file_size > max_bytes:
+        raise DocxTooLarge(f"DOCX declares {total} uncompressed bytes")
+    if compressed and total / compressed > max_ratio:
+        raise DocxTooLarge(f"DOCX compression ratio {total / compressed:.0f} exceeds {max_ratio}")
+
+def iter_docx_blocks(file_content, max_bytes=DOCX_MAX_XML_BYTES, max_ratio=DOCX_MAX_RATIO):
+    """Yield the lines of a DOCX body in document order, stream-parsing word/document.xml.
+
+    Paragraphs are one line each; a table row is one line of its cells' text,
+    each followed by a space. A cell spanning several columns appears once in
+    the XML, and vertically merged continuation cells hold no text, so merged
+    cells are not repeated. Parsed elements are dropped as soon as they are
+    emitted, so memory stays flat however long the document is.
+    """
+    import zipfile
+    from xml.etree.ElementTree import iterparse
+
+    with open_source(file_content) as source, zipfile.ZipFile(source) as archive:
+        check_docx_limits(archive, max_bytes, max_ratio)
+        with archive.open("word/document.xml") as member:
+            # The declared sizes can lie, so the inflated stream is capped as well
+            stream = io.BufferedReader(LimitedReader(member, max_bytes))
+            # Each open table row, as [cells, parts of the cell being read]
+            rows = []
+            # Text of each open paragraph (text boxes nest paragraphs in paragraphs)
+            paragraphs = []
+            parents = []
+            skipping = 0
+            for event, element in iterparse(stream, events=("start", "end")):
+                tag = element.tag
+                if event == "start":
+                    parents.append(element)
+                    if tag == MC_FALLBACK:
+                        skipping += 1
+                    elif skipping:
+                        continue
+                    elif tag == W_TR:
+                        rows.append([[], []])
+                    elif tag == W_TC and rows:
+                        rows[-1][1] = []
+                    elif tag == W_P:
+                        paragraphs.append([])
+                    continue
+                parents.pop()
+                if tag == MC_FALLBACK:
+                    skipping -= 1
+                elif skipping:
+                    continue
+                elif tag == W_T and paragraphs:
+                    paragraphs[-1].append(element.text or "")
+                elif tag == W_TAB and paragraphs:
+                    paragraphs[-1].append("\t")
+                elif tag in (W_BR, W_CR) and paragraphs:
+                    # Page and column breaks are layout, not line breaks
+                    if element.get(W_TYPE) in (None, "textWrapping"):
+                        paragraphs[-1].append("\n")
+                elif tag == W_P:
+                    text = "".join(paragraphs.pop())
+                    if rows:
+                        rows[-1][1].append(text)
+                    elif text:
+                        yield text
+                elif tag == W_TC and rows:
+                    cells, parts = rows[-1]
+                    cells.append("\n".join(parts))
+                elif tag == W_TR and rows:
+                    cells = rows.pop()[0]
+                    line = "".join(cell + " " for cell in cells if cell)
+                    if rows:
+                        # A nested table's rows become paragraphs of the enclosing cell
+                        rows[-1][1].append(line)
+                    else:
+                        yield line
+                if tag in (W_P, W_TBL) and not rows and not paragraphs and parents:
+                    # Emitted in full; drop it so the tree never grows
+                    parents[-1].remove(element)
+
+def read_docx_document(file_content):
+    """Extract text with python-docx: paragraphs first, then each table row."""
+    import docx
+
+    with open_source(file_content) as source:
+        doc = docx.Document(source)
+    lines = [para.text for para in doc.paragraphs if para.text]
+    for table in doc.tables:
+        for row in table.rows:
+            lines.append("".join(cell.text + " " for cell in row.cells if cell.text))
+    return "".join(line + "\n" for line in lines)
+
+def read_docx(file_content):
+    """Extract text from DOCX file content (DOCX has no page count).
+
+    The streaming parser handles almost every file; python-docx is the
+    fallback for documents it cannot parse.
+    """
+    try:
+        text = "".join(line + "\n" for line in iter_docx_blocks(file_content))
+    except DocxTooLarge as e:
+        logging.error(f"Rejected DOCX: {e}")
+        return ExtractionResult(DOCX_TOO_LARGE_MESSAGE, failed=True)
+    except Exception as e:
+        logging.warning(f"Streaming DOCX extraction failed, falling back to python-docx: {e}")
+        try:
+            text = read_docx_document(file_content)
+        except Exception as e:
+            logging.error(f"Error extracting text from DOCX: {e}")
+            return ExtractionResult(DOCX_CORRUPTED_MESSAGE, failed=True)
+
+    # If no text was extracted, return a fallback message
+    if not text.strip():
+        return ExtractionResult(DOCX_EMPTY_MESSAGE, failed=True)
+    return ExtractionResult(text)
+
+def extract_text_from_docx(file_content):
+    """Extract text from DOCX file content."""
+    return read_docx(file_content).text
+
+EXTRACTORS = {
+    "pdf": read_pdf,
+    "docx": read_docx,
+}
+
+def run_extraction(file_type, file_content):
+    """Run the extractor for `file_type`; this is the unit of work sent to the pool.
+
+    Returns an ExtractionResult.
+    """
+    return EXTRACTORS[file_type](file_content)
+
+def preload_parsers():
+    """Import the parser libraries ahead of the first document (also the pool initializer)."""
+    import PyPDF2.filters  # noqa: F401
+    import docx.oxml  # noqa: F401
+
+# Extraction worker pool
+
+class ExtractionTimeout(Exception):
+    """Raised when a single extraction job exceeds the configured timeout."""
+
+def terminate_workers(executor):
+    """Kill a process pool's workers, e.g. one stuck in a parser."""
+    for process in list((executor._processes or {}).values()):
+        process.terminate()
+
+class ExtractionPool:
+    """Runs document extraction off the event loop.
+
+    The default is a process pool so PyPDF2/python-docx never hold the GIL of the
+    web worker. Workers preload the parser libraries and are recycled after about
+    `max_tasks_per_child` documents each to contain parser memory growth, and the
+    whole pool is replaced when a job exceeds `timeout` (a stuck parser cannot be
+    cancelled any other way).
+
+    Recycling swaps in a fresh, pre-warmed pool rather than using the executor's
+    own `max_tasks_per_child`: on Python 3.11 a pool whose workers are spawned on
+    demand may not replace a retired worker until more work is submitted, leaving
+    the last job of a quiet spell waiting until it times out. Either way the old
+    pool is retired: new documents go to the fresh pool, and the old one is shut
+    down (its processes killed, if a job there timed out) only once the
+    documents already running on it are done.
+
+    PDFs are split into chunks of `pdf_chunk_pages` pages that run on several
+    workers at once; no more than `pdf_max_pages` pages or `pdf_max_chars`
+    characters are extracted from one document. Pages without a text layer
+    then go to `ocr` (an ocr.OcrPool), if one is enabled; OCR runs outside the
+    extraction timeout, under its own budgets.
+    """
+
+    def __init__(self, kind="process", max_workers=None, timeout=30.0, max_tasks_per_child=50,
+                 pdf_max_pages=PDF_MAX_PAGES, pdf_max_chars=PDF_MAX_CHARS, pdf_chunk_pages=8, ocr=None):
+        if kind not in ("process", "thread"):
+            raise ValueError(f"Unknown extraction executor kind: {kind}")
+        self.kind = kind
+        self.max_workers = max_workers or min(4, os.cpu_count() or 1)
+        self.timeout = timeout
+        self.max_tasks_per_child = max_tasks_per_child
+        self.pdf_max_pages = pdf_max_pages
+        self.pdf_max_chars = pdf_max_chars
+        self.pdf_chunk_pages = max(1, pdf_chunk_pages)
+        self.ocr = ocr
+        self._executor = None
+        # Documents started on the current pool, and documents still running per pool
+        self._documents = 0
+        self._running = {}
+        self._retired = set()
+        # Retired pools with a worker stuck past the timeout, killed once drained
+        self._stuck = set()
+
+    @classmethod
+    def from_env(cls):
+        # Only the web process needs OCR; pool workers never import it
+        from ocr import OcrPool
+
+        workers = os.environ.get('EXTRACTION_WORKERS')
+        return cls(
+            kind=os.environ.get('EXTRACTION_EXECUTOR', 'process'),
+            max_workers=int(workers) if workers else None,
+            timeout=float(os.environ.get('EXTRACTION_TIMEOUT', '30')),
+            max_tasks_per_child=int(os.environ.get('EXTRACTION_MAX_TASKS_PER_CHILD', '50')),
+            pdf_max_pages=int(os.environ.get('PDF_MAX_PAGES', str(PDF_MAX_PAGES))),
+            pdf_max_chars=int(os.environ.get('PDF_MAX_CHARS', str(PDF_MAX_CHARS))),
+            pdf_chunk_pages=int(os.environ.get('PDF_CHUNK_PAGES', '8')),
+            ocr=OcrPool.from_env(),
+        )
+
+    def start(self):
+        if self._executor is not None:
+            return
+        if self.kind == "process":
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=preload_parsers,
+            )
+        else:
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.max_workers,
+                thread_name_prefix="extraction",
+                initializer=preload_parsers,
+            )
+
+    async def warm_up(self):
+        """Start the pool's workers and have each import the parsers."""
+        self.start()
+        if self.kind == "thread":
+            # Thread workers share this process's modules
+            await asyncio.to_thread(preload_parsers)
+            return
+        loop = asyncio.get_running_loop()
+        await asyncio.gather(*(
+            loop.run_in_executor(self._executor, preload_parsers) for _ in range(self.max_workers)
+        ))
+
+    def shutdown(self, wait=True):
+        executor, self._executor = self._executor, None
+        for retired in list(self._retired):
+            if retired in self._stuck:
+                terminate_workers(retired)
+            retired.shutdown(wait=wait, cancel_futures=True)
+        self._retired.clear()
+        self._stuck.clear()
+        self._running.clear()
+        self._documents = 0
+        if executor is not None:
+            executor.shutdown(wait=wait, cancel_futures=True)
+
+    def _checkout(self):
+        """The pool to extract one document on; hand it back with `_checkin`."""
+        self.start()
+        executor = self._executor
+        self._running[executor] = self._running.get(executor, 0) + 1
+        self._documents += 1
+        if self.kind == "process" and self.max_tasks_per_child and self._documents >= self.max_tasks_per_child * self.max_workers:
+            self._retire(executor)
+            loop = asyncio.get_running_loop()
+            for _ in range(self.max_workers):
+                loop.run_in_executor(self._executor, preload_parsers)
+        return executor
+
+    def _checkin(self, executor):
+        self._running[executor] = self._running.get(executor, 1) - 1
+        if self._running[executor] <= 0:
+            del self._running[executor]
+            if executor in self._retired:
+                self._close(executor)
+
+    def _retire(self, executor, stuck=False):
+        """Send later documents to a fresh pool; `executor` is closed once its documents are done.
+
+        `stuck` marks a pool with a worker that outlived the timeout: its
+        processes are killed when it closes.
+        """
+        if stuck:
+            self._stuck.add(executor)
+        if executor in self._retired:
+            return
+        self._retired.add(executor)
+        if self._executor is executor:
+            self._executor = None
+            self._documents = 0
+            self.start()
+        if executor not in self._running:
+            self._close(executor)
+
+    def _close(self, executor):
+        self._retired.discard(executor)
+        if executor in self._stuck:
+            self._stuck.discard(executor)
+            terminate_workers(executor)
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    async def _extract_pdf(self, executor, file_content):
+        """Extract a PDF in page chunks, up to `max_workers` chunks at a time.
+
+        Returns the pages as one PdfChunk, or a failed ExtractionResult for an
+        unreadable file.
+        """
+        loop = asyncio.get_running_loop()
+        chunk_pages = min(self.pdf_chunk_pages, self.pdf_max_pages)
+        # Hashing a scanned page's images is only worth it when OCR will read it
+        digests = self.ocr is not None and self.ocr.enabled
+        try:
+            # The first chunk also tells us how many pages there are
+            first = await loop.run_in_executor(
+                executor, extract_pdf_pages, file_content, 0, chunk_pages, self.pdf_max_chars, digests,
+            )
+        except BrokenProcessPool:
+            raise
+        except Exception as e:
+            logging.error(f"Error extracting text from PDF: {e}")
+            return ExtractionResult(PDF_CORRUPTED_MESSAGE, failed=True)
+        texts, page_results = list(first.texts), list(first.page_results)
+        chars = sum(result.chars + 1 for result in page_results if result.chars)
+        starts = list(range(chunk_pages, min(first.page_count, self.pdf_max_pages), chunk_pages))
+        while starts and chars < self.pdf_max_chars:
+            wave, starts = starts[:self.max_workers], starts[self.max_workers:]
+            chunks = await asyncio.gather(*(
+                loop.run_in_executor(
+                    executor, extract_pdf_pages, file_content, start,
+                    min(start + chunk_pages, self.pdf_max_pages), self.pdf_max_chars - chars, digests,
+                )
+                for start in wave
+            ))
+            for chunk in chunks:
+                texts.extend(chunk.texts)
+                page_results.extend(chunk.page_results)
+                chars += sum(result.chars + 1 for result in chunk.page_results if result.chars)
+        return PdfChunk(first.page_count, texts, page_results)
+
+    async def _run(self, executor, file_type, file_content):
+        if file_type == "pdf":
+            return await self._extract_pdf(executor, file_content)
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(executor, run_extraction, file_type, file_content)
+
+    async def extract(self, file_type, file_content):
+        """Extract `file_content` in the pool and return its ExtractionResult."""
+        self.start()
+        if self.kind == "process" and isinstance(file_content, memoryview):
+            # Views cannot be pickled; crossing the process boundary needs one copy
+            file_content = bytes(file_content)
+        for attempt in range(2):
+            executor = self._checkout()
+            try:
+                result = await asyncio.wait_for(self._run(executor, file_type, file_content), timeout=self.timeout)
+                break
+            except asyncio.TimeoutError:
+                logging.error(f"Extraction of {file_type} document timed out after {self.timeout}s")
+                self._retire(executor, stuck=self.kind == "process")
+                raise ExtractionTimeout(f"Extraction timed out after {self.timeout}s")
+            except BrokenProcessPool:
+                # A worker crashed: every document on this pool fails, so retry once on a fresh one
+                logging.error("Extraction pool broke, replacing it")
+                self._retire(executor)
+                if attempt:
+                    raise
+            finally:
+                self._checkin(executor)
+        if isinstance(result, PdfChunk):
+            if self.ocr is not None and self.ocr.enabled:
+                result = await self.ocr.fill(result, file_content)
+            result = assemble_pdf(result.page_count, result.texts, result.page_results, self.pdf_max_chars)
+        return result
@@ -0,0 +1,203 @@
+import hashlib
+import re
+from typing import Dict, NamedTuple, Tuple
+
+from text_scan import split_words
+
+# Section headings, by the canonical section they open
+SECTION_HEADINGS = {
+    "summary": "summary", "profile": "summary", "objective": "summary", "about me": "summary",
+    "professional summary": "summary", "career objective": "summary",
+    "experience": "experience", "work experience": "experience", "professional experience": "experience",
+    "employment": "experience", "employment history": "experience", "work history": "experience",
+    "education": "education", "academic background": "education",
+    "skills": "skills", "technical skills": "skills", "core competencies": "skills", "competencies": "skills",
+    "projects": "projects", "personal projects": "projects",
+    "certifications": "certifications", "certificates": "certifications", "licenses": "certifications",
+    "awards": "awards", "achievements": "awards", "honors": "awards",
+    "publications": "publications", "volunteering": "volunteering", "volunteer experience": "volunteering",
+    "languages": "languages", "interests": "interests", "hobbies": "interests",
+}
+EXPECTED_SECTIONS = ("experience", "education", "skills")
+
+ACTION_VERBS = frozenset("""
+accelerated achieved analyzed architected automated built championed coached collaborated created cut
+decreased delivered designed developed directed doubled drove eliminated engineered established expanded
+generated grew implemented improved increased introduced launched led maintained managed mentored
+migrated modernized negotiated optimized orchestrated organized oversaw pioneered planned produced
+reduced redesigned refactored resolved restructured revamped saved scaled secured shipped simplified
+spearheaded streamlined supervised taught tested trained transformed tripled won wrote
+""".split())
+
+BULLET_MARKERS = ("-", "*", "•", "▪", "●", "·", "–", "◦", "➢", "o ")
+
+MONTHS = {name: number for number, names in enumerate((
+    ("jan", "january"), ("feb", "february"), ("mar", "march"), ("apr", "april"), ("may",), ("jun", "june"),
+    ("jul", "july"), ("aug", "august"), ("sep", "sept", "september"), ("oct", "october"),
+    ("nov", "november"), ("dec", "december"),
+), start=1) for name in names}
+_MONTH = r"(?:jan(?:uary)?|feb(?:ruary)?|mar(?:ch)?|apr(?:il)?|may|june?|july?|aug(?:ust)?|sept?(?:ember)?|oct(?:ober)?|nov(?:ember)?|dec(?:ember)?)\.?"
+_DATE = rf"(?:{_MONTH}\s+(?:19|20)\d\d|(?:0?[1-9]|1[0-2])/(?:19|20)\d\d|(?:19|20)\d\d)"
+DATE_RANGE = re.compile(
+    rf"({_DATE})\s*(?:-|–|—|to|until)\s*({_DATE}|present|current|now|today)",
+    re.IGNORECASE,
+)
+# Percentages, money, multipliers and counts with units; bare years do not count
+QUANTITY = re.compile(
+    r"\d+(?:[.,]\d+)?\s*(?:%|percent|x\b|k\b|m\b|mm\b|bn\b|\+)|[$€£₹]\s?\d"
+    r"|\b(?!(?:19|20)\d\d\b)\d{2,}(?:,\d{3})*\b",
+    re.IGNORECASE,
+)
+# Cheap prefilters deciding which of the patterns above a line needs
+HAS_DIGIT = re.compile(r"\d").search
+HAS_YEAR = re.compile(r"(?:19|20)\d\d").search
+EMAIL = re.compile(r"[\w.+-]+@[\w-]+\.[\w.-]+")
+PHONE = re.compile(r"(?:\+?\d[\d\s().-]{7,}\d)")
+# An open-ended range ("2021 - Present") runs past every dated one
+OPEN_END = 10**6
+
+class ResumeFeatures(NamedTuple):
+    word_count: int
+    line_count: int
+    non_empty_line_count: int
+    term_counts: Dict[str, int]
+    sections: Tuple[str, ...]
+    bullet_count: int
+    action_bullet_count: int
+    quantified_count: int
+    date_ranges: Tuple[Tuple[int, int], ...]
+    longest_gap_months: int
+    has_email: bool
+    has_phone: bool
+    has_linkedin: bool
+    has_github: bool
+
+    @property
+    def buzzword_count(self):
+        return sum(self.term_counts.values())
+
+    @property
+    def bullet_density(self):
+        return self.bullet_count / self.non_empty_line_count if self.non_empty_line_count else 0.0
+
+    @property
+    def missing_sections(self):
+        return tuple(section for section in EXPECTED_SECTIONS if section not in self.sections)
+
+def month_index(text):
+    """Months since year 0 for a matched date ("Mar 2019", "03/2019", "2019"), or OPEN_END."""
+    text = text.lower().rstrip(".")
+    if text in ("present", "current", "now", "today"):
+        return OPEN_END
+    if "/" in text:
+        month, year = text.split("/")
+        return int(year) * 12 + int(month) - 1
+    parts = text.replace(".", " ").split()
+    if len(parts) == 2:
+        return int(parts[1]) * 12 + MONTHS[parts[0]] - 1
+    return int(parts[0]) * 12
+
+def longest_gap(ranges):
+    """Longest stretch, in months, not covered by any of the (start, end) ranges."""
+    longest = 0
+    covered_until = None
+    for start, end in sorted(ranges):
+        if covered_until is not None and start - covered_until > longest:
+            longest = start - covered_until
+        covered_until = end if covered_until is None else max(covered_until, end)
+    return longest
+
+class FeatureExtractor:
+    """Computes every ResumeFeatures field in one pass over the text's lines.
+
+    Each line is lowered and split into words once; the buzzword trie, the
+    heading and bullet checks and the action-verb lookup all share those words.
+    The line patterns only run on lines that can match them (digits, years).
+    """
+
+    def __init__(self, scanner):
+        self.scanner = scanner
+
+    def extract(self, text):
+        lowered_text = text.lower()
+        words = []
+        lines = lowered_text.split("\n")
+        non_empty = 0
+        sections = []
+        bullets = action_bullets = quantified = 0
+        ranges = []
+        has_phone = False
+        for line in lines:
+            lowered = line.strip()
+            if not lowered:
+                continue
+            non_empty += 1
+            line_words = split_words(lowered)
+            words.extend(line_words)
+
+            if len(line_words) <= 4 and " ".join(line_words) in SECTION_HEADINGS:
+                section = SECTION_HEADINGS[" ".join(line_words)]
+                if section not in sections:
+                    sections.append(section)
+                continue
+            if lowered.startswith(BULLET_MARKERS):
+                bullets += 1
+                if line_words and line_words[0] in ACTION_VERBS:
+                    action_bullets += 1
+            if HAS_DIGIT(lowered):
+                undated = lowered
+                if HAS_YEAR(lowered):
+                    ranges.extend((month_index(start), month_index(end)) for start, end in DATE_RANGE.findall(lowered))
+                    undated = DATE_RANGE.sub(" ", lowered)
+                # Contact details come first, so the phone pattern stops running early
+                phone = None if has_phone else PHONE.search(undated)
+                if phone and sum(character.isdigit() for character in phone.group()) >= 9:
+                    has_phone = True
+                elif QUANTITY.search(undated):
+                    quantified += 1
+
+        return ResumeFeatures(
+            word_count=len(text.split()),
+            line_count=len(lines),
+            non_empty_line_count=non_empty,
+            term_counts=self.scanner.count_terms(words),
+            sections=tuple(sections),
+            bullet_count=bullets,
+            action_bullet_count=action_bullets,
+            quantified_count=quantified,
+            date_ranges=tuple(ranges),
+            longest_gap_months=longest_gap(ranges),
+            has_email="@" in lowered_text and EMAIL.search(lowered_text) is not None,
+            has_phone=has_phone,
+            has_linkedin="linkedin.com/" in lowered_text,
+            has_github="github.com/" in lowered_text,
+        )
+
+# Message selection
+
+class Rule(NamedTuple):
+    message_id: str
+    # Higher scores are picked first; 0 or less means the rule does not apply
+    score: object
+    # The message holds for any resume, so it may pad a short selection. Never
+    # set it on a rule whose message quotes a feature or claims something is missing.
+    filler: bool = False
+
+def select_messages(rules, features, text, minimum=3, maximum=5):
+    """Ids of the best-scoring applicable rules, padded towards `minimum` with filler rules.
+
+    Deterministic: ties and padding are ordered by a hash of the text and the
+    message id, so the same text always gets the same messages in the same order.
+    """
+    digest = hashlib.sha256(text.encode("utf-8", "surrogatepass")).hexdigest()
+
+    def tiebreak(message_id):
+        return hashlib.sha256(f"{digest}:{message_id}".encode()).hexdigest()
+
+    scored = [(rule.score(features), rule) for rule in rules]
+    applicable = sorted((item for item in scored if item[0] > 0), key=lambda item: (-item[0], tiebreak(item[1].message_id)))
+    selected = [rule.message_id for _, rule in applicable[:maximum]]
+    if len(selected) < minimum:
+        fillers = sorted((rule.message_id for score, rule in scored if score <= 0 and rule.filler), key=tiebreak)
+        selected.extend(fillers[:minimum - len(selected)])
+    return selected
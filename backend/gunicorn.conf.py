@@ -0,0 +1,53 @@
+"""Production launcher settings: `gunicorn -c gunicorn.conf.py server:app` from backend/.
+
+Every worker imports the app after the fork and opens its own Mongo client in
+the connect_db startup hook. On SIGTERM a worker stops accepting connections,
+finishes in-flight requests for up to GRACEFUL_TIMEOUT seconds and then runs
+the shutdown hooks (job workers, batched writes, Mongo client).
+
+WEB_CONCURRENCY defaults to one worker per CPU. The in-process job queue is
+per worker, so with more than one `?async=1` uploads need JOB_QUEUE_URL; the
+app answers them with 503 otherwise.
+"""
+import multiprocessing
+import os
+import shutil
+import tempfile
+
+bind = os.environ.get("BIND", "0.0.0.0:8001")
+workers = int(os.environ.get("WEB_CONCURRENCY", multiprocessing.cpu_count()))
+# The app reads it to tell whether its in-process job queue is the only one
+os.environ["WEB_CONCURRENCY"] = str(workers)
+worker_class = "uvicorn.workers.UvicornWorker"
+
+# Recycle workers to contain slow memory growth in the parsers; the jitter
+# keeps them from all restarting at once
+max_requests = int(os.environ.get("MAX_REQUESTS", "1000"))
+max_requests_jitter = int(os.environ.get("MAX_REQUESTS_JITTER", "100"))
+
+# Uploads can take EXTRACTION_TIMEOUT plus the roast to finish
+graceful_timeout = int(os.environ.get("GRACEFUL_TIMEOUT", "60"))
+timeout = int(os.environ.get("WORKER_TIMEOUT", "120"))
+keepalive = int(os.environ.get("KEEPALIVE", "75"))
+
+accesslog = "-"
+
+# Share the CPUs between the web workers' extraction pools instead of
+# starting a full-size pool in every worker
+os.environ.setdefault("EXTRACTION_WORKERS", str(max(1, multiprocessing.cpu_count() // workers)))
+
+# Prometheus needs a directory shared by all workers to aggregate /metrics
+if workers > 1 and not os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+    os.environ["PROMETHEUS_MULTIPROC_DIR"] = tempfile.mkdtemp(prefix="prometheus-")
+
+def on_starting(server):
+    # Samples left over from a previous run would be added to this one's
+    directory = os.environ.get("PROMETHEUS_MULTIPROC_DIR")
+    if directory:
+        shutil.rmtree(directory, ignore_errors=True)
+        os.makedirs(directory, exist_ok=True)
+
+def child_exit(server, worker):
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        from prometheus_client import multiprocess
+        multiprocess.mark_process_dead(worker.pid)
@@ -0,0 +1,165 @@
+import hashlib
+import os
+import tempfile
+import zipfile
+
+from extraction import BufferReader
+
+CHUNK_SIZE = 64 * 1024
+
+class UploadTooLarge(Exception):
+    """Raised as soon as an upload grows past the configured maximum size."""
+
+class ArchiveTooLarge(Exception):
+    """Raised when the files in a ZIP archive inflate past the total size limit."""
+
+class UnsupportedFormat(Exception):
+    """Raised when the upload's magic bytes are neither PDF nor DOCX."""
+
+class SpooledUpload:
+    """Upload body kept in memory up to `spool_size` bytes and on disk beyond that.
+
+    The SHA-256 digest is computed while the body is written, and `payload()`
+    hands extractors either a zero-copy memoryview or the path of the spool file.
+    """
+
+    def __init__(self, max_size, spool_size):
+        self.max_size = max_size
+        self.spool_size = spool_size
+        self.size = 0
+        self.path = None
+        self.file_type = None
+        self._buffer = bytearray()
+        self._file = None
+        self._sha256 = hashlib.sha256()
+
+    @property
+    def digest(self):
+        return self._sha256.hexdigest()
+
+    def write(self, chunk):
+        self.size += len(chunk)
+        if self.size > self.max_size:
+            raise UploadTooLarge(f"Upload exceeds the {self.max_size} byte limit")
+        self._sha256.update(chunk)
+        if self._file is None and self.size > self.spool_size:
+            self._file = tempfile.NamedTemporaryFile(prefix="resume-upload-", delete=False)
+            self.path = self._file.name
+            self._file.write(self._buffer)
+            self._buffer = bytearray()
+        if self._file is not None:
+            self._file.write(chunk)
+        else:
+            self._buffer += chunk
+
+    def finish(self):
+        if self._file is not None:
+            self._file.close()
+
+    def open(self):
+        """Return a readable, seekable file object over the body."""
+        if self.path:
+            return open(self.path, "rb")
+        return BufferReader(self._buffer)
+
+    def payload(self):
+        """The body as extractors accept it: a file path or a memoryview."""
+        return self.path or memoryview(self._buffer)
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            os.unlink(self.path)
+            self._file = None
+        self._buffer = bytearray()
+
+def sniff_format(upload):
+    """Detect the upload's format ("pdf", "docx" or "zip") from its content, or None."""
+    with upload.open() as f:
+        head = f.read(1024)
+        # The PDF header may be preceded by junk, but must be in the first 1024 bytes
+        if b"%PDF-" in head:
+            return "pdf"
+        if head.startswith(b"PK\x03\x04"):
+            f.seek(0)
+            try:
+                with zipfile.ZipFile(f) as archive:
+                    archive.getinfo("word/document.xml")
+                return "docx"
+            except KeyError:
+                return "zip"
+            except zipfile.BadZipFile:
+                pass
+    return None
+
+async def ingest_upload(file, max_size, spool_size, chunk_size=CHUNK_SIZE, expected_types=("pdf", "docx")):
+    """Stream an UploadFile into a SpooledUpload, enforcing `max_size` as it goes."""
+    upload = SpooledUpload(max_size=max_size, spool_size=spool_size)
+    try:
+        while True:
+            chunk = await file.read(chunk_size)
+            if not chunk:
+                break
+            upload.write(chunk)
+        upload.finish()
+        upload.file_type = sniff_format(upload)
+        if upload.file_type not in expected_types:
+            raise UnsupportedFormat("Unsupported file format")
+    except BaseException:
+        upload.close()
+        raise
+    finally:
+        # Release Starlette's own copy of the body as early as possible
+        await file.close()
+    return upload
+
+def expand_zip(archive_upload, max_size, spool_size, max_members, max_total=None, chunk_size=CHUNK_SIZE):
+    """Spool each file in a ZIP archive, returning (name, SpooledUpload or error) pairs.
+
+    Stops after `max_members` + 1 files so callers can reject oversized batches
+    without decompressing the rest of the archive. Raises ArchiveTooLarge as soon
+    as the files together inflate past `max_total` bytes.
+    """
+    items = []
+    # Bytes actually inflated so far; declared sizes can lie
+    total = 0
+    try:
+        with archive_upload.open() as f, zipfile.ZipFile(f) as archive:
+            for info in archive.infolist():
+                name = info.filename
+                if info.is_dir() or name.startswith("__MACOSX/") or os.path.basename(name).startswith("."):
+                    continue
+                if len(items) > max_members:
+                    break
+                if info.file_size > max_size:
+                    items.append((name, UploadTooLarge(f"{name} exceeds the {max_size} byte limit")))
+                    continue
+                if max_total is not None and total + info.file_size > max_total:
+                    raise ArchiveTooLarge(f"Archive files inflate past the {max_total} byte limit")
+                upload = SpooledUpload(max_size=max_size, spool_size=spool_size)
+                try:
+                    # The declared size can lie, so SpooledUpload enforces the limit again
+                    with archive.open(info) as member:
+                        while chunk := member.read(chunk_size):
+                            total += len(chunk)
+                            if max_total is not None and total > max_total:
+                                raise ArchiveTooLarge(f"Archive files inflate past the {max_total} byte limit")
+                            upload.write(chunk)
+                    upload.finish()
+                    upload.file_type = sniff_format(upload)
+                    if upload.file_type not in ("pdf", "docx"):
+                        raise UnsupportedFormat("Unsupported file format")
+                except (UploadTooLarge, UnsupportedFormat, zipfile.BadZipFile) as e:
+                    upload.close()
+                    items.append((name, e))
+                    continue
+                except ArchiveTooLarge:
+                    upload.close()
+                    raise
+                items.append((name, upload))
+    except ArchiveTooLarge:
+        for _, upload in items:
+            if not isinstance(upload, Exception):
+                upload.close()
+        raise
+    return items
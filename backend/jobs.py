@@ -0,0 +1,387 @@
+import asyncio
+import json
+import logging
+import os
+import time
+import uuid
+from abc import ABC, abstractmethod
+from collections import deque
+
+# Job lifecycle: queued -> processing -> done | failed. A processing job whose
+# visibility timeout expires goes back to queued (counted as an attempt).
+
+class Job:
+    def __init__(self, id, meta, payload, attempts=0):
+        self.id = id
+        # JSON-serializable description of the job (file type, Drive link, ...)
+        self.meta = meta
+        # Raw upload bytes, or None for jobs that carry everything in `meta`
+        self.payload = payload
+        self.attempts = attempts
+
+class JobQueue(ABC):
+    """Interface shared by the Redis queue and the in-process fallback."""
+
+    @abstractmethod
+    async def enqueue(self, meta, payload=None):
+        """Add a job and return its id."""
+
+    @abstractmethod
+    async def reserve(self):
+        """Take the next job, or return None when the queue is empty."""
+
+    @abstractmethod
+    async def complete(self, job, result):
+        """Mark `job` done with its result."""
+
+    @abstractmethod
+    async def fail(self, job, error, retry):
+        """Retry `job` (while attempts remain and `retry` is true) or mark it failed."""
+
+    @abstractmethod
+    async def requeue_expired(self):
+        """Put processing jobs whose visibility timeout passed back in the queue."""
+
+    @abstractmethod
+    async def get_status(self, job_id):
+        """The status document of a job, or None."""
+
+    @abstractmethod
+    async def metrics(self):
+        """Queue depth and job counters."""
+
+    async def aclose(self):
+        pass
+
+class InProcessJobQueue(JobQueue):
+    """Queue held in this process's memory, for local runs without Redis."""
+
+    def __init__(self, visibility_timeout=120.0, max_attempts=3, result_ttl=86400.0):
+        self.visibility_timeout = visibility_timeout
+        self.max_attempts = max_attempts
+        self.result_ttl = result_ttl
+        self._pending = deque()
+        self._processing = {}
+        self._jobs = {}
+        self._statuses = {}
+
+    async def enqueue(self, meta, payload=None):
+        job = Job(str(uuid.uuid4()), meta, payload)
+        self._jobs[job.id] = job
+        self._statuses[job.id] = {"status": "queued", "attempts": 0, "updated": time.time()}
+        self._pending.append(job.id)
+        return job.id
+
+    async def reserve(self):
+        job = None
+        while job is None:
+            if not self._pending:
+                return None
+            # Skip ids of requeued jobs that their original worker completed after all
+            job_id = self._pending.popleft()
+            job = self._jobs.get(job_id) if self._statuses.get(job_id, {}).get("status") == "queued" else None
+        job.attempts += 1
+        self._processing[job.id] = time.monotonic() + self.visibility_timeout
+        self._set_status(job.id, "processing", attempts=job.attempts)
+        return job
+
+    async def complete(self, job, result):
+        self._processing.pop(job.id, None)
+        self._jobs.pop(job.id, None)
+        self._set_status(job.id, "done", attempts=job.attempts, result=result)
+
+    async def fail(self, job, error, retry):
+        self._processing.pop(job.id, None)
+        if retry and job.attempts < self.max_attempts:
+            self._set_status(job.id, "queued", attempts=job.attempts, error=error)
+            self._pending.append(job.id)
+        else:
+            self._jobs.pop(job.id, None)
+            self._set_status(job.id, "failed", attempts=job.attempts, error=error)
+
+    async def requeue_expired(self):
+        now = time.monotonic()
+        expired = [job_id for job_id, deadline in self._processing.items() if deadline <= now]
+        for job_id in expired:
+            await self.fail(self._jobs[job_id], VISIBILITY_TIMEOUT_ERROR, retry=True)
+        # Forget finished jobs once their results have been kept for result_ttl
+        cutoff = time.time() - self.result_ttl
+        for job_id in [job_id for job_id, status in self._statuses.items()
+                       if status["status"] in ("done", "failed") and status["updated"] < cutoff]:
+            del self._statuses[job_id]
+        return len(expired)
+
+    def _set_status(self, job_id, status, **fields):
+        self._statuses[job_id] = {"status": status, "updated": time.time(), **fields}
+
+    async def get_status(self, job_id):
+        return self._statuses.get(job_id)
+
+    async def metrics(self):
+        counts = {"queued": 0, "processing": 0, "done": 0, "failed": 0}
+        for status in self._statuses.values():
+            counts[status["status"]] += 1
+        return {"backend": "memory", "depth": len(self._pending), "in_flight": len(self._processing), **counts}
+
+# Reserve atomically: pop the oldest queued id, record its visibility deadline
+# and bump its attempt count. Ids of jobs that are no longer queued are dropped:
+# a requeued job that its original worker finished after all, or one whose
+# status has expired.
+_RESERVE_SCRIPT = """
+while true do
+    local job_id = redis.call('RPOP', KEYS[1])
+    if not job_id then return nil end
+    local job_key = ARGV[2] .. job_id
+    if redis.call('HGET', job_key, 'status') == 'queued' then
+        redis.call('ZADD', KEYS[2], ARGV[1], job_id)
+        local attempts = redis.call('HINCRBY', job_key, 'attempts', 1)
+        redis.call('HSET', job_key, 'status', 'processing', 'updated', ARGV[3])
+        return {job_id, attempts}
+    end
+end
+"""
+
+# Move processing jobs whose deadline passed back to the queue, or fail them
+# once they have used up their attempts
+_REQUEUE_SCRIPT = """
+local expired = redis.call('ZRANGEBYSCORE', KEYS[2], '-inf', ARGV[1])
+for _, job_id in ipairs(expired) do
+    local job_key = ARGV[2] .. job_id
+    redis.call('ZREM', KEYS[2], job_id)
+    local attempts = tonumber(redis.call('HGET', job_key, 'attempts') or '0')
+    if attempts >= tonumber(ARGV[4]) then
+        redis.call('HSET', job_key, 'status', 'failed', 'error', ARGV[7], 'updated', ARGV[3])
+        redis.call('EXPIRE', job_key, ARGV[5])
+        redis.call('DEL', ARGV[6] .. job_id)
+    else
+        redis.call('HSET', job_key, 'status', 'queued', 'updated', ARGV[3])
+        redis.call('LPUSH', KEYS[1], job_id)
+    end
+end
+return #expired
+"""
+
+VISIBILITY_TIMEOUT_ERROR = {"status_code": 504, "detail": "Job visibility timeout expired"}
+
+class RedisJobQueue(JobQueue):
+    """Queue in Redis, shared by every web process and standalone worker.
+
+    Queued ids live in a list, processing ids in a sorted set scored by their
+    visibility deadline, and each job's status, metadata and payload in keys
+    under `prefix` that expire `result_ttl` seconds after the job finishes.
+    """
+
+    def __init__(self, url, prefix="resume-jobs", visibility_timeout=120.0, max_attempts=3, result_ttl=86400, client=None):
+        if client is None:
+            import redis.asyncio
+
+            client = redis.asyncio.from_url(url)
+        self.redis = client
+        self.prefix = prefix
+        self.visibility_timeout = visibility_timeout
+        self.max_attempts = max_attempts
+        self.result_ttl = result_ttl
+        self.pending_key = f"{prefix}:pending"
+        self.processing_key = f"{prefix}:processing"
+        self.job_prefix = f"{prefix}:job:"
+        self.payload_prefix = f"{prefix}:payload:"
+        self._reserve = self.redis.register_script(_RESERVE_SCRIPT)
+        self._requeue = self.redis.register_script(_REQUEUE_SCRIPT)
+
+    async def enqueue(self, meta, payload=None):
+        job_id = str(uuid.uuid4())
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.hset(self.job_prefix + job_id, mapping={
+                "status": "queued",
+                "attempts": 0,
+                "meta": json.dumps(meta),
+                "updated": time.time(),
+            })
+            if payload is not None:
+                pipe.set(self.payload_prefix + job_id, payload)
+            pipe.lpush(self.pending_key, job_id)
+            await pipe.execute()
+        return job_id
+
+    async def reserve(self):
+        reserved = await self._reserve(
+            keys=[self.pending_key, self.processing_key],
+            args=[time.time() + self.visibility_timeout, self.job_prefix, time.time()],
+        )
+        if reserved is None:
+            return None
+        job_id, attempts = reserved[0].decode(), int(reserved[1])
+        meta, payload = await asyncio.gather(
+            self.redis.hget(self.job_prefix + job_id, "meta"),
+            self.redis.get(self.payload_prefix + job_id),
+        )
+        return Job(job_id, json.loads(meta), payload, attempts)
+
+    async def _finish(self, job, status, **fields):
+        job_key = self.job_prefix + job.id
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.zrem(self.processing_key, job.id)
+            pipe.hset(job_key, mapping={"status": status, "updated": time.time(), **{
+                name: json.dumps(value) for name, value in fields.items()
+            }})
+            pipe.expire(job_key, self.result_ttl)
+            pipe.delete(self.payload_prefix + job.id)
+            await pipe.execute()
+
+    async def complete(self, job, result):
+        await self._finish(job, "done", result=result)
+
+    async def fail(self, job, error, retry):
+        if retry and job.attempts < self.max_attempts:
+            async with self.redis.pipeline(transaction=True) as pipe:
+                pipe.zrem(self.processing_key, job.id)
+                pipe.hset(self.job_prefix + job.id, mapping={
+                    "status": "queued", "error": json.dumps(error), "updated": time.time(),
+                })
+                pipe.lpush(self.pending_key, job.id)
+                await pipe.execute()
+        else:
+            await self._finish(job, "failed", error=error)
+
+    async def requeue_expired(self):
+        return await self._requeue(
+            keys=[self.pending_key, self.processing_key],
+            args=[
+                time.time(), self.job_prefix, time.time(), self.max_attempts, self.result_ttl,
+                self.payload_prefix, json.dumps(VISIBILITY_TIMEOUT_ERROR),
+            ],
+        )
+
+    async def get_status(self, job_id):
+        fields = await self.redis.hgetall(self.job_prefix + job_id)
+        if not fields:
+            return None
+        fields = {name.decode(): value.decode() for name, value in fields.items()}
+        status = {"status": fields["status"], "attempts": int(fields.get("attempts", 0))}
+        for name in ("result", "error"):
+            if name in fields:
+                status[name] = json.loads(fields[name])
+        return status
+
+    async def metrics(self):
+        depth, in_flight, expired = await asyncio.gather(
+            self.redis.llen(self.pending_key),
+            self.redis.zcard(self.processing_key),
+            self.redis.zcount(self.processing_key, "-inf", time.time()),
+        )
+        return {"backend": "redis", "depth": depth, "in_flight": in_flight, "expired": expired}
+
+    async def aclose(self):
+        await self.redis.aclose()
+
+class JobFailed(Exception):
+    """Raised by a job handler to fail a job; `retry` says whether to try again."""
+
+    def __init__(self, error, retry=False):
+        super().__init__(error.get("detail"))
+        self.error = error
+        self.retry = retry
+
+class JobWorkerPool:
+    """Runs `concurrency` loops that reserve jobs and pass them to `handler`.
+
+    `handler(job)` returns the job's JSON result. It raises JobFailed to fail the
+    job; any other exception is retried until the queue's max_attempts is reached.
+    """
+
+    def __init__(self, queue, handler, concurrency=2, poll_interval=0.2):
+        self.queue = queue
+        self.handler = handler
+        self.concurrency = concurrency
+        self.poll_interval = poll_interval
+        self.processed = 0
+        self.failed = 0
+        self.retried = 0
+        self.busy = 0
+        self._tasks = []
+        self._reaper = None
+        self._stopping = False
+
+    def start(self):
+        if self._tasks or not self.concurrency:
+            return
+        self._stopping = False
+        self._tasks = [asyncio.ensure_future(self._run()) for _ in range(self.concurrency)]
+        self._reaper = asyncio.ensure_future(self._reap())
+
+    async def stop(self):
+        """Stop taking jobs and wait for the ones in progress to finish."""
+        self._stopping = True
+        if self._reaper is not None:
+            self._reaper.cancel()
+            self._reaper = None
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def _run(self):
+        while not self._stopping:
+            try:
+                job = await self.queue.reserve()
+            except Exception as e:
+                logging.error(f"Error reserving job: {e}")
+                job = None
+            if job is None:
+                await asyncio.sleep(self.poll_interval)
+                continue
+            self.busy += 1
+            try:
+                await self._process(job)
+            finally:
+                self.busy -= 1
+
+    async def _process(self, job):
+        try:
+            result = await self.handler(job)
+        except JobFailed as e:
+            await self._fail(job, e.error, e.retry)
+        except Exception as e:
+            logging.error(f"Error processing job {job.id}: {e}")
+            await self._fail(job, {"status_code": 500, "detail": f"Error processing resume: {str(e)}"}, True)
+        else:
+            await self.queue.complete(job, result)
+            self.processed += 1
+
+    async def _fail(self, job, error, retry):
+        will_retry = retry and job.attempts < self.queue.max_attempts
+        await self.queue.fail(job, error, retry)
+        if will_retry:
+            self.retried += 1
+        else:
+            self.failed += 1
+
+    async def _reap(self):
+        while True:
+            try:
+                requeued = await self.queue.requeue_expired()
+                if requeued:
+                    logging.error(f"Requeued {requeued} jobs whose visibility timeout expired")
+            except Exception as e:
+                logging.error(f"Error requeueing expired jobs: {e}")
+            await asyncio.sleep(min(5.0, self.queue.visibility_timeout / 4))
+
+    def stats(self):
+        return {
+            "workers": self.concurrency,
+            "busy": self.busy,
+            "processed": self.processed,
+            "failed": self.failed,
+            "retried": self.retried,
+        }
+
+def create_job_queue():
+    """Redis queue when JOB_QUEUE_URL is set, otherwise the in-process fallback."""
+    options = {
+        "visibility_timeout": float(os.environ.get('JOB_VISIBILITY_TIMEOUT', '120')),
+        "max_attempts": int(os.environ.get('JOB_MAX_ATTEMPTS', '3')),
+        "result_ttl": int(os.environ.get('JOB_RESULT_TTL', '86400')),
+    }
+    url = os.environ.get('JOB_QUEUE_URL')
+    if url:
+        return RedisJobQueue(url, **options)
+    return InProcessJobQueue(**options)
@@ -0,0 +1,193 @@
+"""Prometheus metrics for the upload pipeline.
+
+With several worker processes, set PROMETHEUS_MULTIPROC_DIR to an empty
+directory shared by all of them (and wipe it on deploy); `/metrics` then
+aggregates every process's samples. Without it, metrics are per process.
+"""
+import os
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+
+STAGE_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+# Stages: ingest, download (Drive links), cache_lookup, extract, similarity, roast, save (encode and queue), db_write (one insert_many)
+STAGE_SECONDS = Histogram(
+    "resume_stage_duration_seconds",
+    "Time spent in each stage of the upload pipeline",
+    ["stage"],
+    buckets=STAGE_BUCKETS,
+)
+
+REQUEST_SECONDS = Histogram(
+    "resume_request_duration_seconds",
+    "Upload request time, up to the last byte of the response",
+    ["endpoint"],
+    buckets=STAGE_BUCKETS,
+)
+
+REQUESTS_IN_FLIGHT = Gauge(
+    "resume_requests_in_flight",
+    "Upload requests being processed",
+    ["endpoint"],
+    multiprocess_mode="livesum",
+)
+
+ADMISSIONS_IN_FLIGHT = Gauge(
+    "resume_admissions_in_flight",
+    "Documents being extracted and analyzed under an admission gate slot",
+    multiprocess_mode="livesum",
+)
+
+ADMISSION_WAIT_SECONDS = Histogram(
+    "resume_admission_wait_seconds",
+    "Time admitted documents waited for a gate slot",
+    buckets=(0.001, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10),
+)
+
+# Reasons: queue_full, wait_timeout (503) and rate_limited (429)
+ADMISSION_REJECTIONS = Counter(
+    "resume_admission_rejections_total",
+    "Upload requests turned away by admission control",
+    ["reason"],
+)
+
+JOBS_IN_FLIGHT = Gauge(
+    "resume_jobs_in_flight",
+    "Queued uploads being processed by job workers",
+    multiprocess_mode="livesum",
+)
+
+# Outcomes: ok, fallback (an "Unable to extract text" message), timeout, empty, cached
+EXTRACTIONS = Counter(
+    "resume_extractions_total",
+    "Text extractions by file type and outcome",
+    ["file_type", "outcome"],
+)
+
+# Outcomes: generated, cached, similar, client_error, rejected, error
+ANALYSES = Counter(
+    "resume_analyses_total",
+    "Analyses by file type and outcome",
+    ["file_type", "outcome"],
+)
+
+UPLOAD_BYTES = Counter(
+    "resume_upload_bytes_total",
+    "Bytes of uploaded documents accepted for analysis",
+    ["file_type"],
+)
+
+UPLOAD_SIZE = Histogram(
+    "resume_upload_size_bytes",
+    "Size of each uploaded document",
+    ["file_type"],
+    buckets=(16e3, 64e3, 256e3, 512e3, 1e6, 2e6, 5e6, 10e6),
+)
+
+DOCUMENT_PAGES = Histogram(
+    "resume_document_pages",
+    "Pages per extracted PDF",
+    buckets=(1, 2, 3, 5, 10, 20, 50, 100),
+)
+
+# Statuses: text, empty, image (no fonts, likely scanned, and not OCRed), ocr, error,
+# skipped (past the page/character budget)
+PDF_PAGES = Counter(
+    "resume_pdf_pages_total",
+    "PDF pages by extraction status",
+    ["status"],
+)
+
+PDF_PAGE_SECONDS = Histogram(
+    "resume_pdf_page_seconds",
+    "Time to extract the text of one PDF page",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5),
+)
+
+# Outcomes: ocr, cached, empty (no text found), error, timeout, skipped (past the page budget)
+OCR_PAGES = Counter(
+    "resume_ocr_pages_total",
+    "Image-only PDF pages sent to the OCR fallback, by outcome",
+    ["outcome"],
+)
+
+DB_WRITE_BATCH_SIZE = Histogram(
+    "resume_db_write_batch_size",
+    "Analyses per insert_many batch",
+    buckets=(1, 2, 5, 10, 25, 50, 100, 250),
+)
+
+# Stage timings of the request being handled, set by profiling.ProfilingMiddleware
+# for the request log. Concurrent work within a request (batch items) is summed.
+request_stages = ContextVar("request_stages", default=None)
+
+def record_stage(name, seconds):
+    """Add `seconds` to stage `name` of the current request, if one is being recorded."""
+    stages = request_stages.get()
+    if stages is not None:
+        stages[name] = stages.get(name, 0.0) + seconds
+
+@contextmanager
+def stage(name):
+    """Time a pipeline stage into STAGE_SECONDS and the current request's stage timings."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        STAGE_SECONDS.labels(name).observe(elapsed)
+        record_stage(name, elapsed)
+
+def record_upload(upload):
+    """Count an ingested SpooledUpload's bytes under its detected file type."""
+    UPLOAD_BYTES.labels(upload.file_type).inc(upload.size)
+    UPLOAD_SIZE.labels(upload.file_type).observe(upload.size)
+
+def record_pdf_pages(result):
+    """Count an ExtractionResult's PDF pages by status and observe their timings."""
+    for page in result.page_results:
+        PDF_PAGES.labels(page.status).inc()
+        PDF_PAGE_SECONDS.observe(page.seconds)
+    skipped = (result.pages or 0) - len(result.page_results)
+    if skipped > 0:
+        PDF_PAGES.labels("skipped").inc(skipped)
+
+def render_metrics():
+    """The exposition body and its content type, aggregated across processes if configured."""
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
+
+class RequestMetricsMiddleware:
+    """ASGI middleware timing requests to `endpoints` (paths) and counting those in flight.
+
+    A plain ASGI middleware rather than `@app.middleware("http")`, so streamed
+    responses are measured up to their last byte, or until the client goes away.
+    """
+
+    def __init__(self, app, endpoints):
+        self.app = app
+        self.endpoints = endpoints
+
+    async def __call__(self, scope, receive, send):
+        endpoint = scope["path"] if scope["type"] == "http" else None
+        if endpoint not in self.endpoints:
+            await self.app(scope, receive, send)
+            return
+        with REQUESTS_IN_FLIGHT.labels(endpoint).track_inprogress(), REQUEST_SECONDS.labels(endpoint).time():
+            await self.app(scope, receive, send)
@@ -0,0 +1,178 @@
+"""OCR fallback for PDF pages without a text layer.
+
+Pages that `extract_pdf_pages` marks "image" (no fonts, e.g. a scan) are
+rasterized with poppler's pdftoppm and read with tesseract, both run as
+subprocesses so a stuck engine can simply be killed. At most `max_workers`
+pages are OCRed at once across all requests; a document gets no more than
+`max_pages` OCRed pages and `timeout` seconds, and each page `page_timeout`
+seconds. Results are cached by the page's digest (its content stream, images
+and size), so the same scanned page uploaded again is not read twice.
+"""
+import asyncio
+import logging
+import os
+import shutil
+import tempfile
+import time
+
+from cache import LRUCache
+from extraction import PageResult
+from metrics import OCR_PAGES
+
+class OcrError(Exception):
+    """Raised when pdftoppm or tesseract fails on a page."""
+
+class OcrPool:
+    """Bounded pool of OCR subprocesses. `max_workers` of 0 turns OCR off."""
+
+    def __init__(self, max_workers=2, max_pages=5, timeout=20.0, page_timeout=10.0, dpi=300,
+                 language="eng", cache_chars=2_000_000, pdftoppm="pdftoppm", tesseract="tesseract"):
+        self.max_workers = max_workers
+        self.max_pages = max_pages
+        self.timeout = timeout
+        self.page_timeout = page_timeout
+        self.dpi = dpi
+        self.language = language
+        self.pdftoppm = shutil.which(pdftoppm)
+        self.tesseract = shutil.which(tesseract)
+        self.cache = LRUCache(max_size=cache_chars, sizeof=len)
+        self._semaphore = None
+        if max_workers > 0 and not (self.pdftoppm and self.tesseract):
+            logging.warning("OCR is disabled: pdftoppm and tesseract must both be installed")
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            max_workers=int(os.environ.get('OCR_WORKERS', '2')),
+            max_pages=int(os.environ.get('OCR_MAX_PAGES', '5')),
+            timeout=float(os.environ.get('OCR_TIMEOUT', '20')),
+            page_timeout=float(os.environ.get('OCR_PAGE_TIMEOUT', '10')),
+            dpi=int(os.environ.get('OCR_DPI', '300')),
+            language=os.environ.get('OCR_LANGUAGE', 'eng'),
+            cache_chars=int(os.environ.get('OCR_CACHE_CHARS', '2000000')),
+        )
+
+    @property
+    def enabled(self):
+        return self.max_workers > 0 and self.max_pages > 0 and bool(self.pdftoppm and self.tesseract)
+
+    async def run_command(self, args, input=None, timeout=None):
+        """Run one subprocess and return its stdout, killing it on timeout or cancellation."""
+        process = await asyncio.create_subprocess_exec(
+            *args,
+            stdin=asyncio.subprocess.PIPE if input is not None else asyncio.subprocess.DEVNULL,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+            # Parallelism comes from the pool; tesseract's own threads would oversubscribe it
+            env={**os.environ, "OMP_THREAD_LIMIT": "1"},
+        )
+        try:
+            stdout, stderr = await asyncio.wait_for(process.communicate(input), timeout=timeout)
+        finally:
+            if process.returncode is None:
+                process.kill()
+                await process.wait()
+        if process.returncode != 0:
+            raise OcrError(f"{os.path.basename(args[0])} exited with {process.returncode}: {stderr.decode(errors='replace').strip()[:200]}")
+        return stdout
+
+    async def recognize_page(self, path, number):
+        """OCR page `number` (0-based) of the PDF at `path`."""
+        deadline = time.monotonic() + self.page_timeout
+        image = await self.run_command(
+            [self.pdftoppm, "-f", str(number + 1), "-l", str(number + 1), "-r", str(self.dpi), "-gray", "-png", path],
+            timeout=self.page_timeout,
+        )
+        text = await self.run_command(
+            [self.tesseract, "stdin", "stdout", "-l", self.language],
+            input=image,
+            timeout=max(0.1, deadline - time.monotonic()),
+        )
+        return text.decode("utf-8", errors="replace")
+
+    async def _page(self, path, result):
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_workers)
+        async with self._semaphore:
+            began = time.perf_counter()
+            try:
+                text = await self.recognize_page(path, result.number)
+            except asyncio.TimeoutError:
+                OCR_PAGES.labels("timeout").inc()
+                return result._replace(error=f"OCR timed out after {self.page_timeout}s"), ""
+            except OcrError as e:
+                OCR_PAGES.labels("error").inc()
+                logging.error(f"OCR of PDF page {result.number + 1} failed: {e}")
+                return result._replace(error=str(e)), ""
+        text = text.strip()
+        self.cache.set(self.cache_key(result.digest), text)
+        OCR_PAGES.labels("ocr" if text else "empty").inc()
+        if not text:
+            return result, ""
+        return PageResult(result.number, "ocr", len(text), time.perf_counter() - began, digest=result.digest), text
+
+    def cache_key(self, digest):
+        return f"{digest}:{self.language}:{self.dpi}"
+
+    async def fill(self, chunk, file_content):
+        """`chunk` (a PdfChunk) with the text of its image pages filled in by OCR.
+
+        Pages past the page or time budget keep their "image" status.
+        """
+        texts, results = list(chunk.texts), list(chunk.page_results)
+        pending = []
+        for index, result in enumerate(results):
+            if result.status != "image" or result.digest is None:
+                continue
+            if len(pending) >= self.max_pages:
+                OCR_PAGES.labels("skipped").inc()
+                continue
+            cached = self.cache.get(self.cache_key(result.digest))
+            if cached is None:
+                pending.append(index)
+            elif cached:
+                OCR_PAGES.labels("cached").inc()
+                texts[index] = cached
+                results[index] = PageResult(result.number, "ocr", len(cached), digest=result.digest)
+        if not pending:
+            return chunk._replace(texts=texts, page_results=results)
+
+        path, temporary = file_content, None
+        if not isinstance(file_content, (str, os.PathLike)):
+            # pdftoppm reads files; uploads held in memory are written out once
+            temporary = tempfile.NamedTemporaryFile(suffix=".pdf", delete=False)
+            path = temporary.name
+            await asyncio.to_thread(write_and_close, temporary, file_content)
+        tasks = {asyncio.create_task(self._page(path, results[index])): index for index in pending}
+        try:
+            done, late = await asyncio.wait(tasks, timeout=self.timeout)
+            for task in late:
+                task.cancel()
+                OCR_PAGES.labels("timeout").inc()
+            if late:
+                logging.error(f"OCR budget of {self.timeout}s ran out with {len(late)} pages left")
+                await asyncio.gather(*late, return_exceptions=True)
+            for task in done:
+                results[tasks[task]], text = task.result()
+                if text:
+                    texts[tasks[task]] = text
+        finally:
+            # Cancelled with pages still running (e.g. the client went away): stop them too
+            for task in tasks:
+                task.cancel()
+            if temporary is not None:
+                os.unlink(path)
+        return chunk._replace(texts=texts, page_results=results)
+
+    def stats(self):
+        return {
+            "enabled": self.enabled,
+            "workers": self.max_workers,
+            "max_pages": self.max_pages,
+            "timeout": self.timeout,
+            "cache": self.cache.stats(),
+        }
+
+def write_and_close(file, content):
+    with file:
+        file.write(content)
@@ -0,0 +1,67 @@
+import base64
+import binascii
+import json
+from datetime import datetime
+
+from bson import json_util
+
+# Newest first, with _id breaking ties between equal timestamps
+SORT_FIELDS = ("timestamp", "_id")
+
+class InvalidCursor(ValueError):
+    """Raised for a cursor that was not produced by `encode_cursor`."""
+
+def encode_cursor(document, fields=SORT_FIELDS):
+    """Opaque cursor pointing just past `document` in the sort order."""
+    values = json_util.dumps([document[field] for field in fields])
+    return base64.urlsafe_b64encode(values.encode()).decode().rstrip("=")
+
+def decode_cursor(cursor, fields=SORT_FIELDS):
+    try:
+        values = json_util.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    except (binascii.Error, UnicodeDecodeError, ValueError) as e:
+        raise InvalidCursor("Invalid cursor") from e
+    if not isinstance(values, list) or len(values) != len(fields):
+        raise InvalidCursor("Invalid cursor")
+    return values
+
+def keyset_filter(values, fields=SORT_FIELDS):
+    """Filter for the documents after `values` when sorting descending on `fields`.
+
+    For (timestamp, _id) this is: timestamp < t, or timestamp == t and _id < i.
+    """
+    clauses = []
+    for position, field in enumerate(fields):
+        clause = {earlier: values[index] for index, earlier in enumerate(fields[:position])}
+        clause[field] = {"$lt": values[position]}
+        clauses.append(clause)
+    return {"$or": clauses}
+
+async def fetch_page(collection, query, projection, limit, cursor=None, fields=SORT_FIELDS):
+    """One page of documents in descending `fields` order and the cursor for the next page.
+
+    Needs an index on `fields` (descending) to stay fast at any depth. The
+    next cursor is None on the last page.
+    """
+    if cursor:
+        after = keyset_filter(decode_cursor(cursor, fields), fields)
+        query = {"$and": [query, after]} if query else after
+    documents = await collection.find(query, projection).sort([(field, -1) for field in fields]).limit(limit).to_list(limit)
+    next_cursor = encode_cursor(documents[-1], fields) if len(documents) == limit else None
+    return documents, next_cursor
+
+def json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+def stream_json_array(items, chunk_size=100):
+    """Encode `items` (plain dicts) as a JSON array, a few items per chunk."""
+    yield "["
+    chunk = []
+    for index, item in enumerate(items):
+        chunk.append(("," if index else "") + json.dumps(item, default=json_default))
+        if len(chunk) >= chunk_size:
+            yield "".join(chunk)
+            chunk = []
+    yield "".join(chunk) + "]"
@@ -0,0 +1,284 @@
+"""Request log with stage timings, and sampling profiles of slow or selected requests.
+
+Every request to a profiled endpoint is logged through structlog as one JSON
+event with its status, duration and per-stage timings (see `metrics.stage`).
+Requests still running after `slow_seconds`, and the next N requests after
+`RequestProfiler.arm`, also get a stack profile from a sampling thread. Profiles
+are exported in the folded format read by flamegraph.pl, speedscope and
+inferno. With nothing armed and no slow request the sampling thread only
+sleeps, and a request costs one deadline entry and one log line.
+"""
+import logging
+import os
+import sys
+import threading
+import time
+from collections import Counter, deque
+from typing import Dict, NamedTuple
+
+import structlog
+
+from metrics import request_stages
+
+def configure_logging(level=logging.INFO):
+    """Render structlog events as JSON through the standard logging handlers."""
+    structlog.configure(
+        processors=[
+            structlog.processors.add_log_level,
+            structlog.processors.TimeStamper(fmt="iso"),
+            structlog.processors.JSONRenderer(),
+        ],
+        logger_factory=structlog.stdlib.LoggerFactory(),
+        wrapper_class=structlog.make_filtering_bound_logger(level),
+        cache_logger_on_first_use=True,
+    )
+
+# Stack sampling
+
+def frame_label(frame):
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+def fold_stack(frame):
+    """A frame's stack as one folded-format line, outermost frame first."""
+    labels = []
+    while frame is not None:
+        labels.append(frame_label(frame))
+        frame = frame.f_back
+    return ";".join(reversed(labels))
+
+class StackSampler:
+    """Samples threads' Python stacks every `interval` seconds into subscribed Counters.
+
+    Each subscriber names the thread it wants (the event loop's, for a request)
+    and may ask to start only after a delay. Deadlines are kept by the sampling
+    thread itself, so a request that blocks the event loop is still caught. The
+    thread sleeps while nothing is due and exits after `idle_timeout` seconds
+    without subscribers.
+    """
+
+    def __init__(self, interval=0.005, idle_timeout=30.0):
+        self.interval = interval
+        self.idle_timeout = idle_timeout
+        self.samples = 0
+        # id(counter) -> (counter, thread id), and the same with a start deadline
+        self._active = {}
+        self._scheduled = {}
+        self._condition = threading.Condition()
+        self._thread = None
+
+    def subscribe(self, counter, thread_id, delay=0.0):
+        with self._condition:
+            if delay > 0:
+                self._scheduled[id(counter)] = (time.monotonic() + delay, counter, thread_id)
+            else:
+                self._active[id(counter)] = (counter, thread_id)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+                self._thread.start()
+            self._condition.notify()
+
+    def unsubscribe(self, counter):
+        """Stop sampling into `counter`; False if its delay had not run out yet."""
+        with self._condition:
+            self._scheduled.pop(id(counter), None)
+            return self._active.pop(id(counter), None) is not None
+
+    @property
+    def sampling(self):
+        return len(self._active)
+
+    def _run(self):
+        while True:
+            with self._condition:
+                now = time.monotonic()
+                for key, (deadline, counter, thread_id) in list(self._scheduled.items()):
+                    if deadline <= now:
+                        del self._scheduled[key]
+                        self._active[key] = (counter, thread_id)
+                if not self._active:
+                    if self._scheduled:
+                        self._condition.wait(min(deadline for deadline, _, _ in self._scheduled.values()) - now)
+                    elif not self._condition.wait(self.idle_timeout) and not self._scheduled and not self._active:
+                        self._thread = None
+                        return
+                    continue
+                subscribers = list(self._active.values())
+            frames = sys._current_frames()
+            stacks = {}
+            for _, thread_id in subscribers:
+                if thread_id not in stacks and thread_id in frames:
+                    stacks[thread_id] = fold_stack(frames[thread_id])
+            del frames
+            # Counted under the lock, so an unsubscribed Counter is never written again
+            with self._condition:
+                for counter, thread_id in self._active.values():
+                    if thread_id in stacks:
+                        counter[stacks[thread_id]] += 1
+            self.samples += 1
+            time.sleep(self.interval)
+
+def folded(stacks):
+    """Folded-format text for a Counter of stacks: one "frame;frame;... count" line each."""
+    return "".join(f"{stack} {count}\n" for stack, count in sorted(stacks.items()))
+
+# Request profiles
+
+class RequestProfile(NamedTuple):
+    method: str
+    path: str
+    status: int
+    # Wall-clock start (epoch seconds) and duration of the whole request
+    started: float
+    seconds: float
+    # "requested" (armed through the admin endpoint) or "slow"; slow profiles
+    # only cover the request from the moment it passed the threshold
+    reason: str
+    stages: Dict[str, float]
+    stacks: Counter
+
+    def summary(self):
+        return {
+            "method": self.method,
+            "path": self.path,
+            "status": self.status,
+            "started": self.started,
+            "seconds": self.seconds,
+            "reason": self.reason,
+            "stages": self.stages,
+            "samples": sum(self.stacks.values()),
+        }
+
+class Capture:
+    """Profiling state of one request; sampling starts `delay` seconds after `start`."""
+
+    def __init__(self, sampler, thread_id):
+        self.sampler = sampler
+        self.thread_id = thread_id
+        self.stacks = Counter()
+        self.reason = None
+
+    def start(self, reason, delay=0.0):
+        self.reason = reason
+        self.sampler.subscribe(self.stacks, self.thread_id, delay)
+
+    def stop(self):
+        if self.reason is not None and not self.sampler.unsubscribe(self.stacks):
+            # Finished before its delay ran out
+            self.reason = None
+
+class RequestProfiler:
+    """Decides which requests get profiled and keeps the last `max_profiles` profiles.
+
+    `slow_seconds` of 0 turns off the automatic capture of slow requests.
+    """
+
+    def __init__(self, slow_seconds=5.0, interval=0.005, max_profiles=20, sampler=None):
+        self.slow_seconds = slow_seconds
+        self.sampler = sampler or StackSampler(interval)
+        self.profiles = deque(maxlen=max_profiles)
+        self.armed = 0
+        self.captured = Counter()
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            slow_seconds=float(os.environ.get('PROFILE_SLOW_SECONDS', '5')),
+            interval=float(os.environ.get('PROFILE_INTERVAL', '0.005')),
+            max_profiles=int(os.environ.get('PROFILE_MAX_PROFILES', '20')),
+        )
+
+    def arm(self, requests):
+        """Profile the next `requests` requests from start to finish."""
+        self.armed = requests
+
+    def begin(self):
+        capture = Capture(self.sampler, threading.get_ident())
+        if self.armed > 0:
+            self.armed -= 1
+            capture.start("requested")
+        elif self.slow_seconds > 0:
+            capture.start("slow", delay=self.slow_seconds)
+        return capture
+
+    def end(self, capture, method, path, status, started, seconds, stages):
+        """Stop `capture`; the RequestProfile if the request was profiled, else None."""
+        capture.stop()
+        if capture.reason is None:
+            return None
+        profile = RequestProfile(method, path, status, started, seconds, capture.reason, stages, capture.stacks)
+        self.profiles.append(profile)
+        self.captured[capture.reason] += 1
+        return profile
+
+    def select(self, reason=None, index=None):
+        """Kept profiles, oldest first, optionally only those of `reason` or the one at `index`."""
+        profiles = [profile for profile in self.profiles if reason is None or profile.reason == reason]
+        if index is not None:
+            profiles = [profiles[index]] if -len(profiles) <= index < len(profiles) else []
+        return profiles
+
+    def folded(self, profiles):
+        stacks = Counter()
+        for profile in profiles:
+            stacks.update(profile.stacks)
+        return folded(stacks)
+
+    def stats(self):
+        return {
+            "armed": self.armed,
+            "slow_seconds": self.slow_seconds,
+            "interval": self.sampler.interval,
+            "sampling": self.sampler.sampling,
+            "captured": dict(self.captured),
+            "profiles": [profile.summary() for profile in self.profiles],
+        }
+
+# Middleware
+
+class ProfilingMiddleware:
+    """ASGI middleware logging each request to `endpoints` with its stage timings
+    and profiling it when the RequestProfiler says so.
+
+    Plain ASGI like RequestMetricsMiddleware, so streamed responses are covered
+    until their last byte.
+    """
+
+    def __init__(self, app, endpoints, profiler, logger=None):
+        self.app = app
+        self.endpoints = endpoints
+        self.profiler = profiler
+        self.logger = logger or structlog.get_logger("requests")
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] not in self.endpoints:
+            await self.app(scope, receive, send)
+            return
+        stages = {}
+        token = request_stages.set(stages)
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        capture = self.profiler.begin()
+        wall_started = time.time()
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            seconds = time.perf_counter() - started
+            request_stages.reset(token)
+            profile = self.profiler.end(capture, scope["method"], scope["path"], status, wall_started, seconds, stages)
+            self.logger.info(
+                "request",
+                method=scope["method"],
+                path=scope["path"],
+                status=status,
+                duration_ms=round(seconds * 1000, 1),
+                stages_ms={name: round(value * 1000, 1) for name, value in stages.items()},
+                profiled=profile.reason if profile is not None else None,
+            )
@@ -0,0 +1,32 @@
+"""Rebuild `resume_signatures` (the near-duplicate index) from `resume_analyses`.
+
+Run from the backend directory, e.g. after changing SIMILARITY_NUM_PERM or
+SIMILARITY_SHINGLE_SIZE, or to index analyses stored before the index existed:
+
+    python rebuild_similarity.py --batch-size 500
+
+Running API processes pick up the new signatures on their next refresh;
+restart them after changing the signature settings.
+"""
+import argparse
+import asyncio
+import logging
+import sys
+import time
+
+import server
+
+async def main(batch_size):
+    await server.connect_db()
+    await server.similarity_index.ensure_indexes()
+    started = time.perf_counter()
+    count = await server.similarity_index.rebuild(server.analysis_store, batch_size=batch_size)
+    logging.info(f"Indexed {count} analyses in {time.perf_counter() - started:.1f}s")
+    await server.shutdown_db_client()
+    return 0
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Rebuild the resume similarity index")
+    parser.add_argument("--batch-size", type=int, default=500)
+    args = parser.parse_args()
+    sys.exit(asyncio.run(main(args.batch_size)))
@@ -0,0 +1,318 @@
+"""Retention for `resume_analyses` and `status_checks`: TTL indexes, archiving and restore.
+
+Each collection keeps `retention` seconds of documents by `timestamp`. A TTL
+index on `timestamp` makes Mongo delete older documents. With an archive
+directory configured, the Archiver gets there first: it streams expired
+documents to gzip-compressed JSONL files partitioned by collection and day,
+then deletes them, and the TTL index waits a further `grace` as a backstop.
+Archiving goes in bounded batches with a pause between them, so it never
+competes with request traffic for Mongo I/O.
+
+Data derived from an analysis expires with it: `resume_signatures` and the
+`extracted_texts` cache get the same TTL index, and GridFS resume texts, which
+a TTL index cannot remove (their chunks carry no date), are deleted by
+`expire_texts` once they are older than that TTL.
+
+Archive records are the stored documents in MongoDB Extended JSON (canonical),
+with GridFS resume texts moved inline. A batch is on disk before it is deleted,
+so an interrupted run can only archive some documents twice; restoring skips
+documents that already exist.
+"""
+import asyncio
+import gzip
+import itertools
+import logging
+import os
+import time
+from datetime import datetime, timedelta
+
+from bson import json_util
+from gridfs.errors import NoFile
+from pymongo.errors import OperationFailure
+
+from storage import BatchWriter
+
+DAY = 24 * 3600
+INDEX_NOT_FOUND = 27
+INDEX_OPTIONS_CONFLICT = 85
+
+# Collections under the retention policy, with the env var holding their retention in days
+RETAINED_COLLECTIONS = {
+    "resume_analyses": ("RETENTION_DAYS", "0"),
+    "status_checks": ("STATUS_CHECK_RETENTION_DAYS", "0"),
+}
+
+# Collections holding data derived from another's documents, stamped with the
+# same `timestamp` or later, that expire on the TTL of that collection
+DEPENDENT_COLLECTIONS = {
+    "resume_signatures": "resume_analyses",
+    "extracted_texts": "resume_analyses",
+}
+
+class RetentionPolicy:
+    """Retention in seconds per collection (0 keeps documents forever) and where to archive.
+
+    Without `archive_dir`, expired documents are only deleted by the TTL indexes.
+    """
+
+    def __init__(self, retention, archive_dir=None, grace=7 * DAY):
+        self.retention = {name: seconds for name, seconds in retention.items() if seconds > 0}
+        self.archive_dir = archive_dir
+        self.grace = grace
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            {name: int(float(os.environ.get(variable, default)) * DAY) for name, (variable, default) in RETAINED_COLLECTIONS.items()},
+            archive_dir=os.environ.get('ARCHIVE_DIR') or None,
+            grace=int(float(os.environ.get('ARCHIVE_GRACE_DAYS', '7')) * DAY),
+        )
+
+    def ttl_seconds(self, collection):
+        """expireAfterSeconds for `collection`'s TTL index, or 0 for no TTL index."""
+        retention = self.retention.get(collection, 0)
+        if retention and self.archive_dir:
+            return retention + self.grace
+        return retention
+
+    def cutoff(self, collection, now=None):
+        """Documents of `collection` stamped before this have expired, or None if none expire."""
+        retention = self.retention.get(collection)
+        if retention is None:
+            return None
+        return (now or datetime.utcnow()) - timedelta(seconds=retention)
+
+    async def ensure_indexes(self, db):
+        for collection in RETAINED_COLLECTIONS:
+            await ensure_ttl_index(db, collection, self.ttl_seconds(collection))
+        for collection, parent in DEPENDENT_COLLECTIONS.items():
+            await ensure_ttl_index(db, collection, self.ttl_seconds(parent))
+
+async def expire_texts(store, policy, now=None, batch_size=500, pause=1.0):
+    """Delete GridFS resume texts uploaded longer ago than the resume_analyses TTL.
+
+    A text is uploaded when its analysis is written, so it never goes before
+    the analysis does. Returns the number deleted.
+    """
+    seconds = policy.ttl_seconds("resume_analyses")
+    if not seconds:
+        return 0
+    cutoff = (now or datetime.utcnow()) - timedelta(seconds=seconds)
+    count = 0
+    while True:
+        files = await store.db["resume_texts.files"].find({"uploadDate": {"$lt": cutoff}}, {"_id": 1}).limit(batch_size).to_list(batch_size)
+        for file in files:
+            try:
+                await store.gridfs.delete(file["_id"])
+            except NoFile:
+                # Another process got there first
+                pass
+        count += len(files)
+        if len(files) < batch_size:
+            return count
+        await asyncio.sleep(pause)
+
+async def ensure_ttl_index(db, collection, seconds, name="timestamp_ttl"):
+    """Create, update or (for 0 seconds) drop the TTL index on `collection.timestamp`."""
+    if not seconds:
+        try:
+            await db[collection].drop_index(name)
+        except OperationFailure as e:
+            if e.code != INDEX_NOT_FOUND:
+                raise
+        return
+    try:
+        await db[collection].create_index("timestamp", name=name, expireAfterSeconds=seconds)
+    except OperationFailure as e:
+        if e.code != INDEX_OPTIONS_CONFLICT:
+            raise
+        # The retention changed: collMod updates the index in place
+        await db.command("collMod", collection, index={"name": name, "expireAfterSeconds": seconds})
+
+# Archive files
+
+class ArchiveWriter:
+    """Appends records to `<directory>/<collection>/<YYYY-MM-DD>/<run>.jsonl.gz`.
+
+    Files are kept open for the whole run; `write` returns once its records
+    are flushed and synced to disk.
+    """
+
+    def __init__(self, directory, run=None):
+        self.directory = directory
+        self.run = run or f"{datetime.utcnow():%Y%m%dT%H%M%S}-{os.getpid()}"
+        self._files = {}
+
+    def path(self, collection, day):
+        return os.path.join(self.directory, collection, day, f"{self.run}.jsonl.gz")
+
+    def write(self, collection, documents):
+        touched = set()
+        for document in documents:
+            day = f"{document['timestamp']:%Y-%m-%d}"
+            key = (collection, day)
+            if key not in self._files:
+                path = self.path(collection, day)
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                self._files[key] = gzip.open(path, "at", encoding="utf-8")
+            self._files[key].write(json_util.dumps(document, json_options=json_util.CANONICAL_JSON_OPTIONS) + "\n")
+            touched.add(key)
+        for key in touched:
+            file = self._files[key]
+            file.flush()
+            os.fsync(file.fileno())
+
+    def close(self):
+        for file in self._files.values():
+            file.close()
+        self._files.clear()
+
+def archive_files(paths):
+    """The .jsonl.gz files at `paths` (files or directories), in sorted order."""
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            for root, _, names in os.walk(path):
+                files.extend(os.path.join(root, name) for name in names if name.endswith(".jsonl.gz"))
+        else:
+            files.append(path)
+    return sorted(files)
+
+def read_archive(path):
+    """Yield the documents of one archive file."""
+    with gzip.open(path, "rt", encoding="utf-8") as file:
+        for line in file:
+            if line.strip():
+                yield json_util.loads(line, json_options=json_util.CANONICAL_JSON_OPTIONS)
+
+def archive_collection_name(path):
+    """The collection an archive file was written from, from its `<collection>/<day>/` location."""
+    return os.path.basename(os.path.dirname(os.path.dirname(os.path.abspath(path))))
+
+# Archiving and restore
+
+class Archiver:
+    """Moves expired documents from Mongo to archive files in bounded batches.
+
+    At most `batch_size` documents are read, written and deleted at a time,
+    with `pause` seconds between batches.
+    """
+
+    def __init__(self, db, store, policy, batch_size=500, pause=1.0):
+        self.db = db
+        self.store = store
+        self.policy = policy
+        self.batch_size = batch_size
+        self.pause = pause
+        self.archived = {}
+
+    @classmethod
+    def from_env(cls, db, store):
+        return cls(
+            db,
+            store,
+            RetentionPolicy.from_env(),
+            batch_size=int(os.environ.get('ARCHIVE_BATCH_SIZE', '500')),
+            pause=float(os.environ.get('ARCHIVE_BATCH_PAUSE', '1.0')),
+        )
+
+    async def run_once(self, now=None):
+        """Archive every expired document; returns the number archived per collection."""
+        if not self.policy.archive_dir:
+            raise ValueError("Archiving needs an archive directory (ARCHIVE_DIR)")
+        writer = ArchiveWriter(self.policy.archive_dir)
+        counts = {}
+        try:
+            for collection in self.policy.retention:
+                counts[collection] = await self.archive_collection(writer, collection, self.policy.cutoff(collection, now))
+        finally:
+            writer.close()
+        # Texts of analyses that the TTL index removed without archiving
+        await expire_texts(self.store, self.policy, now, self.batch_size, self.pause)
+        return counts
+
+    async def archive_collection(self, writer, collection, cutoff):
+        count = 0
+        while True:
+            documents = await self.db[collection].find({"timestamp": {"$lt": cutoff}}).sort(
+                [("timestamp", 1), ("_id", 1)],
+            ).limit(self.batch_size).to_list(self.batch_size)
+            if not documents:
+                return count
+            if collection == "resume_analyses":
+                records = [await self.store.inline_text(document) for document in documents]
+            else:
+                records = documents
+            await asyncio.to_thread(writer.write, collection, records)
+            await self.db[collection].delete_many({"_id": {"$in": [document["_id"] for document in documents]}})
+            if collection == "resume_analyses":
+                await self.store.delete_texts(documents)
+                ids = [self.store.summarize(document)["id"] for document in documents]
+                await self.db.resume_signatures.delete_many({"_id": {"$in": ids}})
+            count += len(documents)
+            self.archived[collection] = self.archived.get(collection, 0) + len(documents)
+            logging.info(f"Archived {len(documents)} {collection} documents stamped before {cutoff:%Y-%m-%d %H:%M}")
+            if len(documents) < self.batch_size:
+                return count
+            await asyncio.sleep(self.pause)
+
+    async def run_forever(self, interval=3600.0):
+        while True:
+            try:
+                await self.run_once()
+            except Exception as e:
+                logging.error(f"Error archiving expired documents: {e}")
+            await asyncio.sleep(interval)
+
+def batches(iterable, size):
+    iterator = iter(iterable)
+    while batch := list(itertools.islice(iterator, size)):
+        yield batch
+
+async def restore(db, store, paths, collection=None, batch_size=500, policy=None):
+    """Load archive files back into Mongo, skipping documents that already exist.
+
+    Each file goes back to the collection it was archived from unless
+    `collection` is given. Returns the number of documents read. Documents
+    still past the retention of `policy` are restored, but will expire again.
+    Large resume texts go back to GridFS only when restoring into
+    `resume_analyses`; anywhere else they stay inline.
+    """
+    count = 0
+    for path in archive_files(paths):
+        target = collection or archive_collection_name(path)
+        spill = target == "resume_analyses" and archive_collection_name(path) == "resume_analyses"
+        writer = BatchWriter(db[target], batch_size=batch_size, max_pending=batch_size * 4)
+        cutoff = policy.cutoff(target) if policy is not None else None
+        expired = skipped = 0
+        started = time.perf_counter()
+        try:
+            for documents in batches(read_archive(path), batch_size):
+                # Checked before spilling, so a rerun uploads no GridFS files for
+                # documents it then skips
+                existing = {
+                    document["_id"] async for document in db[target].find(
+                        {"_id": {"$in": [document["_id"] for document in documents]}}, {"_id": 1},
+                    )
+                }
+                for document in documents:
+                    count += 1
+                    if document["_id"] in existing:
+                        skipped += 1
+                        continue
+                    if spill:
+                        document = await store.spill_text(document)
+                    if cutoff is not None and document["timestamp"] < cutoff:
+                        expired += 1
+                    await writer.submit(document)
+        finally:
+            await writer.close()
+        if skipped:
+            logging.info(f"Skipped {skipped} documents from {path} that are already in {target}")
+        logging.info(f"Restored {path} into {target} in {time.perf_counter() - started:.1f}s")
+        if expired:
+            logging.warning(
+                f"{expired} documents from {path} are past the {target} retention and will expire again; "
+                "raise the retention or restore into another collection to keep them"
+            )
+    return count
@@ -0,0 +1,310 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+from abc import ABC, abstractmethod
+from typing import NamedTuple
+
+class RoastResult(NamedTuple):
+    roast: str
+    review: str
+    # Name of the engine that actually produced the text (after any fallback)
+    engine: str
+
+class RoastChunk(NamedTuple):
+    # "roast" or "review"
+    section: str
+    text: str
+    engine: str
+
+def split_paragraphs(text):
+    """Split text into paragraphs whose concatenation is the original text."""
+    parts = text.split("\n\n")
+    return [part + "\n\n" for part in parts[:-1]] + parts[-1:]
+
+class RoastEngine(ABC):
+    """Interface for anything that turns resume text into a roast and a review."""
+
+    name = "base"
+
+    @abstractmethod
+    async def generate(self, resume_text):
+        """Return a RoastResult for `resume_text`."""
+
+    async def stream(self, resume_text):
+        """Yield RoastChunks as they become available.
+
+        Engines that cannot stream produce everything up front and yield it
+        one paragraph at a time.
+        """
+        roast, review, engine = await self.generate(resume_text)
+        for section, text in (("roast", roast), ("review", review)):
+            for paragraph in split_paragraphs(text):
+                yield RoastChunk(section, paragraph, engine)
+
+    async def aclose(self):
+        pass
+
+    def stats(self):
+        return {}
+
+class LocalRoastEngine(RoastEngine):
+    """Wraps the local template-based generator (`generate_roast_and_review`)."""
+
+    name = "local"
+
+    def __init__(self, generate_fn):
+        self.generate_fn = generate_fn
+
+    async def generate(self, resume_text):
+        roast, review = self.generate_fn(resume_text)
+        return RoastResult(roast, review, self.name)
+
+SYSTEM_PROMPT = (
+    "You are Resume Roaster. Given the text of a resume, write a short, witty roast "
+    "of it (3-5 sharp jokes, no slurs or personal attacks) and a serious, actionable "
+    "review (3-5 concrete suggestions). Reply with only a JSON object of the form "
+    '{"roast": "...", "review": "..."}.'
+)
+
+STREAM_SYSTEM_PROMPT = (
+    "You are Resume Roaster. Given the text of a resume, write a short, witty roast "
+    "of it (3-5 sharp jokes, no slurs or personal attacks) and a serious, actionable "
+    "review (3-5 concrete suggestions). Start the roast with a line containing only "
+    "'### ROAST' and the review with a line containing only '### REVIEW'."
+)
+
+SECTION_MARKERS = {"### ROAST": "roast", "### REVIEW": "review"}
+
+class SectionSplitter:
+    """Routes streamed completion text to sections by the STREAM_SYSTEM_PROMPT markers.
+
+    A marker can arrive split across deltas, so the tail of the buffer that
+    could still be the start of one is held back until more text arrives.
+    """
+
+    def __init__(self):
+        self.section = None
+        self._buffer = ""
+        self._at_section_start = False
+        self._holdback = max(len(marker) for marker in SECTION_MARKERS) - 1
+
+    def feed(self, text):
+        self._buffer += text
+        chunks = []
+        while True:
+            found = [(self._buffer.find(marker), marker) for marker in SECTION_MARKERS]
+            found = [(index, marker) for index, marker in found if index != -1]
+            if not found:
+                break
+            index, marker = min(found)
+            self._emit(chunks, self._buffer[:index].rstrip())
+            self.section = SECTION_MARKERS[marker]
+            self._at_section_start = True
+            self._buffer = self._buffer[index + len(marker):]
+        if len(self._buffer) > self._holdback:
+            self._emit(chunks, self._buffer[:-self._holdback])
+            self._buffer = self._buffer[-self._holdback:]
+        return chunks
+
+    def close(self):
+        chunks = []
+        self._emit(chunks, self._buffer.rstrip())
+        self._buffer = ""
+        return chunks
+
+    def _emit(self, chunks, text):
+        if self.section is None:
+            # Anything before the first marker is preamble
+            return
+        if self._at_section_start:
+            text = text.lstrip()
+            if not text:
+                return
+            self._at_section_start = False
+        if text:
+            chunks.append((self.section, text))
+
+# Rough size of a token in characters for English text, used to budget prompts
+CHARS_PER_TOKEN = 4
+
+def truncate_to_token_budget(text, max_tokens):
+    """Cut `text` to roughly `max_tokens` tokens, preferring a whitespace boundary."""
+    max_chars = max_tokens * CHARS_PER_TOKEN
+    if len(text) <= max_chars:
+        return text
+    cut = text.rfind(" ", 0, max_chars)
+    return text[:cut if cut > max_chars // 2 else max_chars]
+
+def parse_completion(content):
+    """Pull the roast and review out of the model's JSON reply."""
+    # Models like to wrap the JSON in prose or a fenced code block
+    start, end = content.find("{"), content.rfind("}")
+    if start == -1 or end < start:
+        raise ValueError("Completion does not contain a JSON object")
+    data = json.loads(content[start:end + 1])
+    roast, review = data.get("roast"), data.get("review")
+    if not isinstance(roast, str) or not isinstance(review, str) or not roast.strip() or not review.strip():
+        raise ValueError("Completion is missing the roast or the review")
+    return roast.strip(), review.strip()
+
+class LLMRoastEngine(RoastEngine):
+    """Roasts with a model behind an OpenAI-compatible chat completions API.
+
+    All calls share one HTTP client and one concurrency semaphore. Identical
+    prompts that are already in flight are coalesced into a single upstream call,
+    and any call that fails or takes longer than `timeout` seconds (including the
+    wait for the semaphore) falls back to `fallback`.
+    """
+
+    name = "llm"
+
+    def __init__(self, base_url, model, fallback, api_key=None, timeout=10.0,
+                 max_concurrency=8, max_prompt_tokens=3000, temperature=0.9):
+        self.base_url = base_url.rstrip("/")
+        self.model = model
+        self.fallback = fallback
+        self.api_key = api_key
+        self.timeout = timeout
+        self.max_prompt_tokens = max_prompt_tokens
+        self.temperature = temperature
+        self.max_concurrency = max_concurrency
+        self.calls = 0
+        self.coalesced = 0
+        self.fallbacks = 0
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._inflight = {}
+        self._client = None
+
+    @property
+    def client(self):
+        if self._client is None:
+            import httpx
+
+            headers = {"Authorization": f"Bearer {self.api_key}"} if self.api_key else {}
+            self._client = httpx.AsyncClient(
+                base_url=self.base_url,
+                headers=headers,
+                timeout=httpx.Timeout(self.timeout),
+                limits=httpx.Limits(max_connections=self.max_concurrency, max_keepalive_connections=self.max_concurrency),
+            )
+        return self._client
+
+    def build_messages(self, resume_text, system_prompt=SYSTEM_PROMPT):
+        return [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": truncate_to_token_budget(resume_text, self.max_prompt_tokens)},
+        ]
+
+    async def generate(self, resume_text):
+        messages = self.build_messages(resume_text)
+        key = hashlib.sha256(json.dumps([self.model, messages]).encode()).hexdigest()
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._complete(messages))
+            self._inflight[key] = task
+            task.add_done_callback(lambda done: self._finish(key, done))
+        else:
+            self.coalesced += 1
+        try:
+            # Shielded so one caller timing out does not cancel the shared call
+            roast, review = await asyncio.wait_for(asyncio.shield(task), timeout=self.timeout)
+            return RoastResult(roast, review, self.name)
+        except Exception as e:
+            self.fallbacks += 1
+            logging.error(f"LLM roast failed, falling back to {self.fallback.name} engine: {e!r}")
+            return await self.fallback.generate(resume_text)
+
+    def _finish(self, key, task):
+        self._inflight.pop(key, None)
+        # Every waiter may have timed out already; mark the exception as retrieved
+        if not task.cancelled():
+            task.exception()
+
+    async def _complete(self, messages):
+        async with self._semaphore:
+            self.calls += 1
+            response = await self.client.post("/chat/completions", json={
+                "model": self.model,
+                "messages": messages,
+                "temperature": self.temperature,
+            })
+            response.raise_for_status()
+            return parse_completion(response.json()["choices"][0]["message"]["content"])
+
+    async def stream(self, resume_text):
+        """Stream the completion section by section.
+
+        Identical prompts are not coalesced here. A failure before the first
+        chunk falls back to the fallback engine; a failure after that is raised,
+        since part of the answer has already been sent.
+        """
+        emitted = False
+        try:
+            async for chunk in self._stream_completion(self.build_messages(resume_text, STREAM_SYSTEM_PROMPT)):
+                emitted = True
+                yield chunk
+            if not emitted:
+                raise ValueError("Completion has no roast or review section")
+        except Exception as e:
+            if emitted:
+                raise
+            self.fallbacks += 1
+            logging.error(f"LLM roast stream failed, falling back to {self.fallback.name} engine: {e!r}")
+            async for chunk in self.fallback.stream(resume_text):
+                yield chunk
+
+    async def _stream_completion(self, messages):
+        await asyncio.wait_for(self._semaphore.acquire(), timeout=self.timeout)
+        try:
+            self.calls += 1
+            splitter = SectionSplitter()
+            request = {"model": self.model, "messages": messages, "temperature": self.temperature, "stream": True}
+            # The client's read timeout bounds the wait for every streamed delta
+            async with self.client.stream("POST", "/chat/completions", json=request) as response:
+                response.raise_for_status()
+                async for line in response.aiter_lines():
+                    if not line.startswith("data:"):
+                        continue
+                    data = line[len("data:"):].strip()
+                    if data == "[DONE]":
+                        break
+                    delta = json.loads(data)["choices"][0].get("delta", {}).get("content")
+                    for section, text in splitter.feed(delta or ""):
+                        yield RoastChunk(section, text, self.name)
+            for section, text in splitter.close():
+                yield RoastChunk(section, text, self.name)
+        finally:
+            self._semaphore.release()
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    def stats(self):
+        return {
+            "calls": self.calls,
+            "coalesced": self.coalesced,
+            "fallbacks": self.fallbacks,
+            "in_flight": len(self._inflight),
+        }
+
+def create_roast_engine(generate_fn):
+    """Build the engine selected by ROAST_ENGINE ("local" or "llm")."""
+    local = LocalRoastEngine(generate_fn)
+    kind = os.environ.get('ROAST_ENGINE', 'local')
+    if kind == "local":
+        return local
+    if kind == "llm":
+        return LLMRoastEngine(
+            base_url=os.environ['ROAST_LLM_BASE_URL'],
+            model=os.environ.get('ROAST_LLM_MODEL', 'gpt-4o-mini'),
+            fallback=local,
+            api_key=os.environ.get('ROAST_LLM_API_KEY'),
+            timeout=float(os.environ.get('ROAST_LLM_TIMEOUT', '10')),
+            max_concurrency=int(os.environ.get('ROAST_LLM_CONCURRENCY', '8')),
+            max_prompt_tokens=int(os.environ.get('ROAST_LLM_MAX_PROMPT_TOKENS', '3000')),
+        )
+    raise ValueError(f"Unknown ROAST_ENGINE: {kind}")
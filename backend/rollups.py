@@ -0,0 +1,251 @@
+"""Daily analytics rollups, so dashboards never scan `resume_analyses`.
+
+`stats_daily` holds one document per UTC day with counters: analyses, words
+and buzzwords (sums, for averages), analyses per file type, and extraction
+outcomes per file type. `stats_buzzwords` holds one document per day and
+buzzword with its occurrences and the number of resumes using it. The upload
+path records into in-memory deltas that are flushed every `flush_interval`
+seconds as `$inc` upserts in one bulk write per collection. Reading a date
+range costs O(days) documents for the daily counters and O(days x buzzwords)
+for the buzzword ranking.
+"""
+import asyncio
+import logging
+import os
+from collections import Counter, defaultdict
+from datetime import datetime, timedelta
+
+from pymongo import UpdateOne
+
+def day_key(timestamp):
+    return f"{timestamp:%Y-%m-%d}"
+
+class Rollups:
+    """In-memory rollup deltas and their periodic flush to `stats_daily` and `stats_buzzwords`.
+
+    `db` may be None until `use_database` is called, like AnalysisStore.
+    """
+
+    def __init__(self, db=None, scanner=None, flush_interval=1.0):
+        self.scanner = scanner
+        self.flush_interval = flush_interval
+        self.db = db
+        self.flushes = 0
+        self.failed_flushes = 0
+        self._daily = defaultdict(Counter)
+        self._terms = defaultdict(Counter)
+
+    @classmethod
+    def from_env(cls, scanner):
+        return cls(scanner=scanner, flush_interval=float(os.environ.get('ROLLUP_FLUSH_SECONDS', '1')))
+
+    def use_database(self, db):
+        self.db = db
+
+    async def ensure_indexes(self):
+        await self.db.stats_buzzwords.create_index([("day", 1), ("term", 1)], name="day_term")
+
+    # Recording
+
+    def record_analysis(self, timestamp, file_type, text_stats):
+        """Count one analysis served for a resume text.
+
+        `text_stats` is anything with the text's `word_count` and buzzword
+        `term_counts`, such as the ResumeFeatures the caller already has, so
+        the text is not scanned again.
+        """
+        self._add_analysis(self._daily, self._terms, day_key(timestamp), file_type, text_stats)
+
+    @staticmethod
+    def _add_analysis(daily, terms, day, file_type, text_stats):
+        counters = daily[day]
+        counters["analyses"] += 1
+        counters["words"] += text_stats.word_count
+        counters["buzzwords"] += sum(text_stats.term_counts.values())
+        if file_type:
+            counters[f"file_types.{file_type}"] += 1
+        for term, count in text_stats.term_counts.items():
+            terms[day, term]["count"] += count
+            terms[day, term]["resumes"] += 1
+
+    def record_extraction(self, timestamp, file_type, outcome):
+        """Count one extraction by outcome: ok, failed (no text, rejected), empty or timeout."""
+        self._daily[day_key(timestamp)][f"extractions.{file_type}.{outcome}"] += 1
+
+    # Flushing
+
+    async def flush(self):
+        """Write the recorded deltas; on failure they are kept for the next flush."""
+        if not self._daily and not self._terms:
+            return
+        daily, self._daily = self._daily, defaultdict(Counter)
+        terms, self._terms = self._terms, defaultdict(Counter)
+        try:
+            if daily:
+                await self.db.stats_daily.bulk_write([
+                    UpdateOne({"_id": day}, {"$inc": dict(counters)}, upsert=True)
+                    for day, counters in daily.items()
+                ], ordered=False)
+                daily = None
+            if terms:
+                await self.db.stats_buzzwords.bulk_write([
+                    UpdateOne(
+                        {"_id": f"{day}:{term}"},
+                        {"$inc": dict(counters), "$setOnInsert": {"day": day, "term": term}},
+                        upsert=True,
+                    )
+                    for (day, term), counters in terms.items()
+                ], ordered=False)
+            self.flushes += 1
+        except Exception as e:
+            self.failed_flushes += 1
+            logging.error(f"Error writing analytics rollups: {e}")
+            # $inc is not idempotent, so a bulk write that failed part way may
+            # count some deltas twice; losing them all would be worse
+            for day, counters in (daily or {}).items():
+                self._daily[day].update(counters)
+            for key, counters in terms.items():
+                self._terms[key].update(counters)
+
+    async def run(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+
+    async def close(self):
+        if self.db is not None:
+            await self.flush()
+
+    # Reading
+
+    async def read(self, since, until, top=20):
+        """Daily counters for days in [since, until] (YYYY-MM-DD) and the top buzzwords over them."""
+        documents = await self.db.stats_daily.find({"_id": {"$gte": since, "$lte": until}}).sort([("_id", 1)]).to_list(None)
+        days = [summarize_day(document) for document in documents]
+        terms = defaultdict(Counter)
+        async for document in self.db.stats_buzzwords.find({"day": {"$gte": since, "$lte": until}}, {"term": 1, "count": 1, "resumes": 1}):
+            terms[document["term"]].update({"count": document.get("count", 0), "resumes": document.get("resumes", 0)})
+        ranked = sorted(terms.items(), key=lambda item: (-item[1]["count"], item[0]))[:top]
+        totals = summarize_day(merge_days(documents))
+        del totals["day"]
+        return {
+            "since": since,
+            "until": until,
+            "totals": totals,
+            "days": days,
+            "top_buzzwords": [{"term": term, "count": counts["count"], "resumes": counts["resumes"]} for term, counts in ranked],
+        }
+
+    # Backfill
+
+    async def backfill(self, store, since=None, until=None, batch_size=500, pause=0.1):
+        """Recount the analysis fields of stats_daily and all of stats_buzzwords from `resume_analyses`.
+
+        Covers analyses stamped in [since, until), by default everything before
+        today (UTC): today's counters keep coming from the upload path. Days in
+        the range are replaced, not added to, so a backfill can be rerun; any
+        day whose analyses were archived should be left out of the range.
+        Extraction outcomes are not stored with analyses and are left as they
+        are; near-duplicate reuses are not stored either, so a backfilled day
+        counts only the analyses that were generated.
+        """
+        if until is None:
+            until = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+        query = {"timestamp": {"$lt": until}}
+        if since is not None:
+            query["timestamp"]["$gte"] = since
+        daily, terms = defaultdict(Counter), defaultdict(Counter)
+        count = 0
+        last = None
+        projection = {"timestamp": 1, "file_hash": 1, "resume_text": 1, "resume_text_z": 1, "resume_text_file": 1, "text_codec": 1}
+        while True:
+            page_query = query
+            if last is not None:
+                page_query = {"$and": [query, {"$or": [
+                    {"timestamp": {"$gt": last["timestamp"]}},
+                    {"timestamp": last["timestamp"], "_id": {"$gt": last["_id"]}},
+                ]}]}
+            documents = await self.db.resume_analyses.find(page_query, projection).sort(
+                [("timestamp", 1), ("_id", 1)],
+            ).limit(batch_size).to_list(batch_size)
+            if not documents:
+                break
+            # The file type is only known from the extracted-text cache, keyed by the same hash
+            hashes = [document["file_hash"] for document in documents if document.get("file_hash")]
+            file_types = {}
+            if hashes:
+                async for text in self.db.extracted_texts.find({"_id": {"$in": hashes}}, {"file_type": 1}):
+                    file_types[text["_id"]] = text.get("file_type")
+            for document in documents:
+                text_stats = self.scanner.scan(await store.read_text(document))
+                self._add_analysis(daily, terms, day_key(document["timestamp"]), file_types.get(document.get("file_hash")), text_stats)
+            count += len(documents)
+            last = documents[-1]
+            await asyncio.sleep(pause)
+
+        for day, counters in daily.items():
+            update = {
+                "analyses": counters["analyses"],
+                "words": counters["words"],
+                "buzzwords": counters["buzzwords"],
+                "file_types": {name.split(".", 1)[1]: value for name, value in counters.items() if name.startswith("file_types.")},
+            }
+            await self.db.stats_daily.update_one({"_id": day}, {"$set": update}, upsert=True)
+        if daily:
+            await self.db.stats_buzzwords.delete_many({"day": {"$in": list(daily)}})
+            requests = [
+                UpdateOne({"_id": f"{day}:{term}"}, {"$set": {"day": day, "term": term, **counters}}, upsert=True)
+                for (day, term), counters in terms.items()
+            ]
+            for start in range(0, len(requests), batch_size):
+                await self.db.stats_buzzwords.bulk_write(requests[start:start + batch_size], ordered=False)
+        return count
+
+    def stats(self):
+        return {
+            "pending_days": len(self._daily),
+            "pending_terms": len(self._terms),
+            "flushes": self.flushes,
+            "failed_flushes": self.failed_flushes,
+        }
+
+def merge_days(documents):
+    """One stats_daily-shaped document adding up `documents`."""
+    merged = {"_id": None}
+    for document in documents:
+        for field, value in document.items():
+            if field == "_id":
+                continue
+            if isinstance(value, dict):
+                merged[field] = merge_days([merged.get(field, {}), value])
+                merged[field].pop("_id", None)
+            else:
+                merged[field] = merged.get(field, 0) + value
+    return merged
+
+def summarize_day(document):
+    """The API view of a stats_daily document, with averages and the extraction failure rate."""
+    analyses = document.get("analyses", 0)
+    extractions = document.get("extractions", {})
+    outcomes = Counter()
+    for counts in extractions.values():
+        outcomes.update(counts)
+    attempts = sum(outcomes.values())
+    return {
+        "day": document["_id"],
+        "analyses": analyses,
+        "average_words": round(document.get("words", 0) / analyses, 1) if analyses else None,
+        "average_buzzwords": round(document.get("buzzwords", 0) / analyses, 2) if analyses else None,
+        "file_types": document.get("file_types", {}),
+        "extractions": extractions,
+        "extraction_failure_rate": round((attempts - outcomes["ok"]) / attempts, 4) if attempts else None,
+    }
+
+def day_range(since=None, until=None, days=30):
+    """Validated YYYY-MM-DD bounds: `until` defaults to today (UTC), `since` to `days` days ending at `until`.
+
+    Raises ValueError for a malformed day.
+    """
+    last = datetime.strptime(until, "%Y-%m-%d") if until else datetime.utcnow()
+    first = datetime.strptime(since, "%Y-%m-%d") if since else last - timedelta(days=days - 1)
+    return day_key(first), day_key(last)
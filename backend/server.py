@@ -1,4 +1,4 @@
-from fastapi import FastAPI, APIRouter, UploadFile, File, Form, HTTPException
+from fastapi import FastAPI, APIRouter, UploadFile, File, Form, Header, HTTPException, Query, Depends
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
 from motor.motor_asyncio import AsyncIOMotorClient
@@ -8,25 +8,90 @@ from pathlib import Path
 from pydantic import BaseModel, Field
 from typing import List, Optional, Dict, Any
 import uuid
+import asyncio
 from datetime import datetime
-import PyPDF2
-import docx
-import re
 import json
-import io
-import requests
-import base64
-from fastapi.responses import JSONResponse
-import gdown
+import hashlib
+import secrets
+import zipfile
+from contextlib import asynccontextmanager
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from extraction import ExtractionPool, ExtractionTimeout
+from cache import AnalysisCache, LRUCache
+from storage import AnalysisStore, BatchWriter, MessageCatalog
+from pagination import InvalidCursor, fetch_page, stream_json_array
+from text_scan import TextScanner
+from features import FeatureExtractor, Rule, select_messages
+from similarity import SimilarityIndex
+from retention import RetentionPolicy, expire_texts
+from rollups import Rollups, day_range
+from roast_engines import create_roast_engine
+from ingestion import ArchiveTooLarge, SpooledUpload, UnsupportedFormat, UploadTooLarge, expand_zip, ingest_upload, sniff_format
+from admission import AdmissionGate, Overloaded, RateLimitMiddleware, create_rate_limiter, retry_after_header
+from external_integrations.gdrive import DriveError, DriveFileTooLarge, GoogleDriveClient
+from jobs import JobFailed, JobWorkerPool, RedisJobQueue, create_job_queue
+from profiling import ProfilingMiddleware, RequestProfiler, configure_logging
+from metrics import (
+    ANALYSES, DOCUMENT_PAGES, EXTRACTIONS, JOBS_IN_FLIGHT,
+    RequestMetricsMiddleware, record_pdf_pages, record_upload, render_metrics, stage,
+)
 
 # Root directory and environment variables
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
 
-# MongoDB connection
+# MongoDB connection, made per worker process by the connect_db startup hook:
+# a Motor client must not be shared across a fork
 mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
-db = client[os.environ['DB_NAME']]
+client = None
+db = None
+
+# Worker pool for PDF/DOCX parsing, so parsing never blocks the event loop
+extraction_pool = ExtractionPool.from_env()
+
+# Readiness: the parsers are preloaded by a background warm-up after startup
+READY_PING_TIMEOUT = float(os.environ.get('READY_PING_TIMEOUT', '2'))
+readiness = {"parsers": False}
+# Startup work that runs after the socket is bound; cancelled on shutdown
+startup_tasks = []
+
+# Upload limits: bodies above UPLOAD_SPOOL_BYTES go to a temp file instead of RAM
+MAX_UPLOAD_BYTES = int(os.environ.get('MAX_UPLOAD_BYTES', str(10 * 1024 * 1024)))
+UPLOAD_SPOOL_BYTES = int(os.environ.get('UPLOAD_SPOOL_BYTES', str(1024 * 1024)))
+# Batch uploads: total request size, resumes per batch and parallelism
+MAX_BATCH_BYTES = int(os.environ.get('MAX_BATCH_BYTES', str(200 * 1024 * 1024)))
+MAX_BATCH_FILES = int(os.environ.get('MAX_BATCH_FILES', '500'))
+# Total size the files in a batch archive may inflate to
+MAX_BATCH_INFLATED_BYTES = int(os.environ.get('MAX_BATCH_INFLATED_BYTES', str(500 * 1024 * 1024)))
+BATCH_CONCURRENCY = int(os.environ.get('BATCH_CONCURRENCY', '4'))
+# Allowance for multipart boundaries and form fields around the file itself
+MULTIPART_OVERHEAD_BYTES = 16 * 1024
+
+# Shared client for Drive links; downloads obey the same size limit as uploads
+drive_client = GoogleDriveClient.from_env(max_size=MAX_UPLOAD_BYTES)
+
+# Bump whenever generate_roast_and_review changes, so cached analyses are not reused.
+# 3: messages are chosen deterministically from ResumeFeatures (ROAST_RULES, REVIEW_RULES)
+# 4: short selections are padded only with filler messages that hold for any resume
+ANALYSIS_VERSION = "4"
+
+# Buzzword dictionary, compiled once into a matcher shared by every request
+buzzword_scanner = TextScanner.from_file(os.environ.get('BUZZWORDS_PATH', str(ROOT_DIR / 'data' / 'buzzwords.txt')))
+feature_extractor = FeatureExtractor(buzzword_scanner)
+
+# The rules, the near-duplicate check and the rollups all need the features of
+# the same text, so the last few are kept rather than extracted again
+recent_features = LRUCache(max_size=64)
+
+def resume_features(resume_text):
+    """The ResumeFeatures of `resume_text`, extracted once per recent text."""
+    key = hashlib.blake2b(resume_text.encode("utf-8", "surrogatepass"), digest_size=16).digest()
+    features = recent_features.get(key)
+    if features is None:
+        features = feature_extractor.extract(resume_text)
+        recent_features.set(key, features)
+    return features
 
 # Create the main app without a prefix
 app = FastAPI()
@@ -48,6 +113,8 @@ class ResumeAnalysis(BaseModel):
     resume_text: str
     roast: str
     review: str
+    file_hash: Optional[str] = None
+    analysis_version: str = ANALYSIS_VERSION
     timestamp: datetime = Field(default_factory=datetime.utcnow)
 
 class ResumeResponse(BaseModel):
@@ -58,136 +125,117 @@ class ResumeResponse(BaseModel):
 
 # Helper functions for resume processing
 
-def extract_text_from_pdf(file_content):
-    """Extract text from PDF file content."""
-    try:
-        pdf_reader = PyPDF2.PdfReader(io.BytesIO(file_content))
-        text = ""
-        for page in pdf_reader.pages:
-            try:
-                page_text = page.extract_text()
-                if page_text:
-                    text += page_text + "\n"
-            except Exception as e:
-                logging.error(f"Error extracting text from PDF page: {e}")
-                continue
-        
-        # If PyPDF2 fails to extract any text, provide a fallback message
-        if not text.strip():
-            return "Unable to extract text from this PDF. It might be scanned or image-based."
-        
-        return text
-    except Exception as e:
-        logging.error(f"Error extracting text from PDF: {e}")
-        return "Unable to extract text from this PDF. It might be corrupted or password-protected."
+# Canned roast and review paragraphs. The ids are stored in resume_analyses in
+# place of the text (see storage.MessageCatalog), so never reword or remove one;
+# add a new id instead.
+ROAST_MESSAGES = {
+    "roast.buzzword_bingo": "I see you've used {buzzword_count} buzzwords in your resume. Going for the 'Corporate Buzzword Bingo' championship, are we?",
+    "roast.written_by_ai": "Your resume reads like it was written by AI - except AI would probably add more personality!",
+    "roast.word_count": "Wow, {word_count} words to say what could be summarized as 'Please hire me, I need money'.",
+    "roast.attention_to_detail": "I see you've listed 'attention to detail' as a skill, yet your resume formatting looks like it was done by someone texting while skydiving.",
+    "roast.generic_descriptions": "Your job descriptions sound so generic, I'm not sure if you worked at a company or just read their 'About Us' page.",
+    "roast.exaggerated_skills": "Your list of skills is impressive - almost as impressive as how many of them you probably exaggerated.",
+    "roast.microsoft_office": "Your 'proficient in Microsoft Office' skill is about as impressive as saying you're proficient in using a microwave.",
+    "roast.line_count": "Your resume is {line_count} lines long. That's {extra_lines} too many lines for someone with your experience.",
+    "roast.communication_skills": "I'm sure your 'excellent communication skills' will come in handy when you have to explain why you got roasted by a resume-analyzing app.",
+    "roast.no_numbers": "I counted {quantified_count} measurable results in this entire resume. Your impact is apparently classified.",
+    "roast.tenure_gap": "There's a {gap_months}-month hole in your timeline. Witness protection, or were you 'finding yourself'?",
+    "roast.wall_of_text": "Not one bullet point. Recruiters skim a resume in seconds, and yours reads like a terms-of-service agreement.",
+    "roast.passive_bullets": "{passive_bullets} of your {bullet_count} bullet points don't start with an action verb. 'Responsible for' is a job description, not an accomplishment.",
+    "roast.no_contact": "No email, no phone number. Bold move: making recruiters work harder to reach you than you worked on this resume.",
+    "roast.missing_sections": "Your resume is missing {missing_section_count} of the sections recruiters look for first. It's a mystery novel, minus the plot.",
+    "roast.six_seconds": "Somewhere a recruiter is about to give this resume the full six seconds it deserves.",
+    "roast.stock_photo": "This resume has the energy of a stock photo of people shaking hands in front of a whiteboard.",
+}
 
-def extract_text_from_docx(file_content):
-    """Extract text from DOCX file content."""
-    try:
-        doc = docx.Document(io.BytesIO(file_content))
-        text = ""
-        for para in doc.paragraphs:
-            if para.text:
-                text += para.text + "\n"
-                
-        # Also extract text from tables
-        for table in doc.tables:
-            for row in table.rows:
-                for cell in row.cells:
-                    if cell.text:
-                        text += cell.text + " "
-                text += "\n"
-        
-        # If no text was extracted, return a fallback message
-        if not text.strip():
-            return "Unable to extract text from this DOCX. It might be empty or contain only images."
-            
-        return text
-    except Exception as e:
-        logging.error(f"Error extracting text from DOCX: {e}")
-        return "Unable to extract text from this DOCX. It might be corrupted or in an unsupported format."
+REVIEW_MESSAGES = {
+    "review.quantify": "Your resume demonstrates some professional experience, but could benefit from more specific, quantifiable achievements.",
+    "review.concrete_examples": "Consider replacing generic statements with concrete examples that showcase your unique contributions.",
+    "review.structure": "The structure of your resume is decent, but you might want to prioritize more relevant experiences at the top.",
+    "review.skills_section": "Your skills section could be enhanced by adding proficiency levels and removing outdated or overly basic skills.",
+    "review.action_verbs": "Add more action verbs at the beginning of your job descriptions to make your contributions clearer.",
+    "review.summary": "Consider adding a brief personal summary at the top that highlights your career goals and unique value proposition.",
+    "review.metrics": "If you have specific metrics or achievements (increased sales by X%, reduced costs by Y%), definitely highlight those prominently.",
+    "review.tailoring": "Make sure your resume is tailored to each job application by emphasizing the skills and experiences most relevant to that position.",
+    "review.formatting": "Ensure consistent formatting throughout - uniform fonts, bullet styles, and spacing enhance readability.",
+    "review.add_contact": "Put your contact details (email, phone number and a LinkedIn profile) at the top so recruiters can reach you.",
+    "review.explain_gap": "Your timeline has a gap of about {gap_months} months. A short line explaining it (study, caregiving, freelancing) keeps it from raising questions.",
+    "review.use_bullets": "Break your experience into bullet points, one achievement each, so it can be skimmed in seconds.",
+    "review.add_experience": "Add a clearly labelled Experience section; recruiters and applicant tracking systems look for it first.",
+    "review.add_education": "Add an Education section, even a single line, so screeners don't assume it is missing.",
+    "review.add_skills": "Add a Skills section listing the tools and technologies you actually use; applicant tracking systems match on it.",
+    "review.add_dates": "Add start and end dates (month and year) to each role so your career progression is easy to follow.",
+    "review.proofread": "Proofread once more, or ask a friend to: a single typo can undo an otherwise strong first impression.",
+}
 
-def extract_text_from_gdrive_link(gdrive_link):
-    """Extract text from Google Drive document."""
-    try:
-        # For demonstration purposes, return a placeholder message
-        # In a production environment, you would implement proper Google Drive API integration
-        return "This is a placeholder text for Google Drive documents. Due to access restrictions and API limitations in this demo, we cannot process Google Drive files directly. Please download the file and upload it instead."
-    except Exception as e:
-        logging.error(f"Error extracting text from Google Drive link: {e}")
-        return "Unable to process Google Drive link. Please ensure it's publicly accessible or download and upload the file directly."
+# Which messages apply to a resume, scored from its ResumeFeatures; the best
+# 3-5 are used, padded with the filler rules when fewer than 3 apply. Bump
+# ANALYSIS_VERSION whenever a rule or score changes.
+ROAST_RULES = [
+    Rule("roast.buzzword_bingo", lambda f: 3 + f.buzzword_count if f.buzzword_count >= 3 else 0),
+    Rule("roast.no_numbers", lambda f: 6 if f.bullet_count >= 3 and f.quantified_count <= 1 else 0),
+    Rule("roast.tenure_gap", lambda f: 5 + f.longest_gap_months / 12 if f.longest_gap_months >= 12 else 0),
+    Rule("roast.wall_of_text", lambda f: 5 if f.bullet_count == 0 and f.non_empty_line_count >= 10 else 0),
+    Rule("roast.passive_bullets", lambda f: 4 if f.bullet_count >= 4 and f.action_bullet_count * 2 < f.bullet_count else 0),
+    Rule("roast.no_contact", lambda f: 7 if not (f.has_email or f.has_phone) else 0),
+    Rule("roast.missing_sections", lambda f: 2 + len(f.missing_sections) if len(f.missing_sections) >= 2 else 0),
+    Rule("roast.line_count", lambda f: 3 if f.non_empty_line_count > 60 else 0),
+    Rule("roast.word_count", lambda f: 3 if f.word_count > 800 else 0),
+    Rule("roast.microsoft_office", lambda f: 4 if f.term_counts.get("microsoft office") else 0),
+    Rule("roast.attention_to_detail", lambda f: 4 if f.term_counts.get("attention to detail") or f.term_counts.get("detail-oriented") else 0),
+    Rule("roast.communication_skills", lambda f: 4 if f.term_counts.get("communication skills") else 0),
+    Rule("roast.generic_descriptions", lambda f: 2 if f.bullet_count and f.quantified_count * 4 < f.bullet_count else 0),
+    Rule("roast.exaggerated_skills", lambda f: 1 if "skills" in f.sections else 0),
+    Rule("roast.written_by_ai", lambda f: 0, filler=True),
+    Rule("roast.six_seconds", lambda f: 0, filler=True),
+    Rule("roast.stock_photo", lambda f: 0, filler=True),
+]
+
+REVIEW_RULES = [
+    Rule("review.add_contact", lambda f: 9 if not (f.has_email or f.has_phone) else 0),
+    Rule("review.add_experience", lambda f: 8 if "experience" in f.missing_sections else 0),
+    Rule("review.metrics", lambda f: 7 if f.quantified_count <= 1 else 0),
+    Rule("review.explain_gap", lambda f: 6 if f.longest_gap_months >= 12 else 0),
+    Rule("review.use_bullets", lambda f: 6 if f.bullet_count == 0 and f.non_empty_line_count >= 10 else 0),
+    Rule("review.action_verbs", lambda f: 5 if f.bullet_count and f.action_bullet_count * 2 < f.bullet_count else 0),
+    Rule("review.add_dates", lambda f: 5 if "experience" in f.sections and not f.date_ranges else 0),
+    Rule("review.add_skills", lambda f: 4 if "skills" in f.missing_sections else 0),
+    Rule("review.add_education", lambda f: 3 if "education" in f.missing_sections else 0),
+    Rule("review.summary", lambda f: 3 if "summary" not in f.sections else 0),
+    Rule("review.quantify", lambda f: 2 if f.quantified_count * 3 < f.bullet_count else 0),
+    Rule("review.concrete_examples", lambda f: 2 if f.buzzword_count >= 3 else 0),
+    Rule("review.skills_section", lambda f: 1 if "skills" in f.sections else 0),
+    Rule("review.structure", lambda f: 1 if len(f.sections) >= 3 else 0),
+    Rule("review.tailoring", lambda f: 0, filler=True),
+    Rule("review.formatting", lambda f: 0, filler=True),
+    Rule("review.proofread", lambda f: 0, filler=True),
+]
 
 def generate_roast_and_review(resume_text):
     """Generate a humorous roast and a serious review of the resume."""
     try:
         # Since we don't have an API key, we'll generate content locally
-        # Create a humorous "roast" based on common resume patterns
-        
-        # Get some basic stats about the resume
-        word_count = len(resume_text.split())
-        lines = resume_text.split('\n')
-        non_empty_lines = [line for line in lines if line.strip()]
-        line_count = len(non_empty_lines)
-        
-        buzzwords = [
-            "self-starter", "team player", "detail-oriented", "hardworking", 
-            "passionate", "motivated", "innovative", "results-driven", 
-            "proactive", "synergy", "leverage", "optimize", "strategic",
-            "dynamic", "solutions", "expert", "specialized", "experienced",
-            "skillset", "qualified", "professional", "leadership"
-        ]
+        # Create a humorous "roast" based on what the resume contains
         
-        buzzword_count = sum(1 for word in buzzwords if word.lower() in resume_text.lower())
+        # Every feature of the resume from one pass over its text
+        features = resume_features(resume_text)
         
-        # Generate a roast based on the stats
-        roast_messages = [
-            f"I see you've used {buzzword_count} buzzwords in your resume. Going for the 'Corporate Buzzword Bingo' championship, are we?",
-            
-            "Your resume reads like it was written by AI - except AI would probably add more personality!",
-            
-            f"Wow, {word_count} words to say what could be summarized as 'Please hire me, I need money'.",
-            
-            "I see you've listed 'attention to detail' as a skill, yet your resume formatting looks like it was done by someone texting while skydiving.",
-            
-            "Your job descriptions sound so generic, I'm not sure if you worked at a company or just read their 'About Us' page.",
-            
-            "Your list of skills is impressive - almost as impressive as how many of them you probably exaggerated.",
-            
-            "Your 'proficient in Microsoft Office' skill is about as impressive as saying you're proficient in using a microwave.",
-            
-            f"Your resume is {line_count} lines long. That's {line_count - 10} too many lines for someone with your experience.",
-            
-            "I'm sure your 'excellent communication skills' will come in handy when you have to explain why you got roasted by a resume-analyzing app.",
-        ]
+        # Values for the fields in the message templates
+        params = {
+            "buzzword_count": features.buzzword_count,
+            "word_count": features.word_count,
+            "line_count": features.non_empty_line_count,
+            "extra_lines": features.non_empty_line_count - 10,
+            "quantified_count": features.quantified_count,
+            "gap_months": features.longest_gap_months,
+            "bullet_count": features.bullet_count,
+            "passive_bullets": features.bullet_count - features.action_bullet_count,
+            "missing_section_count": len(features.missing_sections),
+        }
         
-        # Generate a constructive review
-        review_messages = [
-            "Your resume demonstrates some professional experience, but could benefit from more specific, quantifiable achievements.",
-            
-            "Consider replacing generic statements with concrete examples that showcase your unique contributions.",
-            
-            "The structure of your resume is decent, but you might want to prioritize more relevant experiences at the top.",
-            
-            "Your skills section could be enhanced by adding proficiency levels and removing outdated or overly basic skills.",
-            
-            "Add more action verbs at the beginning of your job descriptions to make your contributions clearer.",
-            
-            "Consider adding a brief personal summary at the top that highlights your career goals and unique value proposition.",
-            
-            "If you have specific metrics or achievements (increased sales by X%, reduced costs by Y%), definitely highlight those prominently.",
-            
-            "Make sure your resume is tailored to each job application by emphasizing the skills and experiences most relevant to that position.",
-            
-            "Ensure consistent formatting throughout - uniform fonts, bullet styles, and spacing enhance readability."
-        ]
-        
-        import random
-        # Select 3-5 random messages for each category
-        roast_count = min(5, max(3, int(line_count / 10)))
-        review_count = min(5, max(3, int(line_count / 10)))
-        
-        selected_roasts = random.sample(roast_messages, roast_count)
-        selected_reviews = random.sample(review_messages, review_count)
+        # The same text always gets the same 3-5 messages of each kind
+        selected_roasts = [ROAST_MESSAGES[key].format(**params) for key in select_messages(ROAST_RULES, features, resume_text)]
+        selected_reviews = [REVIEW_MESSAGES[key].format(**params) for key in select_messages(REVIEW_RULES, features, resume_text)]
         
         roast = "\n\n".join(selected_roasts)
         review = "\n\n".join(selected_reviews)
@@ -201,61 +249,277 @@ def generate_roast_and_review(resume_text):
         review = "Your resume could benefit from more specific achievements and metrics to showcase your impact. Consider removing generic statements and focusing on concrete examples of your contributions. A well-structured summary at the top can also help highlight your unique value proposition and career goals."
         return roast, review
 
+# Roast generator: the local templates by default, or an LLM (ROAST_ENGINE=llm)
+roast_engine = create_roast_engine(generate_roast_and_review)
+
+# Cache key for analyses produced by the configured engine
+ANALYSIS_KEY = f"{ANALYSIS_VERSION}:{roast_engine.name}"
+
+# Compact resume_analyses storage with batched background inserts
+analysis_store = AnalysisStore.from_env(db, MessageCatalog({**ROAST_MESSAGES, **REVIEW_MESSAGES}))
+
+# Cache of extracted text and analyses keyed by the SHA-256 of the uploaded file
+analysis_cache = AnalysisCache.from_env(analysis_store)
+
+# Near-duplicate lookup: a lightly edited re-upload whose ResumeFeatures did not
+# change reuses the earlier analysis (see find_similar_analysis).
+# Signatures are written in batches to resume_signatures and mirrored in memory.
+similarity_index = SimilarityIndex.from_env(writer=BatchWriter(None))
+SIMILARITY_REFRESH_SECONDS = float(os.environ.get('SIMILARITY_REFRESH_SECONDS', '60'))
+
+# Retention: the API maintains the TTL indexes and deletes expired GridFS resume
+# texts, which no TTL index covers; archive.py archives expired documents
+retention_policy = RetentionPolicy.from_env()
+TEXT_EXPIRY_INTERVAL_SECONDS = float(os.environ.get('TEXT_EXPIRY_INTERVAL_SECONDS', '3600'))
+
+# Daily analytics counters for /api/stats, flushed as $inc upserts in the background
+rollups = Rollups.from_env(buzzword_scanner)
+
+# Admission control: a per-process concurrency gate with a short wait queue,
+# taken once per document around its extraction and analysis
+admission_gate = AdmissionGate.from_env()
+
+@asynccontextmanager
+async def admitted(blocking=False, max_wait=None):
+    """Hold an admission gate slot; a saturated gate becomes a 503 with Retry-After."""
+    try:
+        async with admission_gate.admit(blocking, max_wait):
+            yield
+    except Overloaded as e:
+        raise HTTPException(
+            status_code=503,
+            detail="Server is busy. Please retry shortly.",
+            headers={"Retry-After": str(retry_after_header(e.retry_after))},
+        )
+
+def use_database(database):
+    """Point every Mongo user in this module at `database`."""
+    global db
+    db = database
+    analysis_store.use_database(database)
+    similarity_index.use_database(database)
+    rollups.use_database(database)
+
+# Queue for ?async=1 uploads: Redis when JOB_QUEUE_URL is set, otherwise in-process.
+# With Redis, uploads can be left to standalone workers (worker.py) by setting
+# JOB_WORKERS=0 on the web processes.
+job_queue = create_job_queue()
+# A job in the in-process queue can only be polled from the process that queued
+# it, so with several web workers (WEB_CONCURRENCY) ?async=1 needs Redis
+JOB_QUEUE_SHARED = isinstance(job_queue, RedisJobQueue) or int(os.environ.get('WEB_CONCURRENCY', '1')) <= 1
+
 # API Routes
 @api_router.get("/")
 async def root():
     return {"message": "Resume Roaster API is running"}
 
+async def analyze_upload(upload, analysis_id=None, blocking=False, max_wait=None):
+    """Extract and analyze an ingested upload, reusing cached text and analyses.
+
+    Returns the response and the ResumeAnalysis to store, or None in its place
+    when the analysis was served from the cache. The work after the cache
+    lookup holds an admission gate slot; `blocking` waits for one (for at most
+    `max_wait` seconds when given) instead of answering 503 when the gate is
+    saturated.
+    """
+    # Identical bytes were analyzed before: skip extraction and analysis
+    file_hash = upload.digest
+    with stage("cache_lookup"):
+        cached = await analysis_cache.get_analysis(file_hash, ANALYSIS_KEY)
+    if cached is not None:
+        count_analysis(upload.file_type, "cached")
+        return ResumeResponse(**cached), None
+
+    try:
+        async with admitted(blocking, max_wait):
+            resume_text = await extract_upload_text(upload)
+            similar = await find_similar_analysis(resume_text, file_hash)
+            if similar is not None:
+                count_analysis(upload.file_type, "similar", resume_text)
+                return ResumeResponse(**similar), None
+            return await analyze_text(resume_text, upload.file_type, file_hash, analysis_id)
+    except Exception as e:
+        count_analysis(upload.file_type, analysis_error_outcome(e))
+        raise
+
+def count_analysis(file_type, outcome, resume_text=None, timestamp=None):
+    """Count an analysis in the metrics by outcome and, when it was of `resume_text`, in the rollups.
+
+    The one place uploads, SSE streams, batches and jobs record their analyses.
+    Cache hits pass no text: they are the same file analyzed before.
+    """
+    ANALYSES.labels(file_type, outcome).inc()
+    if resume_text is not None:
+        rollups.record_analysis(timestamp or datetime.utcnow(), file_type, resume_features(resume_text))
+
+def analysis_error_outcome(error):
+    """The resume_analyses_total outcome for an analysis that raised `error`."""
+    if isinstance(error, HTTPException) and error.status_code == 503:
+        # Turned away by the admission gate, counted there too
+        return "rejected"
+    if isinstance(error, HTTPException) and error.status_code < 500:
+        return "client_error"
+    return "error"
+
+async def extract_upload_text(upload):
+    """Extract an upload's text, reusing text cached under the same digest."""
+    with stage("cache_lookup"):
+        resume_text = await analysis_cache.get_text(upload.digest)
+    if resume_text is not None:
+        EXTRACTIONS.labels(upload.file_type, "cached").inc()
+    else:
+        try:
+            with stage("extract"):
+                result = await extraction_pool.extract(upload.file_type, upload.payload())
+        except ExtractionTimeout:
+            EXTRACTIONS.labels(upload.file_type, "timeout").inc()
+            rollups.record_extraction(datetime.utcnow(), upload.file_type, "timeout")
+            raise HTTPException(status_code=422, detail="Timed out extracting text from the document. It might be too large or malformed.")
+        resume_text = result.text
+        if result.pages is not None:
+            DOCUMENT_PAGES.observe(result.pages)
+            record_pdf_pages(result)
+        EXTRACTIONS.labels(upload.file_type, "fallback" if result.failed else "ok" if resume_text else "empty").inc()
+        rollups.record_extraction(datetime.utcnow(), upload.file_type, "failed" if result.failed else "ok" if resume_text else "empty")
+        if result.failed:
+            # The fallback message is not resume text: never analyze, store or cache it
+            raise HTTPException(status_code=422, detail=result.text)
+        await analysis_cache.put_text(upload.digest, upload.file_type, resume_text)
+
+    if not resume_text:
+        raise HTTPException(status_code=400, detail="Failed to extract text from the document")
+    return resume_text
+
+async def find_similar_analysis(resume_text, file_hash=None):
+    """An earlier analysis of nearly the same text (see SimilarityIndex), or None.
+
+    The earlier analysis is only reused when its text has exactly the same
+    ResumeFeatures as the new one: an edit that adds contact details, a
+    section or a bullet point changes what the roast and review should say,
+    however small it is.
+    """
+    with stage("similarity"):
+        match = similarity_index.find(resume_text, ANALYSIS_KEY)
+    if match is None:
+        return None
+    with stage("cache_lookup"):
+        stored = await analysis_store.get(match.analysis_id, include_text=True)
+    if stored is None:
+        similarity_index.discard(match.analysis_id)
+        return None
+    with stage("similarity"):
+        if feature_extractor.extract(stored["resume_text"]) != resume_features(resume_text):
+            return None
+    analysis = {field: stored[field] for field in ("id", "roast", "review", "timestamp")}
+    if file_hash:
+        # The same file again is then a plain cache hit
+        analysis_cache.put_analysis(file_hash, ANALYSIS_KEY, analysis)
+    return analysis
+
+async def analyze_text(resume_text, file_type, file_hash=None, analysis_id=None):
+    """Generate the roast and review for extracted text."""
+    with stage("roast"):
+        roast, review, engine = await roast_engine.generate(resume_text)
+
+    resume_analysis = ResumeAnalysis(
+        id=analysis_id or str(uuid.uuid4()),
+        resume_text=resume_text,
+        roast=roast,
+        review=review,
+        file_hash=file_hash,
+        # Tagged with the engine that actually answered, so fallback results are
+        # not served from the cache in place of the configured engine's output
+        analysis_version=f"{ANALYSIS_VERSION}:{engine}"
+    )
+    count_analysis(file_type, "generated", resume_text, resume_analysis.timestamp)
+    response = ResumeResponse(
+        id=resume_analysis.id,
+        roast=roast,
+        review=review,
+        timestamp=resume_analysis.timestamp
+    )
+    return response, resume_analysis
+
+async def save_analysis(resume_analysis, response):
+    """Queue an analysis for storage and remember it in the cache under its file hash."""
+    with stage("save"):
+        await analysis_store.save(resume_analysis.dict())
+        await similarity_index.add(resume_analysis.id, resume_analysis.resume_text,
+                                   resume_analysis.analysis_version, resume_analysis.timestamp)
+    if resume_analysis.file_hash:
+        analysis_cache.put_analysis(resume_analysis.file_hash, resume_analysis.analysis_version, response.dict())
+
+async def ingest_gdrive_link(gdrive_link):
+    """Download a Drive link into a SpooledUpload, turning Drive errors into HTTP errors."""
+    import httpx
+
+    try:
+        with stage("download"):
+            drive_file = await drive_client.download(gdrive_link)
+    except DriveFileTooLarge:
+        raise HTTPException(status_code=413, detail=f"File too large. The maximum size is {MAX_UPLOAD_BYTES // (1024 * 1024)} MB.")
+    except DriveError as e:
+        logging.error(f"Error downloading Google Drive link: {e}")
+        raise HTTPException(status_code=400, detail="Unable to process Google Drive link. Please ensure it's publicly accessible or download and upload the file directly.")
+    except httpx.HTTPError as e:
+        logging.error(f"Error downloading Google Drive link: {e}")
+        raise HTTPException(status_code=502, detail="Google Drive did not answer. Please try again later.")
+
+    upload = SpooledUpload(max_size=MAX_UPLOAD_BYTES, spool_size=UPLOAD_SPOOL_BYTES)
+    upload.write(drive_file.content)
+    upload.finish()
+    upload.file_type = sniff_format(upload)
+    if upload.file_type not in ("pdf", "docx"):
+        upload.close()
+        raise HTTPException(status_code=400, detail="Unsupported file format. Please share a PDF or DOCX file.")
+    record_upload(upload)
+    return upload
+
+async def ingest_resume_file(file):
+    """Ingest a single resume upload, turning ingestion errors into HTTP errors."""
+    try:
+        with stage("ingest"):
+            upload = await ingest_upload(file, max_size=MAX_UPLOAD_BYTES, spool_size=UPLOAD_SPOOL_BYTES)
+        record_upload(upload)
+        return upload
+    except UploadTooLarge:
+        raise HTTPException(status_code=413, detail=f"File too large. The maximum size is {MAX_UPLOAD_BYTES // (1024 * 1024)} MB.")
+    except UnsupportedFormat:
+        raise HTTPException(status_code=400, detail="Unsupported file format. Please upload a PDF or DOCX file.")
+
 @api_router.post("/upload-resume")
 async def upload_resume(
     file: Optional[UploadFile] = File(None),
-    gdrive_link: Optional[str] = Form(None)
+    gdrive_link: Optional[str] = Form(None),
+    async_mode: bool = Query(False, alias="async")
 ):
-    """Upload and analyze a resume."""
+    """Upload and analyze a resume.
+
+    With `?async=1` the upload is queued instead and a job id is returned at
+    once; poll GET /api/analyses/{id} for the result.
+    """
+    if async_mode:
+        return await enqueue_upload(file, gdrive_link)
+
     try:
-        resume_text = None
-        
-        # Process file upload
+        # Process file upload, or the file behind a Google Drive link
         if file:
-            file_content = await file.read()
-            filename = file.filename.lower()
-            
-            if filename.endswith('.pdf'):
-                resume_text = extract_text_from_pdf(file_content)
-            elif filename.endswith('.docx'):
-                resume_text = extract_text_from_docx(file_content)
-            else:
-                raise HTTPException(status_code=400, detail="Unsupported file format. Please upload a PDF or DOCX file.")
-        
-        # Process Google Drive link
+            upload = await ingest_resume_file(file)
         elif gdrive_link:
-            resume_text = extract_text_from_gdrive_link(gdrive_link)
-        
+            upload = await ingest_gdrive_link(gdrive_link)
         else:
             raise HTTPException(status_code=400, detail="No file or Google Drive link provided")
-        
-        if not resume_text:
-            raise HTTPException(status_code=400, detail="Failed to extract text from the document")
-        
-        # Generate roast and review using local logic
-        roast, review = generate_roast_and_review(resume_text)
+        try:
+            response, resume_analysis = await analyze_upload(upload)
+        finally:
+            upload.close()
         
         # Save to database
-        resume_analysis = ResumeAnalysis(
-            resume_text=resume_text,
-            roast=roast,
-            review=review
-        )
-        
-        result = await db.resume_analyses.insert_one(resume_analysis.dict())
+        if resume_analysis is not None:
+            await save_analysis(resume_analysis, response)
         
         # Return response
-        return ResumeResponse(
-            id=resume_analysis.id,
-            roast=roast,
-            review=review,
-            timestamp=resume_analysis.timestamp
-        )
+        return response
         
     except HTTPException as e:
         raise e
@@ -263,20 +527,473 @@ async def upload_resume(
         logging.error(f"Error processing resume: {e}")
         raise HTTPException(status_code=500, detail=f"Error processing resume: {str(e)}")
 
+async def enqueue_upload(file, gdrive_link):
+    """Queue an upload for the job workers and answer 202 with the job id."""
+    if not JOB_QUEUE_SHARED:
+        raise HTTPException(
+            status_code=503,
+            detail="Queued uploads are unavailable: this server runs several workers without a shared job queue",
+        )
+    if file:
+        upload = await ingest_resume_file(file)
+        try:
+            with upload.open() as f:
+                payload = f.read()
+        finally:
+            upload.close()
+        job_id = await job_queue.enqueue({"file_type": upload.file_type}, payload)
+    elif gdrive_link:
+        job_id = await job_queue.enqueue({"gdrive_link": gdrive_link})
+    else:
+        raise HTTPException(status_code=400, detail="No file or Google Drive link provided")
+    return JSONResponse(status_code=202, content={"id": job_id, "status": "queued"})
+
+# A job waiting on the admission gate is still inside its visibility timeout:
+# give up well before it runs out and retry later, rather than have the job
+# requeued and analyzed twice
+JOB_ADMISSION_MAX_WAIT = job_queue.visibility_timeout / 2
+
+async def process_job(job):
+    """Job handler: analyze a queued upload and store the result under the job id."""
+    with JOBS_IN_FLIGHT.track_inprogress():
+        return await run_job(job)
+
+async def run_job(job):
+    try:
+        if job.payload is not None:
+            upload = SpooledUpload(max_size=MAX_UPLOAD_BYTES, spool_size=UPLOAD_SPOOL_BYTES)
+            try:
+                upload.write(job.payload)
+                upload.finish()
+                upload.file_type = job.meta["file_type"]
+                response, resume_analysis = await analyze_upload(upload, analysis_id=job.id, blocking=True, max_wait=JOB_ADMISSION_MAX_WAIT)
+            finally:
+                upload.close()
+        else:
+            upload = await ingest_gdrive_link(job.meta["gdrive_link"])
+            try:
+                response, resume_analysis = await analyze_upload(upload, analysis_id=job.id, blocking=True, max_wait=JOB_ADMISSION_MAX_WAIT)
+            finally:
+                upload.close()
+    except HTTPException as e:
+        # Client errors will fail the same way on every attempt
+        raise JobFailed({"status_code": e.status_code, "detail": e.detail}, retry=e.status_code >= 500)
+
+    if resume_analysis is not None:
+        await save_analysis(resume_analysis, response)
+    # A cache hit or near-duplicate points the job at the earlier analysis
+    return {"analysis_id": response.id}
+
+job_workers = JobWorkerPool(
+    job_queue,
+    process_job,
+    concurrency=int(os.environ.get('JOB_WORKERS', '0' if os.environ.get('JOB_QUEUE_URL') else '2')),
+)
+
+@api_router.get("/analyses")
+async def list_analyses(
+    limit: int = Query(100, ge=1, le=1000),
+    cursor: Optional[str] = None
+):
+    """List analyses (id, timestamp, file_hash, analysis_version), newest first.
+
+    Paginated like /api/status; fetch an analysis by id for its roast and review.
+    """
+    try:
+        items, next_cursor = await analysis_store.list_page(limit, cursor)
+    except InvalidCursor:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return paginated_response(items, next_cursor)
+
+@api_router.get("/analyses/{analysis_id}")
+async def get_analysis(analysis_id: str):
+    """Fetch an analysis by id, or the status of the queued job with that id."""
+    job = await job_queue.get_status(analysis_id)
+    if job is not None:
+        if job["status"] in ("queued", "processing"):
+            return JSONResponse(status_code=202, content={"id": analysis_id, "status": job["status"], "attempts": job["attempts"]})
+        if job["status"] == "failed":
+            error = job["error"]
+            return JSONResponse(status_code=error["status_code"], content={"id": analysis_id, "status": "failed", "detail": error["detail"]})
+        analysis_id = job["result"]["analysis_id"]
+
+    document = await analysis_store.get(analysis_id)
+    if document is None:
+        raise HTTPException(status_code=404, detail="Analysis not found")
+    return ResumeResponse(**document)
+
+@api_router.get("/healthz")
+async def healthz():
+    """Liveness: the process is up and serving requests."""
+    return {"status": "ok"}
+
+@api_router.get("/readyz")
+async def readyz():
+    """Readiness: Mongo answers a ping and the parsers are warmed up (503 otherwise)."""
+    checks = {"parsers": readiness["parsers"], "mongo": False}
+    try:
+        await asyncio.wait_for(db.command("ping"), timeout=READY_PING_TIMEOUT)
+        checks["mongo"] = True
+    except Exception:
+        pass
+    ready = all(checks.values())
+    return JSONResponse(status_code=200 if ready else 503, content={"status": "ready" if ready else "not ready", "checks": checks})
+
+@api_router.get("/jobs/metrics")
+async def get_job_metrics():
+    """Queue depth, in-flight jobs and this process's worker counters."""
+    return {**await job_queue.metrics(), "workers": job_workers.stats()}
+
+@api_router.post("/upload-resume/stream")
+async def upload_resume_stream(
+    file: Optional[UploadFile] = File(None),
+    gdrive_link: Optional[str] = Form(None)
+):
+    """Upload and analyze a resume, streaming progress as server-sent events.
+
+    Events, in order: `received`, `extracted`, any number of `roast` and `review`
+    chunks, then `saved` with the analysis id once it is stored (or `error`).
+    The analysis is only written after the roast and review have been sent.
+    """
+    if file:
+        upload = await ingest_resume_file(file)
+    elif gdrive_link:
+        upload = await ingest_gdrive_link(gdrive_link)
+    else:
+        raise HTTPException(status_code=400, detail="No file or Google Drive link provided")
+
+    return StreamingResponse(
+        stream_analysis_events(upload),
+        media_type="text/event-stream",
+        # X-Accel-Buffering tells nginx not to buffer this response
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+def sse_event(event, data):
+    return f"event: {event}\ndata: {json.dumps(jsonable_encoder(data))}\n\n"
+
+async def stream_analysis_events(upload):
+    """Yield the SSE events for one upload (or downloaded Drive file)."""
+    file_type = upload.file_type
+    try:
+        file_hash = upload.digest
+        yield sse_event("received", {"size": upload.size, "file_type": upload.file_type})
+        with stage("cache_lookup"):
+            cached = await analysis_cache.get_analysis(file_hash, ANALYSIS_KEY)
+        if cached is not None:
+            count_analysis(file_type, "cached")
+            yield sse_event("extracted", {"cached": True})
+            yield sse_event("roast", {"text": cached["roast"]})
+            yield sse_event("review", {"text": cached["review"]})
+            yield sse_event("saved", {"id": cached["id"], "timestamp": cached["timestamp"], "cached": True})
+            return
+        # The roast is streamed outside the gate, so a slow reader holds no slot
+        async with admitted():
+            resume_text = await extract_upload_text(upload)
+            upload.close()
+            similar = await find_similar_analysis(resume_text, file_hash)
+        if similar is not None:
+            count_analysis(file_type, "similar", resume_text)
+            yield sse_event("extracted", {"characters": len(resume_text), "similar": True})
+            yield sse_event("roast", {"text": similar["roast"]})
+            yield sse_event("review", {"text": similar["review"]})
+            yield sse_event("saved", {"id": similar["id"], "timestamp": similar["timestamp"], "cached": True})
+            return
+        yield sse_event("extracted", {"characters": len(resume_text)})
+
+        sections = {"roast": [], "review": []}
+        engine = roast_engine.name
+        # Includes the time the client takes to read the chunks
+        with stage("roast"):
+            async for chunk in roast_engine.stream(resume_text):
+                sections[chunk.section].append(chunk.text)
+                engine = chunk.engine
+                yield sse_event(chunk.section, {"text": chunk.text})
+
+        # Save to database now that the client has the whole roast and review
+        resume_analysis = ResumeAnalysis(
+            resume_text=resume_text,
+            roast="".join(sections["roast"]).strip(),
+            review="".join(sections["review"]).strip(),
+            file_hash=file_hash,
+            analysis_version=f"{ANALYSIS_VERSION}:{engine}"
+        )
+        count_analysis(file_type, "generated", resume_text, resume_analysis.timestamp)
+        await save_analysis(resume_analysis, ResumeResponse(**resume_analysis.dict()))
+        yield sse_event("saved", {"id": resume_analysis.id, "timestamp": resume_analysis.timestamp})
+    except HTTPException as e:
+        count_analysis(file_type, analysis_error_outcome(e))
+        yield sse_event("error", {"status_code": e.status_code, "detail": e.detail})
+    except Exception as e:
+        count_analysis(file_type, analysis_error_outcome(e))
+        logging.error(f"Error processing resume: {e}")
+        yield sse_event("error", {"status_code": 500, "detail": f"Error processing resume: {str(e)}"})
+    finally:
+        upload.close()
+
+@api_router.post("/upload-resumes")
+async def upload_resumes(
+    files: List[UploadFile] = File([]),
+    archive: Optional[UploadFile] = File(None)
+):
+    """Analyze many resumes (files and/or a ZIP archive) and stream NDJSON results.
+
+    Each line is emitted as soon as its resume is analyzed; a failing item is
+    reported on its own line and never fails the batch. Analyses are stored
+    through the analysis store's batched writer.
+    """
+    if not files and not archive:
+        raise HTTPException(status_code=400, detail="No files or archive provided")
+
+    # Form files are closed once this function returns, so ingest them up front
+    items = []
+    for file in files or []:
+        try:
+            with stage("ingest"):
+                upload = await ingest_upload(file, max_size=MAX_UPLOAD_BYTES, spool_size=UPLOAD_SPOOL_BYTES)
+            record_upload(upload)
+            items.append((file.filename, upload))
+        except (UploadTooLarge, UnsupportedFormat) as e:
+            items.append((file.filename, e))
+    if archive:
+        try:
+            with stage("ingest"):
+                archive_upload = await ingest_upload(archive, max_size=MAX_BATCH_BYTES, spool_size=UPLOAD_SPOOL_BYTES, expected_types=("zip",))
+        except (UploadTooLarge, UnsupportedFormat):
+            close_batch_items(items)
+            raise HTTPException(status_code=400, detail=f"The archive must be a ZIP file of at most {MAX_BATCH_BYTES // (1024 * 1024)} MB.")
+        try:
+            members = await asyncio.to_thread(
+                expand_zip, archive_upload, max_size=MAX_UPLOAD_BYTES, spool_size=UPLOAD_SPOOL_BYTES, max_members=MAX_BATCH_FILES,
+                max_total=MAX_BATCH_INFLATED_BYTES,
+            )
+        except ArchiveTooLarge:
+            close_batch_items(items)
+            raise HTTPException(status_code=413, detail=f"The archive's files add up to more than {MAX_BATCH_INFLATED_BYTES // (1024 * 1024)} MB.")
+        finally:
+            archive_upload.close()
+        for _, upload in members:
+            if not isinstance(upload, Exception):
+                record_upload(upload)
+        items.extend(members)
+    if len(items) > MAX_BATCH_FILES:
+        close_batch_items(items)
+        raise HTTPException(status_code=400, detail=f"Too many files. A batch may contain at most {MAX_BATCH_FILES} resumes.")
+
+    return StreamingResponse(stream_batch_results(items), media_type="application/x-ndjson")
+
+def close_batch_items(items):
+    for _, upload in items:
+        if not isinstance(upload, Exception):
+            upload.close()
+
+def batch_error_detail(error):
+    if isinstance(error, UploadTooLarge):
+        return f"File too large. The maximum size is {MAX_UPLOAD_BYTES // (1024 * 1024)} MB."
+    if isinstance(error, (UnsupportedFormat, zipfile.BadZipFile)):
+        return "Unsupported file format. Please upload a PDF or DOCX file."
+    if isinstance(error, HTTPException):
+        return error.detail
+    return f"Error processing resume: {str(error)}"
+
+async def stream_batch_results(items):
+    """Process batch items with bounded concurrency, yielding NDJSON lines as they finish."""
+    semaphore = asyncio.Semaphore(BATCH_CONCURRENCY)
+
+    async def process(index, filename, upload):
+        if isinstance(upload, Exception):
+            return index, filename, upload, None
+        async with semaphore:
+            try:
+                return index, filename, *await analyze_upload(upload, blocking=True)
+            except Exception as e:
+                if not isinstance(e, HTTPException):
+                    logging.error(f"Error processing resume {filename}: {e}")
+                return index, filename, e, None
+            finally:
+                upload.close()
+
+    tasks = [asyncio.ensure_future(process(index, filename, upload)) for index, (filename, upload) in enumerate(items)]
+    failed = 0
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            index, filename, result, resume_analysis = await next_done
+            if isinstance(result, Exception):
+                failed += 1
+                line = {"index": index, "filename": filename, "status": "error", "detail": batch_error_detail(result)}
+            else:
+                line = {"index": index, "filename": filename, "status": "ok", "result": jsonable_encoder(result)}
+                if resume_analysis is not None:
+                    await save_analysis(resume_analysis, result)
+            yield json.dumps(line) + "\n"
+        yield json.dumps({"status": "done", "total": len(items), "succeeded": len(items) - failed, "failed": failed}) + "\n"
+    finally:
+        # The client may disconnect mid-stream
+        for task in tasks:
+            task.cancel()
+        close_batch_items(items)
+
+@api_router.get("/stats")
+async def get_stats(
+    since: Optional[str] = Query(None, description="First day (YYYY-MM-DD, UTC); defaults to 29 days before until"),
+    until: Optional[str] = Query(None, description="Last day (YYYY-MM-DD, UTC); defaults to today"),
+    top: int = Query(20, ge=0, le=200),
+):
+    """Product metrics per day and the top buzzwords, read from the rollups only."""
+    try:
+        since, until = day_range(since, until)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Days must be given as YYYY-MM-DD")
+    try:
+        return await rollups.read(since, until, top)
+    except Exception as e:
+        logging.error(f"Error reading stats: {e}")
+        raise HTTPException(status_code=500, detail="Error reading stats")
+
+@api_router.get("/rollups/stats")
+async def get_rollup_stats():
+    """Pending deltas and flush counters of this process's analytics rollups."""
+    return rollups.stats()
+
+@api_router.get("/cache/stats")
+async def get_cache_stats():
+    """Hit/miss counters for the extracted-text and analysis caches."""
+    return analysis_cache.stats()
+
+@api_router.get("/storage/stats")
+async def get_storage_stats():
+    """Text codec and batched writer counters for resume_analyses."""
+    return analysis_store.stats()
+
+@api_router.get("/ocr/stats")
+async def get_ocr_stats():
+    """Budgets and page cache counters of this process's OCR fallback."""
+    return extraction_pool.ocr.stats() if extraction_pool.ocr else {"enabled": False}
+
+@api_router.get("/similarity/stats")
+async def get_similarity_stats():
+    """Size, banding and match counters of this process's near-duplicate index."""
+    return similarity_index.stats()
+
+@api_router.get("/admission/stats")
+async def get_admission_stats():
+    """This process's gate occupancy, wait queue and rejections, and the rate limiter's."""
+    return {"gate": admission_gate.stats(), "rate_limit": rate_limiter.stats() if rate_limiter else None}
+
+@api_router.get("/roast/stats")
+async def get_roast_stats():
+    """Call, coalescing and fallback counters for the roast engine."""
+    return {"engine": roast_engine.name, **roast_engine.stats()}
+
+# Admin endpoints: answered only when ADMIN_TOKEN is set and sent as X-Admin-Token
+ADMIN_TOKEN = os.environ.get('ADMIN_TOKEN')
+
+async def require_admin(x_admin_token: Optional[str] = Header(None)):
+    if not ADMIN_TOKEN or not x_admin_token or not secrets.compare_digest(x_admin_token, ADMIN_TOKEN):
+        raise HTTPException(status_code=403, detail="Admin token required")
+
+@api_router.post("/admin/profile", dependencies=[Depends(require_admin)])
+async def start_profiling(requests: int = Query(10, ge=1, le=1000)):
+    """Profile the next `requests` uploads handled by this process."""
+    request_profiler.arm(requests)
+    return request_profiler.stats()
+
+@api_router.get("/admin/profile", dependencies=[Depends(require_admin)])
+async def get_profiles():
+    """Whether profiling is armed, and the kept profiles with their stage timings."""
+    return request_profiler.stats()
+
+@api_router.get("/admin/profile/folded", dependencies=[Depends(require_admin)])
+async def get_folded_profile(reason: Optional[str] = Query(None), index: Optional[int] = Query(None)):
+    """The kept profiles' stacks merged in folded format, for flamegraph.pl or speedscope.
+
+    `reason` (requested, slow) and `index` (into that list, -1 for the newest)
+    narrow it down to some or one of them.
+    """
+    profiles = request_profiler.select(reason, index)
+    if not profiles:
+        raise HTTPException(status_code=404, detail="No matching profiles")
+    return Response(content=request_profiler.folded(profiles), media_type="text/plain")
+
+def paginated_response(items, next_cursor):
+    """Stream a page as a JSON array, with the next page's cursor in X-Next-Cursor."""
+    headers = {"X-Next-Cursor": next_cursor} if next_cursor else {}
+    return StreamingResponse(stream_json_array(items), media_type="application/json", headers=headers)
+
 @api_router.get("/status", response_model=List[StatusCheck])
-async def get_status_checks():
-    status_checks = await db.status_checks.find().to_list(1000)
-    return [StatusCheck(**status_check) for status_check in status_checks]
+async def get_status_checks(
+    limit: int = Query(100, ge=1, le=1000),
+    cursor: Optional[str] = None
+):
+    """List status checks, newest first.
+
+    Pass the X-Next-Cursor header of a page as `cursor` to get the next one;
+    the last page has no X-Next-Cursor.
+    """
+    try:
+        status_checks, next_cursor = await fetch_page(
+            db.status_checks, {}, {"id": 1, "client_name": 1, "timestamp": 1}, limit, cursor,
+        )
+    except InvalidCursor:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    items = (
+        {"id": status_check.get("id"), "client_name": status_check.get("client_name"), "timestamp": status_check.get("timestamp")}
+        for status_check in status_checks
+    )
+    return paginated_response(items, next_cursor)
 
 # Include the router in the main app
 app.include_router(api_router)
 
+@app.get("/metrics", include_in_schema=False)
+async def get_metrics():
+    """Prometheus metrics. Served outside /api, so nginx does not expose it publicly."""
+    body, content_type = render_metrics()
+    return Response(content=body, media_type=content_type)
+
+UPLOAD_BODY_LIMITS = {
+    "/api/upload-resume": MAX_UPLOAD_BYTES,
+    "/api/upload-resume/stream": MAX_UPLOAD_BYTES,
+    "/api/upload-resumes": MAX_BATCH_BYTES,
+}
+
+@app.middleware("http")
+async def reject_oversized_uploads(request, call_next):
+    """Answer 413 from the Content-Length header before any of the body is read."""
+    limit = UPLOAD_BODY_LIMITS.get(request.url.path) if request.method == "POST" else None
+    if limit:
+        content_length = request.headers.get("content-length")
+        if content_length and content_length.isdigit() and int(content_length) > limit + MULTIPART_OVERHEAD_BYTES:
+            return JSONResponse(
+                status_code=413,
+                content={"detail": f"Request too large. The maximum size is {limit // (1024 * 1024)} MB."},
+            )
+    return await call_next(request)
+
+# Optional per-client rate limits for the upload endpoints
+rate_limiter = create_rate_limiter()
+if rate_limiter is not None:
+    app.add_middleware(
+        RateLimitMiddleware,
+        endpoints=set(UPLOAD_BODY_LIMITS),
+        limiter=rate_limiter,
+        client_header=os.environ.get('RATE_LIMIT_CLIENT_HEADER', 'X-Real-IP'),
+    )
+
+# In-flight gauge and latency histogram for the upload endpoints
+app.add_middleware(RequestMetricsMiddleware, endpoints=set(UPLOAD_BODY_LIMITS))
+
+# Request log with stage timings, and stack profiles of slow or selected uploads
+request_profiler = RequestProfiler.from_env()
+app.add_middleware(ProfilingMiddleware, endpoints=set(UPLOAD_BODY_LIMITS), profiler=request_profiler)
+
 app.add_middleware(
     CORSMiddleware,
     allow_credentials=True,
     allow_origins=["*"],
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "Retry-After"],
 )
 
 # Configure logging
@@ -285,7 +1002,116 @@ logging.basicConfig(
     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
 )
 logger = logging.getLogger(__name__)
+configure_logging()
+
+@app.on_event("startup")
+async def connect_db():
+    global client
+    # A database set up front (use_database) is kept, e.g. an in-memory one
+    if db is None:
+        client = AsyncIOMotorClient(mongo_url)
+        use_database(client[os.environ['DB_NAME']])
+
+async def warm_up():
+    """Import the parsers and start the extraction workers ahead of the first upload."""
+    try:
+        await extraction_pool.warm_up()
+        readiness["parsers"] = True
+        logging.info("Extraction pool warmed up")
+    except Exception as e:
+        logging.error(f"Error warming up the extraction pool: {e}")
+
+@app.on_event("startup")
+async def start_extraction_pool():
+    extraction_pool.start()
+    # In the background, so uvicorn binds the socket without waiting for it
+    startup_tasks.append(asyncio.ensure_future(warm_up()))
+
+@app.on_event("startup")
+async def start_index_creation():
+    # Also in the background: with Mongo unreachable it would hold up startup
+    # for the whole server selection timeout
+    startup_tasks.append(asyncio.ensure_future(create_indexes()))
+
+async def create_indexes():
+    try:
+        await analysis_cache.ensure_indexes()
+        await analysis_store.ensure_indexes()
+        await similarity_index.ensure_indexes()
+        await rollups.ensure_indexes()
+        await db.status_checks.create_index([("timestamp", -1), ("_id", -1)], name="timestamp_id")
+        await retention_policy.ensure_indexes(db)
+    except Exception as e:
+        logging.error(f"Error creating indexes: {e}")
+
+async def mirror_similarity_index():
+    """Load the stored signatures, then keep picking up other workers' new ones
+    and dropping expired ones."""
+    while True:
+        try:
+            count = await similarity_index.refresh(expired_before=retention_policy.cutoff("resume_analyses"))
+            if count:
+                logging.info(f"Loaded {count} resume signatures into the similarity index")
+        except Exception as e:
+            logging.error(f"Error loading the similarity index: {e}")
+        await asyncio.sleep(SIMILARITY_REFRESH_SECONDS)
+
+@app.on_event("startup")
+async def start_similarity_index():
+    if similarity_index.enabled:
+        startup_tasks.append(asyncio.ensure_future(mirror_similarity_index()))
+
+async def expire_resume_texts():
+    while True:
+        try:
+            await expire_texts(analysis_store, retention_policy)
+        except Exception as e:
+            logging.error(f"Error deleting expired resume texts: {e}")
+        await asyncio.sleep(TEXT_EXPIRY_INTERVAL_SECONDS)
+
+@app.on_event("startup")
+async def start_text_expiry():
+    if retention_policy.ttl_seconds("resume_analyses"):
+        startup_tasks.append(asyncio.ensure_future(expire_resume_texts()))
+
+@app.on_event("startup")
+async def start_rollups():
+    startup_tasks.append(asyncio.ensure_future(rollups.run()))
+
+@app.on_event("startup")
+async def start_job_workers():
+    job_workers.start()
+
+@app.on_event("shutdown")
+async def stop_job_workers():
+    # Before the Mongo client closes: running jobs still need to save results
+    await job_workers.stop()
+    await job_queue.aclose()
 
 @app.on_event("shutdown")
 async def shutdown_db_client():
-    client.close()
+    # Write out batched analyses before the connection goes away
+    await analysis_store.close()
+    await similarity_index.close()
+    await rollups.close()
+    if client is not None:
+        client.close()
+
+@app.on_event("shutdown")
+async def shutdown_extraction_pool():
+    for task in startup_tasks:
+        task.cancel()
+    extraction_pool.shutdown()
+
+@app.on_event("shutdown")
+async def shutdown_roast_engine():
+    await roast_engine.aclose()
+
+@app.on_event("shutdown")
+async def shutdown_drive_client():
+    await drive_client.aclose()
+
+@app.on_event("shutdown")
+async def shutdown_rate_limiter():
+    if rate_limiter is not None:
+        await rate_limiter.aclose()
@@ -0,0 +1,335 @@
+import hashlib
+import logging
+import os
+import struct
+import zlib
+from array import array
+from datetime import datetime, timedelta
+from typing import NamedTuple
+
+from bson import Binary
+
+from cache import LRUCache
+from pagination import fetch_page
+from text_scan import split_words
+
+# MinHash signatures
+
+# Odd 32-bit multiplier spreading CRC-32 values over the whole word before binning
+_MIX = 0x9E3779B1
+_MASK = 0xFFFFFFFF
+
+def shingle_hashes(text, size=5):
+    """CRC-32 hashes of the distinct `size`-word shingles of `text`, lowered."""
+    words = split_words(text.lower())
+    return {zlib.crc32(" ".join(words[i:i + size]).encode()) for i in range(max(0, len(words) - size + 1))}
+
+def minhash(hashes, num_perm=128):
+    """One-permutation MinHash signature of a set of 32-bit hashes.
+
+    Each hash is mixed and falls into one of `num_perm` bins by its top bits;
+    a bin keeps its smallest remaining bits. One pass over the shingles instead
+    of one per permutation, so signing is cheap in pure Python. Empty bins take
+    the next non-empty bin's value tagged with the distance (densification), so
+    two signatures still agree bin for bin with probability ~ their Jaccard.
+    """
+    shift = 32 - num_perm.bit_length() + 1
+    low = (1 << shift) - 1
+    empty = 1 << shift
+    bins = [empty] * num_perm
+    for value in hashes:
+        mixed = (value * _MIX) & _MASK
+        index = mixed >> shift
+        if mixed & low < bins[index]:
+            bins[index] = mixed & low
+    filled = [index for index, value in enumerate(bins) if value != empty]
+    if not filled:
+        return None
+    if len(filled) < num_perm:
+        densified = list(bins)
+        for index in range(num_perm):
+            distance = 1
+            while bins[(index + distance - 1) % num_perm] == empty:
+                distance += 1
+            if distance > 1:
+                densified[index] = bins[(index + distance - 1) % num_perm] | (distance - 1) << shift
+        bins = densified
+    return array("I", bins)
+
+def estimate_similarity(signature, other):
+    """Estimated Jaccard similarity of the shingle sets behind two signatures."""
+    return sum(a == b for a, b in zip(signature, other)) / len(signature)
+
+def choose_rows(num_perm, threshold, recall=0.99):
+    """Rows per LSH band: the most selective banding that still makes a pair at
+    `threshold` a candidate with probability `recall`."""
+    best = 1
+    for rows in range(1, num_perm + 1):
+        if num_perm % rows:
+            continue
+        bands = num_perm // rows
+        if 1 - (1 - threshold ** rows) ** bands >= recall:
+            best = rows
+    return best
+
+def pack_signature(signature):
+    return Binary(struct.pack(f"<{len(signature)}I", *signature))
+
+def unpack_signature(data):
+    return array("I", struct.unpack(f"<{len(data) // 4}I", bytes(data)))
+
+# Index
+
+class SimilarityMatch(NamedTuple):
+    analysis_id: str
+    similarity: float
+
+class SimilarityIndex:
+    """Finds stored analyses whose resume text is nearly the same as a new one.
+
+    Every analysis gets a MinHash signature over its word shingles. Signatures
+    are kept in `resume_signatures` and mirrored in memory, bucketed by LSH
+    band, so a lookup only compares against analyses that share a band and
+    never touches Mongo. Other processes' additions are picked up by `refresh`,
+    which also forgets analyses past their retention. A `threshold` of 0 turns
+    the index off.
+    """
+
+    def __init__(self, db=None, threshold=0.9, num_perm=128, shingle_size=5, min_shingles=20, writer=None,
+                 refresh_overlap=60.0):
+        if num_perm & (num_perm - 1) or not 1 < num_perm <= 1 << 16:
+            raise ValueError(f"num_perm must be a power of two up to 65536, not {num_perm}")
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.shingle_size = shingle_size
+        self.min_shingles = min_shingles
+        self.rows = choose_rows(num_perm, threshold) if threshold > 0 else num_perm
+        self.writer = writer
+        self.refresh_overlap = refresh_overlap
+        # analysis id -> (signature, analysis_version, timestamp)
+        self.entries = {}
+        # One dict per band: band bytes -> ids of the analyses sharing them
+        self.buckets = [{} for _ in range(num_perm // self.rows)]
+        # Newest signature timestamp mirrored, for `refresh`
+        self.loaded_until = None
+        self.lookups = 0
+        self.matches = 0
+        self.expired = 0
+        self._signatures = LRUCache(max_size=256)
+        self.db = None
+        if db is not None:
+            self.use_database(db)
+
+    @classmethod
+    def from_env(cls, db=None, writer=None):
+        return cls(
+            db,
+            threshold=float(os.environ.get('SIMILARITY_THRESHOLD', '0.9')),
+            num_perm=int(os.environ.get('SIMILARITY_NUM_PERM', '128')),
+            shingle_size=int(os.environ.get('SIMILARITY_SHINGLE_SIZE', '5')),
+            writer=writer,
+        )
+
+    @property
+    def enabled(self):
+        return self.threshold > 0
+
+    def use_database(self, db):
+        self.db = db
+        if self.writer is not None:
+            self.writer.collection = db.resume_signatures
+
+    async def ensure_indexes(self):
+        await self.db.resume_signatures.create_index([("timestamp", -1), ("_id", -1)], name="timestamp_id")
+
+    def signature(self, text):
+        """The MinHash signature of `text`, or None when it is too short to compare."""
+        key = hashlib.blake2b(text.encode("utf-8", "surrogatepass"), digest_size=16).digest()
+        signature = self._signatures.get(key)
+        if signature is None:
+            hashes = shingle_hashes(text, self.shingle_size)
+            signature = minhash(hashes, self.num_perm) if len(hashes) >= self.min_shingles else False
+            # False marks "too short" so it is cached too
+            self._signatures.set(key, signature)
+        return signature or None
+
+    def band_keys(self, signature):
+        data = signature.tobytes()
+        width = self.rows * signature.itemsize
+        return [data[start:start + width] for start in range(0, len(data), width)]
+
+    def find(self, text, analysis_version):
+        """The most similar indexed analysis of `analysis_version` at or above the threshold, or None."""
+        if not self.enabled:
+            return None
+        signature = self.signature(text)
+        if signature is None:
+            return None
+        self.lookups += 1
+        candidates = set()
+        for buckets, key in zip(self.buckets, self.band_keys(signature)):
+            candidates.update(buckets.get(key, ()))
+        best = None
+        for analysis_id in candidates:
+            other, version, _ = self.entries[analysis_id]
+            if version != analysis_version:
+                continue
+            similarity = estimate_similarity(signature, other)
+            if similarity >= self.threshold and (best is None or similarity > best.similarity):
+                best = SimilarityMatch(analysis_id, similarity)
+        if best is not None:
+            self.matches += 1
+        return best
+
+    def insert(self, analysis_id, signature, analysis_version, timestamp):
+        """Add a signature to the in-memory mirror only."""
+        if analysis_id in self.entries:
+            return
+        self.entries[analysis_id] = (signature, analysis_version, timestamp)
+        for buckets, key in zip(self.buckets, self.band_keys(signature)):
+            buckets.setdefault(key, []).append(analysis_id)
+
+    def discard(self, analysis_id):
+        """Forget an analysis that no longer exists (in memory; `rebuild` cleans up Mongo)."""
+        entry = self.entries.pop(analysis_id, None)
+        if entry is not None:
+            for buckets, key in zip(self.buckets, self.band_keys(entry[0])):
+                ids = buckets.get(key)
+                if ids is not None and analysis_id in ids:
+                    ids.remove(analysis_id)
+                    if not ids:
+                        del buckets[key]
+
+    def expire(self, before):
+        """Forget analyses stamped before `before`; returns how many were dropped.
+
+        Their signatures and analyses expire from Mongo by TTL, so without this
+        the mirror would only ever grow.
+        """
+        expired = [analysis_id for analysis_id, entry in self.entries.items() if entry[2] < before]
+        for analysis_id in expired:
+            self.discard(analysis_id)
+        self.expired += len(expired)
+        return len(expired)
+
+    def document(self, analysis_id, signature, analysis_version, timestamp):
+        return {
+            "_id": analysis_id,
+            "signature": pack_signature(signature),
+            "analysis_version": analysis_version,
+            "timestamp": timestamp,
+        }
+
+    async def add(self, analysis_id, text, analysis_version, timestamp=None):
+        """Index a new analysis in memory and queue its signature for Mongo."""
+        if not self.enabled:
+            return
+        signature = self.signature(text)
+        if signature is None:
+            return
+        timestamp = timestamp or datetime.utcnow()
+        self.insert(analysis_id, signature, analysis_version, timestamp)
+        document = self.document(analysis_id, signature, analysis_version, timestamp)
+        if self.writer is not None:
+            await self.writer.submit(document)
+        else:
+            await self.db.resume_signatures.insert_one(document)
+
+    def _load_document(self, document):
+        signature = unpack_signature(document["signature"])
+        if len(signature) == self.num_perm:
+            self.insert(document["_id"], signature, document.get("analysis_version"), document["timestamp"])
+        if self.loaded_until is None or document["timestamp"] > self.loaded_until:
+            self.loaded_until = document["timestamp"]
+
+    async def load(self, batch_size=1000):
+        """Mirror every stored signature in memory; returns how many were read."""
+        count = 0
+        cursor = None
+        while True:
+            documents, cursor = await fetch_page(self.db.resume_signatures, {}, None, batch_size, cursor)
+            for document in documents:
+                self._load_document(document)
+            count += len(documents)
+            if cursor is None:
+                return count
+
+    async def refresh(self, batch_size=1000, expired_before=None):
+        """Mirror signatures stored since the last load or refresh, e.g. by other workers.
+
+        With `expired_before` (the retention cutoff), analyses stamped before it
+        are dropped from the mirror. Returns how many signatures were read.
+        """
+        if self.loaded_until is None:
+            count = await self.load(batch_size)
+        else:
+            # Batched writes can land after newer ones, so look back a little;
+            # signatures already mirrored are skipped by `insert`
+            query = {"timestamp": {"$gte": self.loaded_until - timedelta(seconds=self.refresh_overlap)}}
+            documents = await self.db.resume_signatures.find(query).sort([("timestamp", 1)]).to_list(None)
+            for document in documents:
+                self._load_document(document)
+            count = len(documents)
+        if expired_before is not None:
+            self.expire(expired_before)
+        return count
+
+    async def rebuild(self, store, batch_size=500):
+        """Recompute every signature from the analyses in `store` (offline).
+
+        Replaces the contents of `resume_signatures` and the in-memory mirror.
+        Returns how many analyses were indexed.
+        """
+        self.entries.clear()
+        for buckets in self.buckets:
+            buckets.clear()
+        self.loaded_until = None
+        if self.writer is not None:
+            await self.writer.flush()
+        await self.db.resume_signatures.delete_many({})
+        projection = {
+            "id": 1, "timestamp": 1, "analysis_version": 1,
+            "resume_text": 1, "resume_text_z": 1, "resume_text_file": 1, "text_codec": 1,
+        }
+        count = 0
+        cursor = None
+        while True:
+            documents, cursor = await fetch_page(store.db.resume_analyses, {}, projection, batch_size, cursor)
+            batch = []
+            for document in documents:
+                try:
+                    text = await store.read_text(document)
+                except Exception as e:
+                    logging.error(f"Error reading resume text of {document.get('_id')}: {e}")
+                    continue
+                signature = self.signature(text)
+                if signature is None:
+                    continue
+                summary = store.summarize(document)
+                self.insert(summary["id"], signature, summary["analysis_version"], summary["timestamp"])
+                batch.append(self.document(summary["id"], signature, summary["analysis_version"], summary["timestamp"]))
+                if self.loaded_until is None or summary["timestamp"] > self.loaded_until:
+                    self.loaded_until = summary["timestamp"]
+            if batch:
+                await self.db.resume_signatures.insert_many(batch, ordered=False)
+            count += len(batch)
+            if cursor is None:
+                return count
+
+    async def close(self):
+        if self.writer is not None:
+            await self.writer.close()
+
+    def stats(self):
+        return {
+            "enabled": self.enabled,
+            "threshold": self.threshold,
+            "num_perm": self.num_perm,
+            "bands": len(self.buckets),
+            "rows": self.rows,
+            "entries": len(self.entries),
+            "lookups": self.lookups,
+            "matches": self.matches,
+            "expired": self.expired,
+            "writer": self.writer.stats() if self.writer is not None else None,
+        }
@@ -0,0 +1,410 @@
+import asyncio
+import logging
+import os
+import re
+import uuid
+import zlib
+from string import Formatter
+
+from bson import Binary
+from motor.motor_asyncio import AsyncIOMotorGridFSBucket
+from pymongo.errors import BulkWriteError
+
+from metrics import DB_WRITE_BATCH_SIZE, STAGE_SECONDS
+from pagination import fetch_page
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+DUPLICATE_KEY_ERROR = 11000
+
+# Text compression
+
+def default_codec():
+    return "zstd" if zstandard is not None else "zlib"
+
+def compress_text(text, codec):
+    data = text.encode("utf-8")
+    if codec == "zstd":
+        return zstandard.ZstdCompressor(level=3).compress(data)
+    if codec == "zlib":
+        return zlib.compress(data, 6)
+    raise ValueError(f"Unknown text codec: {codec}")
+
+def decompress_text(data, codec):
+    if codec == "zstd":
+        if zstandard is None:
+            raise RuntimeError("Text was stored with zstd, but the zstandard package is not installed")
+        return zstandard.ZstdDecompressor().decompress(data).decode("utf-8")
+    if codec == "zlib":
+        return zlib.decompress(data).decode("utf-8")
+    raise ValueError(f"Unknown text codec: {codec}")
+
+def pack_text(text, codec):
+    """Fields holding `text` compressed inline; the inverse of `unpack_text`."""
+    return {"text_z": Binary(compress_text(text, codec)), "text_codec": codec}
+
+def unpack_text(document):
+    """Text from a document written by `pack_text`, or from a plain `text` field."""
+    if "text_z" in document:
+        return decompress_text(bytes(document["text_z"]), document["text_codec"])
+    return document.get("text")
+
+# Canned messages
+
+class MessageCatalog:
+    """Canned paragraphs keyed by stable ids, so stored analyses can refer to them.
+
+    Templates are `str.format` strings whose fields are integers. A paragraph
+    that renders exactly from a template is stored as `[id]` or `[id, fields]`;
+    anything else (such as LLM output) is stored as the plain string. Ids end up
+    in stored documents, so an id must never be removed or given new wording.
+    """
+
+    def __init__(self, templates):
+        self.templates = dict(templates)
+        self._exact = {}
+        self._patterns = []
+        for template_id, template in self.templates.items():
+            fields = [field for _, field, _, _ in Formatter().parse(template) if field is not None]
+            if fields:
+                self._patterns.append((template_id, self._compile(template)))
+            else:
+                self._exact[template] = template_id
+
+    @staticmethod
+    def _compile(template):
+        pattern = []
+        seen = set()
+        for literal, field, _, _ in Formatter().parse(template):
+            pattern.append(re.escape(literal))
+            if field is None:
+                continue
+            pattern.append(f"(?P={field})" if field in seen else rf"(?P<{field}>-?\d+)")
+            seen.add(field)
+        return re.compile("".join(pattern) + r"\Z")
+
+    def render(self, template_id, fields=None):
+        return self.templates[template_id].format(**(fields or {}))
+
+    def encode_paragraph(self, paragraph):
+        template_id = self._exact.get(paragraph)
+        if template_id is not None:
+            return [template_id]
+        for template_id, pattern in self._patterns:
+            match = pattern.match(paragraph)
+            if match:
+                fields = {name: int(value) for name, value in match.groupdict().items()}
+                # Guards against formatting the regex cannot see, like "+5" or "007"
+                if self.render(template_id, fields) == paragraph:
+                    return [template_id, fields]
+        return paragraph
+
+    def encode(self, text):
+        """Encode text paragraph by paragraph, or return None when nothing matched."""
+        parts = [self.encode_paragraph(paragraph) for paragraph in text.split("\n\n")]
+        if all(isinstance(part, str) for part in parts):
+            return None
+        return parts
+
+    def decode(self, parts):
+        return "\n\n".join(
+            part if isinstance(part, str) else self.render(*part)
+            for part in parts
+        )
+
+# Write batching
+
+class BatchWriter:
+    """Coalesces inserts into `insert_many` batches written in the background.
+
+    A submitted document is written once `batch_size` documents are waiting or
+    `max_latency` seconds after it arrived, whichever comes first. Documents stay
+    readable through `pending` until their batch is written, and `submit` waits
+    once `max_pending` documents are unwritten. `close` writes everything left.
+    """
+
+    def __init__(self, collection, batch_size=100, max_latency=0.05, max_pending=10_000, retries=3):
+        self.collection = collection
+        self.batch_size = batch_size
+        self.max_latency = max_latency
+        self.max_pending = max_pending
+        self.retries = retries
+        self.pending = {}
+        self.written = 0
+        self.batches = 0
+        self.failed = 0
+        self.closed = False
+        self._buffer = []
+        self._timer = None
+        self._tasks = set()
+        self._drained = asyncio.Event()
+
+    async def submit(self, document):
+        if self.closed:
+            await self._write([document])
+            return
+        while len(self.pending) >= self.max_pending:
+            self._drained.clear()
+            await self._drained.wait()
+        self.pending[document["_id"]] = document
+        self._buffer.append(document)
+        if len(self._buffer) >= self.batch_size:
+            self._start_batch()
+        elif self._timer is None:
+            self._timer = asyncio.get_running_loop().call_later(self.max_latency, self._start_batch)
+
+    def _start_batch(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._buffer = self._buffer, []
+        if batch:
+            task = asyncio.ensure_future(self._write(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _write(self, batch):
+        remaining = batch
+        try:
+            for attempt in range(self.retries + 1):
+                try:
+                    DB_WRITE_BATCH_SIZE.observe(len(remaining))
+                    with STAGE_SECONDS.labels("db_write").time():
+                        await self.collection.insert_many(remaining, ordered=False)
+                    remaining = []
+                except BulkWriteError as e:
+                    # Duplicates were written by an earlier attempt that looked failed
+                    errors = [error for error in e.details.get("writeErrors", []) if error.get("code") != DUPLICATE_KEY_ERROR]
+                    remaining = [remaining[error["index"]] for error in errors]
+                    last_error = e
+                except Exception as e:
+                    last_error = e
+                if not remaining:
+                    break
+                if attempt < self.retries:
+                    await asyncio.sleep(0.1 * 2 ** attempt)
+            if remaining:
+                self.failed += len(remaining)
+                logging.error(f"Error saving {len(remaining)} analyses after {self.retries + 1} attempts: {last_error}")
+            self.written += len(batch) - len(remaining)
+            self.batches += 1
+        finally:
+            for document in batch:
+                self.pending.pop(document["_id"], None)
+            self._drained.set()
+
+    async def flush(self):
+        """Write everything submitted so far."""
+        self._start_batch()
+        while self._tasks:
+            await asyncio.gather(*list(self._tasks))
+
+    async def close(self):
+        self.closed = True
+        await self.flush()
+
+    def stats(self):
+        return {
+            "pending": len(self.pending),
+            "written": self.written,
+            "batches": self.batches,
+            "failed": self.failed,
+        }
+
+# Compact resume_analyses documents
+
+# Fields of the listing view; never the resume text
+SUMMARY_PROJECTION = {"id": 1, "timestamp": 1, "file_hash": 1, "analysis_version": 1}
+
+def analysis_key(analysis_id):
+    """The `_id` stored for an analysis id: its UUID as 16 bytes, or None if it is not a UUID."""
+    try:
+        return Binary.from_uuid(uuid.UUID(analysis_id))
+    except (ValueError, TypeError):
+        return None
+
+class AnalysisStore:
+    """Reads and writes `resume_analyses` in a compact form.
+
+    Each document is keyed by its UUID as a binary `_id`, keeps the resume text
+    compressed (in GridFS once it is larger than `gridfs_threshold` bytes
+    compressed) and stores roast and review paragraphs that come from
+    `catalog` as template ids. Inserts go through a BatchWriter. Documents
+    written before this format (string `id`, plain text fields) are still read.
+
+    `db` may be None until `use_database` is called, so the store can be built
+    at import time and connected per worker process.
+    """
+
+    def __init__(self, db, catalog, codec=None, gridfs_threshold=64 * 1024, writer=None):
+        self.catalog = catalog
+        self.codec = codec or default_codec()
+        self.gridfs_threshold = gridfs_threshold
+        self.writer = writer or BatchWriter(None)
+        self.db = None
+        self._gridfs = None
+        if db is not None:
+            self.use_database(db)
+        # Fail at startup rather than on the first write
+        compress_text("", self.codec)
+
+    @classmethod
+    def from_env(cls, db, catalog):
+        return cls(
+            db,
+            catalog,
+            codec=os.environ.get('STORAGE_TEXT_CODEC') or None,
+            gridfs_threshold=int(os.environ.get('STORAGE_GRIDFS_THRESHOLD', str(64 * 1024))),
+            writer=BatchWriter(
+                None,
+                batch_size=int(os.environ.get('STORAGE_WRITE_BATCH_SIZE', '100')),
+                max_latency=float(os.environ.get('STORAGE_WRITE_MAX_LATENCY', '0.05')),
+                max_pending=int(os.environ.get('STORAGE_WRITE_MAX_PENDING', '10000')),
+            ),
+        )
+
+    def use_database(self, db):
+        self.db = db
+        self.writer.collection = db.resume_analyses
+        self._gridfs = None
+
+    @property
+    def gridfs(self):
+        if self._gridfs is None:
+            self._gridfs = AsyncIOMotorGridFSBucket(self.db, bucket_name="resume_texts")
+        return self._gridfs
+
+    async def ensure_indexes(self):
+        # Only documents from before the compact format have a string `id`
+        await self.db.resume_analyses.create_index("id", name="legacy_id", sparse=True)
+        await self.db.resume_analyses.create_index([("timestamp", -1), ("_id", -1)], name="timestamp_id")
+
+    async def encode(self, analysis):
+        """Turn a ResumeAnalysis dict into the document that is stored."""
+        document = {
+            "_id": analysis_key(analysis["id"]),
+            "timestamp": analysis["timestamp"],
+            "file_hash": analysis.get("file_hash"),
+            "analysis_version": analysis.get("analysis_version"),
+        }
+        if document["_id"] is None:
+            raise ValueError(f"Analysis id is not a UUID: {analysis['id']}")
+        for field in ("roast", "review"):
+            parts = self.catalog.encode(analysis[field])
+            if parts is None:
+                document[field] = analysis[field]
+            else:
+                document[f"{field}_parts"] = parts
+        text = compress_text(analysis["resume_text"], self.codec)
+        document["text_codec"] = self.codec
+        if len(text) > self.gridfs_threshold:
+            document["resume_text_file"] = await self.gridfs.upload_from_stream(
+                analysis["id"], text, metadata={"codec": self.codec},
+            )
+        else:
+            document["resume_text_z"] = Binary(text)
+        return document
+
+    @staticmethod
+    def summarize(document):
+        """The listing view of a stored document: id, timestamp, file hash and version."""
+        if "id" in document:
+            analysis_id = document["id"]
+        else:
+            analysis_id = str(document["_id"].as_uuid())
+        return {
+            "id": analysis_id,
+            "timestamp": document["timestamp"],
+            "file_hash": document.get("file_hash"),
+            "analysis_version": document.get("analysis_version"),
+        }
+
+    def decode(self, document):
+        """The API view of a stored document (without the resume text)."""
+        analysis = self.summarize(document)
+        for field in ("roast", "review"):
+            parts = document.get(f"{field}_parts")
+            analysis[field] = self.catalog.decode(parts) if parts is not None else document[field]
+        return analysis
+
+    async def read_text(self, document):
+        """The resume text of a stored document, fetched from GridFS if needed."""
+        if "resume_text" in document:
+            return document["resume_text"]
+        if "resume_text_file" in document:
+            stream = await self.gridfs.open_download_stream(document["resume_text_file"])
+            return decompress_text(await stream.read(), document["text_codec"])
+        return decompress_text(bytes(document["resume_text_z"]), document["text_codec"])
+
+    async def inline_text(self, document):
+        """`document` with a GridFS resume text moved inline (still compressed), for archiving."""
+        if "resume_text_file" not in document:
+            return document
+        stream = await self.gridfs.open_download_stream(document["resume_text_file"])
+        document = dict(document)
+        document["resume_text_z"] = Binary(await stream.read())
+        del document["resume_text_file"]
+        return document
+
+    async def spill_text(self, document):
+        """The inverse of `inline_text`: a large inline text goes back to GridFS, as in `encode`."""
+        text = document.get("resume_text_z")
+        if text is None or len(text) <= self.gridfs_threshold:
+            return document
+        document = dict(document)
+        document["resume_text_file"] = await self.gridfs.upload_from_stream(
+            self.summarize(document)["id"], bytes(text), metadata={"codec": document["text_codec"]},
+        )
+        del document["resume_text_z"]
+        return document
+
+    async def delete_texts(self, documents):
+        """Delete the GridFS texts of stored documents that are being removed."""
+        for document in documents:
+            if "resume_text_file" in document:
+                await self.gridfs.delete(document["resume_text_file"])
+
+    async def save(self, analysis):
+        """Queue a ResumeAnalysis dict for writing; it is readable through `get` at once."""
+        await self.writer.submit(await self.encode(analysis))
+
+    async def get(self, analysis_id, include_text=False):
+        key = analysis_key(analysis_id)
+        document = self.writer.pending.get(key) if key is not None else None
+        if document is None:
+            projection = None if include_text else {"resume_text": 0, "resume_text_z": 0}
+            query = {"_id": key} if key is not None else {"id": analysis_id}
+            document = await self.db.resume_analyses.find_one(query, projection)
+            if document is None and key is not None:
+                # Written before the compact format
+                document = await self.db.resume_analyses.find_one({"id": analysis_id}, projection)
+        if document is None:
+            return None
+        analysis = self.decode(document)
+        if include_text:
+            analysis["resume_text"] = await self.read_text(document)
+        return analysis
+
+    async def list_page(self, limit, cursor=None):
+        """A page of analysis summaries, newest first, and the cursor for the next page.
+
+        Analyses still waiting in the writer show up once they are written.
+        """
+        documents, next_cursor = await fetch_page(self.db.resume_analyses, {}, SUMMARY_PROJECTION, limit, cursor)
+        return [self.summarize(document) for document in documents], next_cursor
+
+    async def find_by_hash(self, file_hash, analysis_version):
+        document = await self.db.resume_analyses.find_one(
+            {"file_hash": file_hash, "analysis_version": analysis_version},
+            {"resume_text": 0, "resume_text_z": 0},
+        )
+        return self.decode(document) if document is not None else None
+
+    async def close(self):
+        await self.writer.close()
+
+    def stats(self):
+        return {"codec": self.codec, "writer": self.writer.stats()}
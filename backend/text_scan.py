@@ -0,0 +1,82 @@
+import string
+from typing import Dict, NamedTuple
+
+# Punctuation (ASCII plus the typographic marks common in resumes) separates
+# words just like whitespace; str.translate + str.split is far cheaper than a
+# regex tokenizer on text this size
+_SEPARATORS = string.punctuation + "\u2018\u2019\u201c\u201d\u2013\u2014\u2022\u2026\u00b7\u25aa\u25cf"
+_SEPARATOR_TABLE = str.maketrans({character: " " for character in _SEPARATORS})
+
+def split_words(lowered):
+    """Split lowered text into words on whitespace and punctuation."""
+    return lowered.translate(_SEPARATOR_TABLE).split()
+
+class TextStats(NamedTuple):
+    word_count: int
+    line_count: int
+    non_empty_line_count: int
+    term_counts: Dict[str, int]
+
+    @property
+    def term_total(self):
+        return sum(self.term_counts.values())
+
+def load_terms(path):
+    """Read one term per line, skipping blank lines and `#` comments."""
+    with open(path, encoding="utf-8") as f:
+        return [line.strip() for line in f if line.strip() and not line.lstrip().startswith("#")]
+
+class TextScanner:
+    """Counts whole-word occurrences of many terms in a single scan of the text.
+
+    Terms are split into words and stored in a word trie, so each position in
+    the text costs a dict lookup no matter how many terms are loaded. The same
+    scan also produces the word and line counts.
+    """
+
+    def __init__(self, terms):
+        self.terms = []
+        self._trie = {}
+        for term in terms:
+            words = split_words(term.lower())
+            if not words:
+                continue
+            node = self._trie
+            for word in words:
+                node = node.setdefault(word, {})
+            if None not in node:
+                node[None] = term
+                self.terms.append(term)
+        self._max_depth = max((len(split_words(term.lower())) for term in self.terms), default=0)
+
+    @classmethod
+    def from_file(cls, path):
+        return cls(load_terms(path))
+
+    def count_terms(self, words):
+        """Count term occurrences in an already lowered and tokenized word list."""
+        counts = {}
+        trie = self._trie
+        # Only positions whose word starts some term need a trie walk
+        for start in [index for index, word in enumerate(words) if word in trie]:
+            node = trie[words[start]]
+            position = start + 1
+            while node is not None:
+                term = node.get(None)
+                if term is not None:
+                    counts[term] = counts.get(term, 0) + 1
+                if position == len(words) or position - start == self._max_depth:
+                    break
+                node = node.get(words[position])
+                position += 1
+        return counts
+
+    def scan(self, text):
+        lowered = text.lower()
+        lines = lowered.split("\n")
+        return TextStats(
+            word_count=len(lowered.split()),
+            line_count=len(lines),
+            non_empty_line_count=len([line for line in lines if line and not line.isspace()]),
+            term_counts=self.count_terms(split_words(lowered)),
+        )
@@ -0,0 +1,50 @@
+"""Standalone job worker for `?async=1` uploads, scaled separately from the web processes.
+
+Run from the backend directory against the same Redis queue as the API:
+
+    JOB_QUEUE_URL=redis://localhost:6379/0 JOB_WORKERS=4 python worker.py
+"""
+import asyncio
+import logging
+import os
+import signal
+import sys
+
+import server
+from jobs import JobWorkerPool, RedisJobQueue
+
+async def main():
+    if not isinstance(server.job_queue, RedisJobQueue):
+        logging.error("worker.py needs JOB_QUEUE_URL: the in-process queue is not shared with the API")
+        return 1
+
+    await server.connect_db()
+    await server.create_indexes()
+    server.extraction_pool.start()
+    # Jobs record analyses in the rollups too; flush them like the API does
+    background = [asyncio.ensure_future(server.rollups.run())]
+    if server.similarity_index.enabled:
+        # Near-duplicate lookups for jobs need the signatures mirrored here too
+        background.append(asyncio.ensure_future(server.mirror_similarity_index()))
+    workers = JobWorkerPool(server.job_queue, server.process_job, concurrency=int(os.environ.get('JOB_WORKERS', '2')))
+    workers.start()
+    logging.info(f"Job worker started with {workers.concurrency} concurrent jobs")
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for signum in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(signum, stop.set)
+    await stop.wait()
+
+    logging.info("Stopping job worker, waiting for running jobs")
+    await workers.stop()
+    await server.job_queue.aclose()
+    server.extraction_pool.shutdown()
+    for task in background:
+        task.cancel()
+    # Writes out the last rollup deltas
+    await server.shutdown_db_client()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
@@ -0,0 +1,139 @@
+"""Offline benchmarks for extraction, analysis and the full upload path.
+
+Run from the repository root, for example:
+
+    python -m benchmarks.bench_pipeline --pages 1 5 20 50 --iterations 20 --output bench.json
+    python -m benchmarks.compare old.json bench.json
+
+Documents come from `benchmarks.corpus`; each timed upload is a distinct
+document, so neither the text nor the analysis cache is hit unless
+`upload_cached` is selected. Uploads go through the ASGI app in-process,
+with Mongo replaced by `tests.fakes.MemoryDatabase`.
+"""
+import argparse
+import asyncio
+import os
+import time
+
+from benchmarks import BACKEND_DIR  # noqa: F401  (puts backend/ on sys.path)
+from benchmarks.corpus import make_document
+from benchmarks.harness import print_results, summarize, time_calls, write_results
+from tests.fakes import MemoryDatabase
+
+BENCHMARKS = (
+    "extract_pdf", "extract_docx", "extract_docx_tables", "extract_docx_python_docx",
+    "analysis", "upload", "upload_cached",
+)
+# Table-heavy DOCX: a 40-row table on every page
+TABLE_HEAVY = {"table_every": 1, "rows_per_table": 40}
+
+def corpus(file_type, pages, count, seed=0):
+    return [make_document(file_type, pages, seed=seed + n) for n in range(count)]
+
+def bench_extraction(file_type, pages, iterations):
+    from extraction import extract_text_from_docx, extract_text_from_pdf
+    extract = extract_text_from_pdf if file_type == "pdf" else extract_text_from_docx
+    documents = corpus(file_type, pages, iterations)
+    return summarize(f"extract_{file_type}", time_calls(extract, documents), pages=pages)
+
+def bench_docx_tables(name, pages, iterations):
+    """The streaming DOCX extractor, or the python-docx one it replaced, on table-heavy documents."""
+    from benchmarks.corpus import make_docx
+    from extraction import extract_text_from_docx, read_docx_document
+    extract = read_docx_document if name == "extract_docx_python_docx" else extract_text_from_docx
+    documents = [make_docx(pages, seed=n, **TABLE_HEAVY) for n in range(iterations)]
+    return summarize(name, time_calls(extract, documents), pages=pages)
+
+def bench_analysis(pages, iterations):
+    from extraction import extract_text_from_pdf
+    import server
+    texts = [extract_text_from_pdf(document) for document in corpus("pdf", pages, iterations)]
+    return summarize("analysis", time_calls(server.generate_roast_and_review, texts), pages=pages)
+
+def use_memory_db(server):
+    db = MemoryDatabase()
+    server.use_database(db)
+    return db
+
+async def bench_uploads(server, file_type, pages, iterations, concurrency, cached):
+    import httpx
+
+    if cached:
+        documents = corpus(file_type, pages, 1) * (iterations + 1)
+    else:
+        documents = corpus(file_type, pages, iterations + 1, seed=pages * 1000)
+    semaphore = asyncio.Semaphore(concurrency)
+    durations = []
+
+    async def upload(client, content, record=True):
+        async with semaphore:
+            start = time.perf_counter()
+            response = await client.post("/api/upload-resume", files={"file": (f"resume.{file_type}", content)})
+            elapsed = time.perf_counter() - start
+        response.raise_for_status()
+        if record:
+            durations.append(elapsed)
+
+    transport = httpx.ASGITransport(app=server.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        # One untimed upload warms the extraction pool and the caches' code paths
+        await upload(client, documents[0], record=False)
+        start = time.perf_counter()
+        await asyncio.gather(*(upload(client, content) for content in documents[1:]))
+        wall_time = time.perf_counter() - start
+    name = "upload_cached" if cached else "upload"
+    return summarize(name, durations, wall_time=wall_time, pages=pages, file_type=file_type, concurrency=concurrency)
+
+def run_uploads(selected, args):
+    os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+    os.environ.setdefault("DB_NAME", "resume_roaster_bench")
+    import server
+    use_memory_db(server)
+
+    async def run():
+        await server.app.router.startup()
+        results = []
+        try:
+            for cached in (False, True):
+                if ("upload_cached" if cached else "upload") not in selected:
+                    continue
+                for file_type in args.file_types:
+                    for pages in args.pages:
+                        results.append(await bench_uploads(server, file_type, pages, args.iterations, args.concurrency, cached))
+        finally:
+            await server.app.router.shutdown()
+        return results
+
+    return asyncio.run(run())
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", type=int, nargs="+", default=[1, 5, 20, 50])
+    parser.add_argument("--iterations", type=int, default=20, help="timed calls per benchmark and page count")
+    parser.add_argument("--only", choices=BENCHMARKS, nargs="+", default=list(BENCHMARKS))
+    parser.add_argument("--file-types", choices=("pdf", "docx"), nargs="+", default=["pdf", "docx"],
+                        help="document formats for the upload benchmarks")
+    parser.add_argument("--concurrency", type=int, default=1, help="concurrent uploads")
+    parser.add_argument("--output", help="write machine-readable results to this JSON file")
+    args = parser.parse_args()
+
+    results = []
+    for pages in args.pages:
+        for file_type in ("pdf", "docx"):
+            if f"extract_{file_type}" in args.only:
+                results.append(bench_extraction(file_type, pages, args.iterations))
+        for name in ("extract_docx_tables", "extract_docx_python_docx"):
+            if name in args.only:
+                results.append(bench_docx_tables(name, pages, args.iterations))
+        if "analysis" in args.only:
+            results.append(bench_analysis(pages, args.iterations))
+    if {"upload", "upload_cached"} & set(args.only):
+        results.extend(run_uploads(args.only, args))
+
+    print_results(results)
+    if args.output:
+        write_results(args.output, results, args)
+        print(f"Wrote {args.output}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+"""Micro-benchmark: TextScanner against the per-buzzword substring scan it replaced.
+
+Run with `python -m benchmarks.bench_text_scan` from the repository root.
+"""
+import argparse
+import random
+import timeit
+
+from benchmarks import BACKEND_DIR
+from text_scan import TextScanner, load_terms
+
+def legacy_stats(resume_text, buzzwords):
+    """The stats code generate_roast_and_review used before TextScanner."""
+    word_count = len(resume_text.split())
+    lines = resume_text.split('\n')
+    non_empty_lines = [line for line in lines if line.strip()]
+    line_count = len(non_empty_lines)
+    buzzword_count = sum(1 for word in buzzwords if word.lower() in resume_text.lower())
+    return word_count, line_count, buzzword_count
+
+def make_resume(terms, words=800, seed=0):
+    rng = random.Random(seed)
+    filler = ["managed", "team", "of", "engineers", "built", "services", "in", "python",
+              "improved", "latency", "by", "40%", "across", "the", "platform", "and"]
+    lines = []
+    for _ in range(words // 10):
+        line = [rng.choice(filler) for _ in range(9)]
+        line.insert(rng.randrange(len(line)), rng.choice(terms))
+        lines.append(" ".join(line))
+    return "\n".join(lines)
+
+def synthetic_terms(count, seed=1):
+    rng = random.Random(seed)
+    letters = "abcdefghijklmnopqrstuvwxyz"
+    return ["".join(rng.choice(letters) for _ in range(rng.randint(5, 10)))
+            + ("" if rng.random() < 0.7 else " " + "".join(rng.choice(letters) for _ in range(6)))
+            for _ in range(count)]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--words", type=int, default=800, help="approximate words per resume")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    buzzwords = load_terms(BACKEND_DIR / "data" / "buzzwords.txt")
+    print(f"{'terms':>7} {'legacy/s':>12} {'scanner/s':>12} {'speedup':>8}")
+    for size in (len(buzzwords), 1000, 5000):
+        terms = buzzwords + synthetic_terms(size - len(buzzwords)) if size > len(buzzwords) else buzzwords
+        text = make_resume(terms, words=args.words)
+        scanner = TextScanner(terms)
+        number = 20
+        legacy = min(timeit.repeat(lambda: legacy_stats(text, terms), number=number, repeat=args.repeat)) / number
+        scanned = min(timeit.repeat(lambda: scanner.scan(text), number=number, repeat=args.repeat)) / number
+        print(f"{size:>7} {1 / legacy:>12.0f} {1 / scanned:>12.0f} {legacy / scanned:>7.1f}x")
+
+if __name__ == "__main__":
+    main()
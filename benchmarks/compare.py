@@ -0,0 +1,52 @@
+"""Compare two result files written by `bench_pipeline --output`.
+
+    python -m benchmarks.compare base.json head.json [--threshold 10]
+
+Exits with status 1 when any p95 grew by more than `--threshold` percent.
+"""
+import argparse
+import json
+import sys
+
+KEY_FIELDS = ("name", "file_type", "pages", "concurrency")
+
+def result_key(result):
+    return tuple(result.get(field) for field in KEY_FIELDS)
+
+def load(path):
+    with open(path) as f:
+        report = json.load(f)
+    return report, {result_key(result): result for result in report["results"]}
+
+def change(base, head):
+    return 100 * (head - base) / base if base else 0.0
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("base")
+    parser.add_argument("head")
+    parser.add_argument("--threshold", type=float, default=10.0, help="p95 regression, in percent, that fails the comparison")
+    args = parser.parse_args()
+
+    base_report, base = load(args.base)
+    head_report, head = load(args.head)
+    print(f"base {base_report.get('commit')}  head {head_report.get('commit')}")
+    print(f"{'benchmark':<36} {'p50 %':>8} {'p95 %':>8} {'p99 %':>8} {'ops/s %':>8}")
+    regressed = False
+    for key in sorted(set(base) & set(head), key=str):
+        old, new = base[key], head[key]
+        p95 = change(old["p95_ms"], new["p95_ms"])
+        regressed |= p95 > args.threshold
+        label = "/".join(str(part) for part in key if part is not None)
+        print(
+            f"{label:<36} {change(old['p50_ms'], new['p50_ms']):>+8.1f} {p95:>+8.1f} "
+            f"{change(old['p99_ms'], new['p99_ms']):>+8.1f} {change(old['throughput_per_s'], new['throughput_per_s']):>+8.1f}"
+            + ("  REGRESSED" if p95 > args.threshold else "")
+        )
+    for key in sorted(set(base) ^ set(head), key=str):
+        print(f"{'/'.join(str(part) for part in key if part is not None):<36} only in {'base' if key in base else 'head'}")
+    print(f"peak RSS MB: {base_report.get('peak_rss_mb', 0):.1f} -> {head_report.get('peak_rss_mb', 0):.1f}")
+    return 1 if regressed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,163 @@
+"""Synthetic resume corpus: PDFs and DOCX files with text, tables and image-only pages.
+
+Everything is generated from a seed, so the same arguments always produce
+the same bytes. The PDF writer is deliberately minimal (Helvetica text, Flate
+images) and needs nothing beyond the standard library.
+"""
+import io
+import random
+import struct
+import zlib
+
+import docx
+from docx.shared import Inches
+
+FIRST_NAMES = ["Jane", "John", "Priya", "Wei", "Carlos", "Amara", "Olga", "Kenji"]
+LAST_NAMES = ["Doe", "Smith", "Patel", "Zhang", "Garcia", "Okafor", "Ivanova", "Sato"]
+SKILLS = ["Python", "SQL", "Kubernetes", "React", "Go", "Terraform", "Kafka", "Spark", "Excel", "Figma"]
+BUZZWORDS = ["synergy", "leverage", "results-driven", "team player", "detail-oriented", "go-getter", "passionate"]
+VERBS = ["Led", "Built", "Designed", "Shipped", "Managed", "Optimized", "Migrated", "Automated"]
+OBJECTS = ["the billing platform", "a data pipeline", "customer onboarding", "the mobile app",
+           "internal tooling", "the search service", "quarterly reporting", "CI/CD"]
+LINES_PER_PAGE = 45
+
+def resume_lines(rng, count):
+    """`count` lines of plausible resume text."""
+    lines = [f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}", "Senior Software Engineer"]
+    while len(lines) < count:
+        kind = rng.random()
+        if kind < 0.1:
+            lines.append(rng.choice(["EXPERIENCE", "EDUCATION", "SKILLS", "PROJECTS", "SUMMARY"]))
+        elif kind < 0.25:
+            lines.append(f"{rng.choice(BUZZWORDS).capitalize()} engineer skilled in {', '.join(rng.sample(SKILLS, 3))}.")
+        else:
+            lines.append(f"- {rng.choice(VERBS)} {rng.choice(OBJECTS)}, improving throughput by {rng.randint(5, 90)}%.")
+    return lines[:count]
+
+def table_rows(rng, count):
+    return [["Company", "Role", "Years"]] + [
+        [f"{rng.choice(LAST_NAMES)} Corp", rng.choice(["Engineer", "Lead", "Manager", "Analyst"]), str(rng.randint(1, 8))]
+        for _ in range(count)
+    ]
+
+def noise_image(rng, width=160, height=160):
+    """Grayscale noise as raw 8-bit pixels."""
+    return bytes(rng.getrandbits(8) for _ in range(width * height)), width, height
+
+def png_bytes(pixels, width, height):
+    def chunk(kind, data):
+        return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data))
+    raw = b"".join(b"\x00" + pixels[row * width:(row + 1) * width] for row in range(height))
+    header = struct.pack(">IIBBBBB", width, height, 8, 0, 0, 0, 0)
+    return b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", header) + chunk(b"IDAT", zlib.compress(raw)) + chunk(b"IEND", b"")
+
+def page_kinds(pages, rng, table_every=3, image_every=7):
+    """What each page holds: "text", "table" (text with a table) or "image" (no text at all)."""
+    kinds = []
+    for number in range(pages):
+        if number and number % image_every == image_every - 1:
+            kinds.append("image")
+        elif number % table_every == table_every - 1:
+            kinds.append("table")
+        else:
+            kinds.append("text")
+    return kinds
+
+# PDF
+
+def pdf_escape(text):
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+def pdf_text_stream(lines, rows=None):
+    ops = ["BT", "/F1 10 Tf", "12 TL", "50 760 Td"]
+    for line in lines:
+        ops.append(f"({pdf_escape(line)}) Tj T*")
+    ops.append("ET")
+    if rows:
+        # Cells are positioned individually, which is all a PDF "table" is
+        y = 760 - 12 * (len(lines) + 2)
+        for row in rows:
+            for column, cell in enumerate(row):
+                ops.append(f"BT /F1 10 Tf {50 + 170 * column} {y} Td ({pdf_escape(cell)}) Tj ET")
+            y -= 14
+    return "\n".join(ops).encode("latin-1")
+
+def make_pdf(pages, seed=0):
+    """A `pages`-page resume PDF with table pages and image-only pages."""
+    rng = random.Random(seed)
+    objects = {}
+    objects[1] = b"<< /Type /Catalog /Pages 2 0 R >>"
+    objects[3] = b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"
+    page_ids = []
+    next_id = 4
+    for kind in page_kinds(pages, rng):
+        page_id, content_id = next_id, next_id + 1
+        next_id += 2
+        resources = "/Font << /F1 3 0 R >>"
+        if kind == "image":
+            image_id = next_id
+            next_id += 1
+            pixels, width, height = noise_image(rng)
+            data = zlib.compress(pixels)
+            objects[image_id] = (
+                f"<< /Type /XObject /Subtype /Image /Width {width} /Height {height} /ColorSpace /DeviceGray "
+                f"/BitsPerComponent 8 /Filter /FlateDecode /Length {len(data)} >>\nstream\n"
+            ).encode() + data + b"\nendstream"
+            resources = f"/XObject << /Im1 {image_id} 0 R >>"
+            content = b"q 500 0 0 650 50 100 cm /Im1 Do Q"
+        elif kind == "table":
+            content = pdf_text_stream(resume_lines(rng, LINES_PER_PAGE // 2), table_rows(rng, 8))
+        else:
+            content = pdf_text_stream(resume_lines(rng, LINES_PER_PAGE))
+        objects[content_id] = f"<< /Length {len(content)} >>\nstream\n".encode() + content + b"\nendstream"
+        objects[page_id] = (
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] /Resources << {resources} >> "
+            f"/Contents {content_id} 0 R >>"
+        ).encode()
+        page_ids.append(page_id)
+    kids = " ".join(f"{page_id} 0 R" for page_id in page_ids)
+    objects[2] = f"<< /Type /Pages /Kids [{kids}] /Count {len(page_ids)} >>".encode()
+
+    out = io.BytesIO()
+    out.write(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+    offsets = {}
+    for object_id in sorted(objects):
+        offsets[object_id] = out.tell()
+        out.write(f"{object_id} 0 obj\n".encode() + objects[object_id] + b"\nendobj\n")
+    xref = out.tell()
+    out.write(f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode())
+    for object_id in range(1, len(objects) + 1):
+        out.write(f"{offsets[object_id]:010d} 00000 n \n".encode())
+    out.write(f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode())
+    return out.getvalue()
+
+# DOCX
+
+def make_docx(pages, seed=0, table_every=3, rows_per_table=8):
+    """A DOCX with roughly `pages` pages (separated by page breaks), tables and image-only pages.
+
+    `table_every=1` with a large `rows_per_table` gives a table-heavy resume.
+    """
+    rng = random.Random(seed)
+    document = docx.Document()
+    for number, kind in enumerate(page_kinds(pages, rng, table_every=table_every)):
+        if number:
+            document.add_page_break()
+        if kind == "image":
+            document.add_picture(io.BytesIO(png_bytes(*noise_image(rng))), width=Inches(5))
+            continue
+        lines = resume_lines(rng, LINES_PER_PAGE // 2 if kind == "table" else LINES_PER_PAGE)
+        for line in lines:
+            document.add_paragraph(line)
+        if kind == "table":
+            rows = table_rows(rng, rows_per_table)
+            table = document.add_table(rows=len(rows), cols=len(rows[0]))
+            for row, values in zip(table.rows, rows):
+                for cell, value in zip(row.cells, values):
+                    cell.text = value
+    out = io.BytesIO()
+    document.save(out)
+    return out.getvalue()
+
+def make_document(file_type, pages, seed=0):
+    return make_pdf(pages, seed) if file_type == "pdf" else make_docx(pages, seed)
@@ -0,0 +1,88 @@
+"""Timing, percentiles and memory readings shared by the benchmarks."""
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+
+def percentile(sorted_values, fraction):
+    """Linear-interpolated percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    position = (len(sorted_values) - 1) * fraction
+    low = int(position)
+    high = min(low + 1, len(sorted_values) - 1)
+    return sorted_values[low] + (sorted_values[high] - sorted_values[low]) * (position - low)
+
+def summarize(name, durations, wall_time=None, **params):
+    """Result record for one benchmark from its per-call durations in seconds."""
+    ordered = sorted(durations)
+    wall_time = wall_time if wall_time is not None else sum(ordered)
+    return {
+        "name": name,
+        **params,
+        "iterations": len(ordered),
+        "throughput_per_s": len(ordered) / wall_time if wall_time else 0.0,
+        "mean_ms": 1000 * sum(ordered) / len(ordered) if ordered else 0.0,
+        "p50_ms": 1000 * percentile(ordered, 0.50),
+        "p95_ms": 1000 * percentile(ordered, 0.95),
+        "p99_ms": 1000 * percentile(ordered, 0.99),
+        "max_ms": 1000 * ordered[-1] if ordered else 0.0,
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+def time_calls(fn, inputs, warmup=1):
+    """Call `fn` on each input (after `warmup` untimed calls) and return the durations."""
+    for value in inputs[:warmup]:
+        fn(value)
+    durations = []
+    for value in inputs:
+        start = time.perf_counter()
+        fn(value)
+        durations.append(time.perf_counter() - start)
+    return durations
+
+def peak_rss_mb(children=False):
+    """Peak resident set size of this process (or its finished children) so far, in MiB."""
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN if children else resource.RUSAGE_SELF)
+    # ru_maxrss is in KiB on Linux and in bytes on macOS
+    scale = 1 if sys.platform == "darwin" else 1024
+    return usage.ru_maxrss * scale / (1024 * 1024)
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def write_results(path, results, args):
+    report = {
+        "commit": git_commit(),
+        "created": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "args": vars(args),
+        "peak_rss_mb": peak_rss_mb(),
+        "peak_child_rss_mb": peak_rss_mb(children=True),
+        "results": results,
+    }
+    with open(path, "w") as f:
+        json.dump(report, f, indent=2)
+        f.write("\n")
+
+def print_results(results):
+    print(f"{'benchmark':<28} {'n':>5} {'ops/s':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'rss MB':>8}")
+    for result in results:
+        label = result["name"] + "".join(
+            f"[{suffix}]" for suffix in (result.get("file_type"), f"{result['pages']}p" if "pages" in result else None) if suffix
+        )
+        print(
+            f"{label:<28} {result['iterations']:>5} {result['throughput_per_s']:>9.1f} {result['p50_ms']:>9.2f} "
+            f"{result['p95_ms']:>9.2f} {result['p99_ms']:>9.2f} {result['peak_rss_mb']:>8.1f}"
+        )
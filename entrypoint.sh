@@ -5,24 +5,43 @@ set -e
 cd /backend || { echo "Backend directory not found"; exit 1; }
 
 echo "Starting FastAPI backend"
-# Start Uvicorn with proper host binding
-uvicorn server:app --host 0.0.0.0 --port 8001 &
+# Gunicorn with WEB_CONCURRENCY uvicorn workers (default: one per CPU); see gunicorn.conf.py
+gunicorn -c gunicorn.conf.py server:app &
 BACKEND_PID=$!
 
-echo "Waiting for backend to start..."
-sleep 30
-
-if ! kill -0 $BACKEND_PID 2>/dev/null; then
-    echo "Backend failed to start at initialization, exiting"
-    exit 1
-fi
+# Wait until the backend reports ready (Mongo reachable, parsers warmed up)
+READY_TIMEOUT=${READY_TIMEOUT:-120}
+echo "Waiting up to ${READY_TIMEOUT}s for backend readiness..."
+elapsed=0
+until wget -q -O /dev/null http://127.0.0.1:8001/api/readyz 2>/dev/null; do
+    if ! kill -0 $BACKEND_PID 2>/dev/null; then
+        echo "Backend failed to start at initialization, exiting"
+        exit 1
+    fi
+    if [ "$elapsed" -ge "$READY_TIMEOUT" ]; then
+        echo "Backend not ready after ${READY_TIMEOUT}s, starting nginx anyway"
+        break
+    fi
+    sleep 1
+    elapsed=$((elapsed + 1))
+done
 
 # Start Nginx
 nginx -g 'daemon off;' &
 NGINX_PID=$!
 
-# Handle termination signals
-trap 'kill $BACKEND_PID $NGINX_PID; exit 0' SIGTERM SIGINT
+# Handle termination signals: nginx finishes the requests it is proxying
+# (QUIT), then gunicorn drains its workers within GRACEFUL_TIMEOUT before
+# this shell, PID 1, exits and the container stops
+shutdown() {
+    echo "Shutting down"
+    kill -QUIT $NGINX_PID 2>/dev/null || true
+    kill -TERM $BACKEND_PID 2>/dev/null || true
+    wait $BACKEND_PID 2>/dev/null || true
+    wait $NGINX_PID 2>/dev/null || true
+    exit 0
+}
+trap shutdown TERM INT
 
 # Check if processes are still running
 while kill -0 $BACKEND_PID 2>/dev/null && kill -0 $NGINX_PID 2>/dev/null; do
@@ -0,0 +1,420 @@
+"""Load generator for the upload API, reporting latency over time, errors and server RSS.
+
+Drives POST /api/upload-resume plus the listing endpoints with a weighted mix,
+either at a fixed arrival rate (open loop: `--rate`) or with a fixed number of
+clients each sending one request after another (closed loop: `--concurrency`).
+Run from the repository root:
+
+    # In-process app with the in-memory Mongo stand-in
+    python scripts/loadgen.py --concurrency 8 --duration 60
+
+    # A running nginx + uvicorn stack, 20 uploads/s of real resumes
+    python scripts/loadgen.py --target http://localhost --rate 20 --corpus ~/resumes \\
+        --metrics-url http://localhost:8001/metrics --output load.json
+
+Open-loop latencies are measured from each request's scheduled start, so a
+server that falls behind shows it in the percentiles instead of slowing the
+generator down. Uploads cycle through the corpus; once it has been sent once,
+repeats are served from the analysis cache, so use `--documents` (generated
+corpus) or a large `--corpus` for uncached runs.
+
+Server RSS is read from /proc for the in-process app and its extraction
+workers, from `--server-pid` and its children for a local stack, or from
+`process_resident_memory_bytes` at `--metrics-url` (summed over workers; not
+available with PROMETHEUS_MULTIPROC_DIR).
+"""
+import argparse
+import asyncio
+import json
+import logging
+import math
+import os
+import random
+import sys
+import time
+from collections import Counter, defaultdict
+from datetime import datetime, timezone
+from pathlib import Path
+
+# Run as a script from anywhere: the repository root holds `benchmarks`
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from benchmarks import BACKEND_DIR  # noqa: E402,F401  (puts backend/ on sys.path)
+from benchmarks.corpus import make_document  # noqa: E402
+from benchmarks.harness import git_commit, percentile  # noqa: E402
+
+ENDPOINTS = ("upload", "list", "get")
+CONTENT_TYPES = {
+    "pdf": "application/pdf",
+    "docx": "application/vnd.openxmlformats-officedocument.wordprocessingml.document",
+}
+
+# Corpus
+
+def load_corpus(directory):
+    """(file name, content) of every PDF and DOCX file under `directory`."""
+    files = sorted(path for path in Path(directory).expanduser().rglob("*") if path.suffix.lower() in (".pdf", ".docx"))
+    if not files:
+        raise SystemExit(f"No .pdf or .docx files in {directory}")
+    return [(path.name, path.read_bytes()) for path in files]
+
+def generate_corpus(count, pages, file_types, seed):
+    """`count` distinct generated documents, alternating formats and page counts."""
+    documents = []
+    for n in range(count):
+        file_type = file_types[n % len(file_types)]
+        document_pages = pages[n % len(pages)]
+        documents.append((f"resume-{n}.{file_type}", make_document(file_type, document_pages, seed=seed + n)))
+    return documents
+
+def parse_mix(text):
+    """Endpoint weights from "upload=8,list=1,get=1"."""
+    weights = {}
+    for item in text.split(","):
+        name, _, weight = item.partition("=")
+        if name.strip() not in ENDPOINTS:
+            raise argparse.ArgumentTypeError(f"Unknown endpoint {name!r}; expected one of {', '.join(ENDPOINTS)}")
+        weights[name.strip()] = float(weight or 1)
+    return weights
+
+# Server memory
+
+def process_tree_rss_mb(pid):
+    """Resident memory of `pid` and all its descendants in MiB, from /proc (Linux), or None."""
+    page_size = os.sysconf("SC_PAGE_SIZE")
+    children = defaultdict(list)
+    try:
+        for entry in os.listdir("/proc"):
+            if entry.isdigit():
+                try:
+                    with open(f"/proc/{entry}/stat") as f:
+                        # The command name may contain spaces; fields resume after its ")"
+                        parent = int(f.read().rsplit(")", 1)[1].split()[1])
+                    children[parent].append(int(entry))
+                except (OSError, IndexError, ValueError):
+                    continue
+    except OSError:
+        return None
+    total = 0
+    pending = [pid]
+    while pending:
+        current = pending.pop()
+        try:
+            with open(f"/proc/{current}/statm") as f:
+                total += int(f.read().split()[1]) * page_size
+        except (OSError, IndexError, ValueError):
+            if current == pid:
+                return None
+            continue
+        pending.extend(children.get(current, ()))
+    return total / (1024 * 1024)
+
+async def scrape_rss_mb(client, metrics_url):
+    """Sum of process_resident_memory_bytes at a Prometheus endpoint in MiB, or None."""
+    try:
+        response = await client.get(metrics_url)
+        response.raise_for_status()
+    except Exception:
+        return None
+    values = [float(line.rsplit(" ", 1)[1]) for line in response.text.splitlines() if line.startswith("process_resident_memory_bytes")]
+    return sum(values) / (1024 * 1024) if values else None
+
+# Recording
+
+class Window:
+    def __init__(self):
+        self.latencies = []
+        self.errors = Counter()
+        self.rss_mb = None
+
+class Recorder:
+    """Latencies and errors per endpoint, overall and in `interval`-second windows.
+
+    Requests finishing after `duration` (draining the last ones in flight) count
+    toward the last window.
+    """
+
+    def __init__(self, interval, duration):
+        self.interval = interval
+        self.duration = duration
+        self.last_window = max(0, math.ceil(duration / interval) - 1)
+        self.started = time.perf_counter()
+        self.windows = defaultdict(Window)
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(Counter)
+        self.dropped = 0
+
+    def window(self, at=None):
+        index = int(((at or time.perf_counter()) - self.started) // self.interval)
+        return self.windows[min(index, self.last_window)]
+
+    def record(self, endpoint, seconds, error=None):
+        window = self.window()
+        if error is None:
+            self.latencies[endpoint].append(seconds)
+            window.latencies.append(seconds)
+        else:
+            self.errors[endpoint][error] += 1
+            window.errors[error] += 1
+
+    def timeline(self):
+        rows = []
+        for index in range(max(self.windows, default=-1) + 1):
+            window = self.windows[index]
+            ordered = sorted(window.latencies)
+            span = min(self.interval, self.duration - index * self.interval)
+            rows.append({
+                "t": index * self.interval + span,
+                "ok": len(ordered),
+                "errors": sum(window.errors.values()),
+                "ok_per_s": len(ordered) / span,
+                "p50_ms": 1000 * percentile(ordered, 0.50),
+                "p95_ms": 1000 * percentile(ordered, 0.95),
+                "p99_ms": 1000 * percentile(ordered, 0.99),
+                "rss_mb": window.rss_mb,
+            })
+        return rows
+
+    def summary(self, wall_time):
+        endpoints = {}
+        for endpoint in sorted(set(self.latencies) | set(self.errors)):
+            ordered = sorted(self.latencies[endpoint])
+            endpoints[endpoint] = {
+                "ok": len(ordered),
+                "errors": dict(self.errors[endpoint]),
+                "ok_per_s": len(ordered) / wall_time if wall_time else 0.0,
+                "mean_ms": 1000 * sum(ordered) / len(ordered) if ordered else 0.0,
+                "p50_ms": 1000 * percentile(ordered, 0.50),
+                "p95_ms": 1000 * percentile(ordered, 0.95),
+                "p99_ms": 1000 * percentile(ordered, 0.99),
+                "max_ms": 1000 * ordered[-1] if ordered else 0.0,
+            }
+        rss = [window.rss_mb for window in self.windows.values() if window.rss_mb is not None]
+        return {
+            "wall_time_s": wall_time,
+            "dropped": self.dropped,
+            "peak_rss_mb": max(rss) if rss else None,
+            "endpoints": endpoints,
+        }
+
+# Requests
+
+class LoadGenerator:
+    def __init__(self, client, documents, mix, recorder, seed=0):
+        self.client = client
+        self.documents = documents
+        self.endpoints = list(mix)
+        self.weights = [mix[endpoint] for endpoint in self.endpoints]
+        self.recorder = recorder
+        self.rng = random.Random(seed)
+        self.next_document = 0
+        self.analysis_ids = []
+
+    def pick(self):
+        endpoint = self.rng.choices(self.endpoints, self.weights)[0]
+        # Nothing to fetch yet: list instead
+        return "list" if endpoint == "get" and not self.analysis_ids else endpoint
+
+    async def send(self, endpoint):
+        if endpoint == "upload":
+            name, content = self.documents[self.next_document % len(self.documents)]
+            self.next_document += 1
+            content_type = CONTENT_TYPES.get(name.rsplit(".", 1)[-1].lower(), "application/octet-stream")
+            response = await self.client.post("/api/upload-resume", files={"file": (name, content, content_type)})
+            if response.status_code == 200:
+                self.analysis_ids.append(response.json()["id"])
+                del self.analysis_ids[:-1000]
+        elif endpoint == "list":
+            response = await self.client.get("/api/analyses", params={"limit": 20})
+        else:
+            response = await self.client.get(f"/api/analyses/{self.rng.choice(self.analysis_ids)}")
+        return response.status_code
+
+    async def request(self, scheduled=None):
+        """One request, timed from `scheduled` (open loop) or from now."""
+        endpoint = self.pick()
+        started = scheduled if scheduled is not None else time.perf_counter()
+        try:
+            status = await self.send(endpoint)
+            error = None if status < 400 else str(status)
+        except Exception as e:
+            error = type(e).__name__
+        self.recorder.record(endpoint, time.perf_counter() - started, error)
+
+    async def closed_loop(self, concurrency, deadline):
+        async def client_loop():
+            while time.perf_counter() < deadline:
+                await self.request()
+
+        await asyncio.gather(*(client_loop() for _ in range(concurrency)))
+
+    async def open_loop(self, rate, deadline, max_in_flight, poisson=False):
+        in_flight = set()
+        scheduled = time.perf_counter()
+        while scheduled < deadline:
+            delay = scheduled - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            if len(in_flight) >= max_in_flight:
+                # The server is this far behind: count the arrival instead of queueing it
+                self.recorder.dropped += 1
+            else:
+                task = asyncio.ensure_future(self.request(scheduled))
+                in_flight.add(task)
+                task.add_done_callback(in_flight.discard)
+            scheduled += self.rng.expovariate(rate) if poisson else 1 / rate
+        if in_flight:
+            await asyncio.gather(*in_flight)
+
+async def sample_rss(recorder, read_rss, stop):
+    while not stop.is_set():
+        rss = await read_rss()
+        if rss is not None:
+            window = recorder.window()
+            window.rss_mb = max(window.rss_mb or 0.0, rss)
+        try:
+            await asyncio.wait_for(stop.wait(), timeout=min(1.0, recorder.interval))
+        except asyncio.TimeoutError:
+            pass
+
+async def print_progress(recorder, stop):
+    reported = 0
+    while not stop.is_set():
+        try:
+            await asyncio.wait_for(stop.wait(), timeout=recorder.interval)
+        except asyncio.TimeoutError:
+            pass
+        # Only windows that have closed
+        rows = recorder.timeline()[:int((time.perf_counter() - recorder.started) // recorder.interval)]
+        for row in rows[reported:]:
+            rss = f"{row['rss_mb']:>8.1f}" if row["rss_mb"] is not None else f"{'-':>8}"
+            print(f"{row['t']:>6.0f}s {row['ok']:>6} {row['ok_per_s']:>8.1f} {row['p50_ms']:>9.1f} "
+                  f"{row['p95_ms']:>9.1f} {row['p99_ms']:>9.1f} {row['errors']:>6} {rss}", flush=True)
+        reported = max(reported, len(rows))
+
+# Targets
+
+async def run(args, client, read_rss):
+    documents = load_corpus(args.corpus) if args.corpus else generate_corpus(args.documents, args.pages, args.file_types, args.seed)
+    recorder = Recorder(args.interval, args.duration)
+    generator = LoadGenerator(client, documents, args.mix, recorder, seed=args.seed)
+
+    if args.warmup:
+        # Untimed: starts extraction workers and fills connection pools
+        await asyncio.gather(*(generator.send("upload") for _ in range(args.warmup)), return_exceptions=True)
+        generator.next_document = 0
+
+    print(f"{'time':>7} {'ok':>6} {'ok/s':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'errors':>6} {'rss MB':>8}")
+    stop = asyncio.Event()
+    recorder.started = time.perf_counter()
+    background = [asyncio.ensure_future(print_progress(recorder, stop))]
+    if read_rss is not None:
+        background.append(asyncio.ensure_future(sample_rss(recorder, read_rss, stop)))
+    deadline = recorder.started + args.duration
+    if args.rate:
+        await generator.open_loop(args.rate, deadline, args.max_in_flight, poisson=args.poisson)
+    else:
+        await generator.closed_loop(args.concurrency, deadline)
+    wall_time = time.perf_counter() - recorder.started
+    stop.set()
+    await asyncio.gather(*background)
+    return recorder, wall_time
+
+async def run_in_process(args):
+    import httpx
+
+    os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+    os.environ.setdefault("DB_NAME", "resume_roaster_load")
+    import server
+    from tests.fakes import MemoryDatabase
+
+    server.use_database(MemoryDatabase())
+    if not args.server_logs:
+        # The request log would drown the report
+        logging.getLogger().setLevel(logging.WARNING)
+    await server.app.router.startup()
+    pid = os.getpid()
+
+    async def read_rss():
+        return process_tree_rss_mb(pid)
+
+    try:
+        transport = httpx.ASGITransport(app=server.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://loadgen", timeout=args.timeout) as client:
+            return await run(args, client, read_rss)
+    finally:
+        await server.app.router.shutdown()
+
+async def run_remote(args):
+    import httpx
+
+    limits = httpx.Limits(max_connections=args.max_in_flight if args.rate else args.concurrency)
+    async with httpx.AsyncClient(base_url=args.target, timeout=args.timeout, limits=limits) as client:
+        read_rss = None
+        if args.server_pid:
+            async def read_rss():
+                return process_tree_rss_mb(args.server_pid)
+        elif args.metrics_url:
+            async def read_rss():
+                return await scrape_rss_mb(client, args.metrics_url)
+        return await run(args, client, read_rss)
+
+def print_summary(summary):
+    print(f"\n{'endpoint':<10} {'ok':>7} {'ok/s':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'max ms':>9}  errors")
+    for endpoint, stats in summary["endpoints"].items():
+        errors = ", ".join(f"{error}: {count}" for error, count in sorted(stats["errors"].items())) or "-"
+        print(f"{endpoint:<10} {stats['ok']:>7} {stats['ok_per_s']:>8.1f} {stats['p50_ms']:>9.1f} {stats['p95_ms']:>9.1f} "
+              f"{stats['p99_ms']:>9.1f} {stats['max_ms']:>9.1f}  {errors}")
+    if summary["dropped"]:
+        print(f"Dropped {summary['dropped']} arrivals with --max-in-flight requests outstanding")
+    if summary["peak_rss_mb"] is not None:
+        print(f"Peak server RSS: {summary['peak_rss_mb']:.1f} MB")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--target", default="inprocess", help="'inprocess' or the base URL of a running stack")
+    load = parser.add_mutually_exclusive_group()
+    load.add_argument("--rate", type=float, help="requests per second (open loop)")
+    load.add_argument("--concurrency", type=int, default=4, help="concurrent clients (closed loop)")
+    parser.add_argument("--poisson", action="store_true", help="exponential inter-arrival times with --rate")
+    parser.add_argument("--max-in-flight", type=int, default=256, help="outstanding requests before arrivals are dropped (--rate)")
+    parser.add_argument("--duration", type=float, default=30, help="seconds of load")
+    parser.add_argument("--warmup", type=int, default=2, help="untimed uploads before the run")
+    parser.add_argument("--interval", type=float, default=5, help="seconds per reporting window")
+    parser.add_argument("--mix", type=parse_mix, default=parse_mix("upload=8,list=1,get=1"),
+                        help="endpoint weights, e.g. upload=8,list=1,get=1")
+    parser.add_argument("--corpus", help="directory of real .pdf/.docx resumes to upload")
+    parser.add_argument("--documents", type=int, default=200, help="generated documents when no --corpus is given")
+    parser.add_argument("--pages", type=int, nargs="+", default=[1, 2, 3], help="page counts of generated documents")
+    parser.add_argument("--file-types", choices=("pdf", "docx"), nargs="+", default=["pdf", "docx"])
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--timeout", type=float, default=60)
+    parser.add_argument("--server-pid", type=int, help="local server master PID whose process tree RSS is reported")
+    parser.add_argument("--metrics-url", help="Prometheus endpoint to read process_resident_memory_bytes from")
+    parser.add_argument("--server-logs", action="store_true", help="keep the in-process server's INFO logs")
+    parser.add_argument("--output", help="write the summary and timeline to this JSON file")
+    args = parser.parse_args()
+
+    if args.target == "inprocess":
+        recorder, wall_time = asyncio.run(run_in_process(args))
+    else:
+        recorder, wall_time = asyncio.run(run_remote(args))
+
+    summary = recorder.summary(wall_time)
+    print_summary(summary)
+    if args.output:
+        report = {
+            "commit": git_commit(),
+            "created": datetime.now(timezone.utc).isoformat(),
+            "cpu_count": os.cpu_count(),
+            "args": {key: value for key, value in vars(args).items()},
+            "summary": summary,
+            "timeline": recorder.timeline(),
+        }
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+            f.write("\n")
+        print(f"Wrote {args.output}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,11 @@
+import os
+import sys
+from pathlib import Path
+
+# The backend is run from its own directory (`uvicorn server:app`), so its modules
+# import each other by bare name
+BACKEND_DIR = Path(__file__).resolve().parent.parent / "backend"
+sys.path.insert(0, str(BACKEND_DIR))
+
+os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+os.environ.setdefault("DB_NAME", "test_database")
@@ -0,0 +1,207 @@
+"""Test doubles shared by the tests, the benchmarks and the load generator.
+
+MemoryDatabase is an in-process stand-in for the Motor database, covering what
+the upload path uses. It supports equality, `$gt`/`$gte`/`$lt`/`$lte`/`$in` and
+`$or`/`$and` queries, inclusion/exclusion projections, `$set`/`$setOnInsert`/`$inc` updates and upserts
+(also through `bulk_write` of UpdateOne), `insert_one`/`insert_many` (duplicate
+keys raise BulkWriteError like Mongo's), `delete_many`, and
+`find().sort().limit().to_list()` or `async for` over `find()`.
+Every call yields to the event loop once, like a real round trip would.
+"""
+import asyncio
+import copy
+
+from pymongo.errors import BulkWriteError
+
+class InsertOneResult:
+    def __init__(self, inserted_id):
+        self.inserted_id = inserted_id
+
+class DeleteResult:
+    def __init__(self, deleted_count):
+        self.deleted_count = deleted_count
+
+OPERATORS = {
+    "$gt": lambda value, bound: value is not None and value > bound,
+    "$gte": lambda value, bound: value is not None and value >= bound,
+    "$lt": lambda value, bound: value is not None and value < bound,
+    "$lte": lambda value, bound: value is not None and value <= bound,
+    "$in": lambda value, bound: value in bound,
+}
+
+def matches_value(value, condition):
+    if isinstance(condition, dict) and condition and all(key in OPERATORS for key in condition):
+        return all(OPERATORS[key](value, bound) for key, bound in condition.items())
+    return value == condition
+
+def matches(document, query):
+    for key, condition in query.items():
+        if key == "$or":
+            if not any(matches(document, clause) for clause in condition):
+                return False
+        elif key == "$and":
+            if not all(matches(document, clause) for clause in condition):
+                return False
+        elif not matches_value(document.get(key), condition):
+            return False
+    return True
+
+def walk(document, path):
+    """The dict holding dotted `path` in `document` (created as needed) and the last key."""
+    *parents, key = path.split(".")
+    for name in parents:
+        document = document.setdefault(name, {})
+    return document, key
+
+def set_fields(document, fields):
+    for path, value in fields.items():
+        parent, key = walk(document, path)
+        parent[key] = value
+
+def project(document, projection):
+    if not projection:
+        return copy.copy(document)
+    included = {key for key, value in projection.items() if value}
+    if included:
+        return {key: value for key, value in document.items() if key in included or key == "_id"}
+    return {key: value for key, value in document.items() if key not in projection}
+
+class MemoryCursor:
+    def __init__(self, documents, projection):
+        self._documents = documents
+        self._projection = projection
+        self._limit = None
+
+    def sort(self, keys):
+        for key, direction in reversed(keys):
+            self._documents.sort(key=lambda document: document.get(key), reverse=direction < 0)
+        return self
+
+    def limit(self, limit):
+        self._limit = limit
+        return self
+
+    def __aiter__(self):
+        return self._iterate()
+
+    async def _iterate(self):
+        for document in await self.to_list(None):
+            yield document
+
+    async def to_list(self, length):
+        await asyncio.sleep(0)
+        documents = self._documents[:min(filter(None, (self._limit, length)), default=None)]
+        return [project(document, self._projection) for document in documents]
+
+class MemoryCollection:
+    def __init__(self):
+        self.documents = {}
+        self._next_id = 0
+
+    def _key(self, document):
+        if "_id" not in document:
+            self._next_id += 1
+            document["_id"] = self._next_id
+        key = document["_id"]
+        # Binary is a bytes subclass, so UUID keys hash fine
+        if key in self.documents:
+            raise ValueError(f"Duplicate key: {key!r}")
+        return key
+
+    async def insert_one(self, document):
+        await asyncio.sleep(0)
+        key = self._key(document)
+        self.documents[key] = document
+        return InsertOneResult(key)
+
+    async def insert_many(self, documents, ordered=True):
+        await asyncio.sleep(0)
+        errors = []
+        for index, document in enumerate(documents):
+            try:
+                self.documents[self._key(document)] = document
+            except ValueError as e:
+                errors.append({"index": index, "code": 11000, "errmsg": str(e)})
+                if ordered:
+                    break
+        if errors:
+            raise BulkWriteError({"writeErrors": errors})
+
+    async def find_one(self, query, projection=None):
+        await asyncio.sleep(0)
+        if set(query) == {"_id"}:
+            document = self.documents.get(query["_id"])
+            return project(document, projection) if document is not None else None
+        for document in self.documents.values():
+            if matches(document, query):
+                return project(document, projection)
+        return None
+
+    def find(self, query=None, projection=None):
+        return MemoryCursor([document for document in self.documents.values() if matches(document, query or {})], projection)
+
+    async def update_one(self, query, update, upsert=False):
+        await asyncio.sleep(0)
+        if set(query) == {"_id"} and not isinstance(query["_id"], dict):
+            document = self.documents.get(query["_id"])
+        else:
+            document = next((candidate for candidate in self.documents.values() if matches(candidate, query)), None)
+        if document is None:
+            if not upsert:
+                return
+            document = {key: value for key, value in query.items() if not key.startswith("$")}
+            set_fields(document, update.get("$setOnInsert", {}))
+            await self.insert_one(document)
+        set_fields(document, update.get("$set", {}))
+        for path, amount in update.get("$inc", {}).items():
+            parent, key = walk(document, path)
+            parent[key] = parent.get(key, 0) + amount
+
+    async def bulk_write(self, requests, ordered=True):
+        for request in requests:
+            await self.update_one(request._filter, request._doc, upsert=request._upsert)
+
+    async def delete_many(self, query):
+        await asyncio.sleep(0)
+        keys = [key for key, document in self.documents.items() if matches(document, query)]
+        for key in keys:
+            del self.documents[key]
+        return DeleteResult(len(keys))
+
+    async def create_index(self, *args, **kwargs):
+        return kwargs.get("name")
+
+    async def drop_index(self, name):
+        pass
+
+    async def count_documents(self, query):
+        return sum(1 for document in self.documents.values() if matches(document, query))
+
+class MemoryDatabase:
+    def __init__(self):
+        self._collections = {}
+
+    def __getattr__(self, name):
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return self[name]
+
+    def __getitem__(self, name):
+        return self._collections.setdefault(name, MemoryCollection())
+
+    async def command(self, name, *args, **kwargs):
+        return {"ok": 1}
+
+# Stored analyses
+
+def analysis(number, timestamp, text=None, file_hash=None):
+    """A ResumeAnalysis document as `AnalysisStore.save` takes it, numbered for a stable id."""
+    return {
+        "id": f"00000000-0000-4000-8000-{number:012d}",
+        "resume_text": text if text is not None else f"Resume number {number}",
+        "roast": "roast",
+        "review": "review",
+        "file_hash": file_hash,
+        "analysis_version": "3:local",
+        "timestamp": timestamp,
+    }
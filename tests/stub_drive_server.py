@@ -0,0 +1,149 @@
+"""Local stand-in for Google Drive's public download endpoints.
+
+Mimics the parts of Drive the download client depends on:
+
+- /uc?export=download&id=<id> redirects to /download for small files, and for
+  files registered with `confirm=True` answers with the "can't scan this file
+  for viruses" HTML page whose form carries a confirm token
+- /download serves the file with an ETag and Last-Modified, answering
+  304 Not Modified to a matching If-None-Match
+- /document/d/<id>/export?format=docx serves Google Docs exports
+
+Run by hand to try Drive links against a local server:
+
+    python -m tests.stub_drive_server --port 8090 resume.pdf
+    GDRIVE_URL=http://127.0.0.1:8090 uvicorn server:app
+"""
+import argparse
+import hashlib
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+CONFIRM_TOKEN = "t0ken"
+LAST_MODIFIED = "Mon, 05 Oct 2026 10:00:00 GMT"
+
+CONFIRM_PAGE = """<!DOCTYPE html><html><head><title>Google Drive - Virus scan warning</title></head><body>
+<p>Google Drive can't scan this file for viruses.</p>
+<form id="download-form" action="{action}" method="get">
+<input type="submit" value="Download anyway"/>
+<input type="hidden" name="id" value="{file_id}">
+<input type="hidden" name="export" value="download">
+<input type="hidden" name="confirm" value="{token}">
+<input type="hidden" name="uuid" value="0f1e2d3c">
+</form></body></html>"""
+
+class StubDriveServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address=("127.0.0.1", 0)):
+        super().__init__(address, StubDriveHandler)
+        # file id -> (content, needs confirmation)
+        self.files = {}
+        self.documents = {}
+        self.requests = []
+        self._lock = threading.Lock()
+
+    @property
+    def base_url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def add_file(self, file_id, content, confirm=False):
+        self.files[file_id] = (content, confirm)
+
+    def add_document(self, file_id, content):
+        self.documents[file_id] = content
+
+    def start(self):
+        thread = threading.Thread(target=self.serve_forever, daemon=True)
+        thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+class StubDriveHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        url = urlparse(self.path)
+        query = {key: values[0] for key, values in parse_qs(url.query).items()}
+        with self.server._lock:
+            self.server.requests.append((url.path, query, dict(self.headers)))
+        if url.path == "/uc":
+            self.handle_uc(query)
+        elif url.path == "/download":
+            self.handle_download(query)
+        elif url.path.startswith("/document/d/") and url.path.endswith("/export"):
+            file_id = url.path.split("/")[3]
+            if file_id not in self.server.documents or query.get("format") != "docx":
+                self.send_error(404)
+                return
+            self.send_file(self.server.documents[file_id], "application/vnd.openxmlformats-officedocument.wordprocessingml.document")
+        else:
+            self.send_error(404)
+
+    def handle_uc(self, query):
+        file_id = query.get("id")
+        if file_id not in self.server.files:
+            self.send_error(404)
+            return
+        _, confirm = self.server.files[file_id]
+        if confirm and query.get("confirm") != CONFIRM_TOKEN:
+            page = CONFIRM_PAGE.format(action="/download", file_id=file_id, token=CONFIRM_TOKEN).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/html; charset=utf-8")
+            self.send_header("Content-Length", str(len(page)))
+            self.end_headers()
+            self.wfile.write(page)
+            return
+        self.send_response(303)
+        self.send_header("Location", f"/download?id={file_id}&export=download")
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def handle_download(self, query):
+        file_id = query.get("id")
+        if file_id not in self.server.files:
+            self.send_error(404)
+            return
+        content, confirm = self.server.files[file_id]
+        if confirm and query.get("confirm") != CONFIRM_TOKEN:
+            self.send_error(403)
+            return
+        self.send_file(content, "application/octet-stream")
+
+    def send_file(self, content, content_type):
+        etag = f'"{hashlib.sha256(content).hexdigest()[:16]}"'
+        if self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(content)))
+        self.send_header("ETag", etag)
+        self.send_header("Last-Modified", LAST_MODIFIED)
+        self.end_headers()
+        self.wfile.write(content)
+
+    def log_message(self, format, *args):
+        pass
+
+def main():
+    parser = argparse.ArgumentParser(description="Stub Google Drive download server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8090)
+    parser.add_argument("files", nargs="+", help="files to serve; each is shared under its file name as the id")
+    args = parser.parse_args()
+    server = StubDriveServer((args.host, args.port))
+    for path in args.files:
+        with open(path, "rb") as f:
+            file_id = path.rsplit("/", 1)[-1].replace(".", "_").ljust(10, "_")
+            server.add_file(file_id, f.read(), confirm=True)
+            print(f"https://drive.google.com/file/d/{file_id}/view")
+    server.serve_forever()
+
+if __name__ == "__main__":
+    main()
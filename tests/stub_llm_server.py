@@ -0,0 +1,105 @@
+"""Local stand-in for an OpenAI-compatible chat completions server.
+
+Used by the tests, and handy by hand to see how the API behaves when the
+upstream model is slow:
+
+    python -m tests.stub_llm_server --port 8089 --delay 3
+    ROAST_ENGINE=llm ROAST_LLM_BASE_URL=http://127.0.0.1:8089/v1 uvicorn server:app
+"""
+import argparse
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+class StubLLMServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address=("127.0.0.1", 0), delay=0.0, content=None, stream_content=None, chunk_delay=0.0):
+        super().__init__(address, StubLLMHandler)
+        self.delay = delay
+        self.chunk_delay = chunk_delay
+        self.content = content or json.dumps({
+            "roast": "Your resume has more buzzwords than a beehive.",
+            "review": "Quantify your achievements.",
+        })
+        self.stream_content = stream_content or (
+            "Here you go!\n### ROAST\nYour resume has more buzzwords than a beehive.\n\n"
+            "Even your hobbies sound like KPIs.\n### REVIEW\nQuantify your achievements."
+        )
+        self.requests = []
+        self._lock = threading.Lock()
+
+    @property
+    def base_url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def start(self):
+        thread = threading.Thread(target=self.serve_forever, daemon=True)
+        thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+class StubLLMHandler(BaseHTTPRequestHandler):
+    def do_POST(self):
+        if self.path != "/v1/chat/completions":
+            self.send_error(404)
+            return
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        with self.server._lock:
+            self.server.requests.append(body)
+        time.sleep(self.server.delay)
+        if body.get("stream"):
+            self.stream_completion(body)
+            return
+        payload = json.dumps({
+            "id": "chatcmpl-stub",
+            "object": "chat.completion",
+            "model": body.get("model"),
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": self.server.content},
+                "finish_reason": "stop",
+            }],
+        }).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def stream_completion(self, body):
+        """Send stream_content as SSE deltas of a few characters each."""
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.end_headers()
+        content = self.server.stream_content
+        for start in range(0, len(content), 7):
+            delta = {"choices": [{"index": 0, "delta": {"content": content[start:start + 7]}}]}
+            self.wfile.write(f"data: {json.dumps(delta)}\n\n".encode())
+            self.wfile.flush()
+            time.sleep(self.server.chunk_delay)
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.wfile.flush()
+        self.close_connection = True
+
+    def log_message(self, format, *args):
+        pass
+
+def main():
+    parser = argparse.ArgumentParser(description="Stub OpenAI-compatible model server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--delay", type=float, default=0.0, help="seconds to wait before answering")
+    parser.add_argument("--chunk-delay", type=float, default=0.0, help="seconds between streamed deltas")
+    args = parser.parse_args()
+    server = StubLLMServer((args.host, args.port), delay=args.delay, chunk_delay=args.chunk_delay)
+    print(f"Stub model server listening on {server.base_url} (delay {args.delay}s)")
+    server.serve_forever()
+
+if __name__ == "__main__":
+    main()
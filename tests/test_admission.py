@@ -0,0 +1,152 @@
+import asyncio
+import unittest
+
+from admission import AdmissionGate, Overloaded, RateLimitMiddleware, TokenBucketLimiter
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+class AdmissionGateTest(unittest.TestCase):
+    def test_rejects_when_queue_is_full(self):
+        gate = AdmissionGate(max_concurrency=1, max_queue=1, max_wait=1.0)
+        release = None
+
+        async def hold():
+            async with gate.admit():
+                await release.wait()
+
+        async def run():
+            nonlocal release
+            release = asyncio.Event()
+            holder = asyncio.ensure_future(hold())
+            waiter = asyncio.ensure_future(hold())
+            await asyncio.sleep(0.01)
+            with self.assertRaises(Overloaded) as rejected:
+                async with gate.admit():
+                    pass
+            stats = gate.stats()
+            release.set()
+            await asyncio.gather(holder, waiter)
+            return rejected.exception, stats
+
+        rejected, stats = asyncio.run(run())
+        self.assertEqual(rejected.reason, "queue_full")
+        self.assertGreaterEqual(rejected.retry_after, 1)
+        self.assertEqual((stats["active"], stats["waiting"]), (1, 1))
+        self.assertEqual(gate.stats()["admitted"], 2)
+        self.assertEqual(gate.stats()["active"], 0)
+
+    def test_rejects_after_max_wait(self):
+        gate = AdmissionGate(max_concurrency=1, max_queue=4, max_wait=0.05)
+
+        async def run():
+            async with gate.admit():
+                with self.assertRaises(Overloaded) as rejected:
+                    async with gate.admit():
+                        pass
+            return rejected.exception
+
+        self.assertEqual(asyncio.run(run()).reason, "wait_timeout")
+        self.assertEqual(gate.stats()["rejected"], {"queue_full": 0, "wait_timeout": 1})
+        self.assertEqual(gate.stats()["waiting"], 0)
+
+    def test_burst_beyond_queue_is_rejected(self):
+        gate = AdmissionGate(max_concurrency=1, max_queue=1, max_wait=5.0)
+
+        async def request():
+            try:
+                async with gate.admit():
+                    await asyncio.sleep(0.05)
+                return "ok"
+            except Overloaded as e:
+                return e.reason
+
+        async def run():
+            return await asyncio.gather(*(request() for _ in range(5)))
+
+        self.assertEqual(asyncio.run(run()), ["ok", "ok", "queue_full", "queue_full", "queue_full"])
+
+    def test_blocking_admit_waits_past_the_queue_limits(self):
+        gate = AdmissionGate(max_concurrency=1, max_queue=0, max_wait=0.01)
+
+        async def request():
+            async with gate.admit(blocking=True):
+                await asyncio.sleep(0.03)
+            return "ok"
+
+        async def run():
+            return await asyncio.gather(*(request() for _ in range(3)))
+
+        self.assertEqual(asyncio.run(run()), ["ok", "ok", "ok"])
+        self.assertEqual(gate.stats()["rejected"], {"queue_full": 0, "wait_timeout": 0})
+
+    def test_blocking_admit_gives_up_after_max_wait(self):
+        gate = AdmissionGate(max_concurrency=1, max_queue=0, max_wait=0.01)
+
+        async def request():
+            try:
+                async with gate.admit(blocking=True, max_wait=0.02):
+                    await asyncio.sleep(0.1)
+                return "ok"
+            except Overloaded as e:
+                return e.reason
+
+        async def run():
+            return await asyncio.gather(*(request() for _ in range(2)))
+
+        self.assertEqual(asyncio.run(run()), ["ok", "wait_timeout"])
+        self.assertEqual(gate.stats()["rejected"], {"queue_full": 0, "wait_timeout": 1})
+
+class TokenBucketLimiterTest(unittest.TestCase):
+    def test_refills_at_rate(self):
+        clock = FakeClock()
+        limiter = TokenBucketLimiter(rate=1.0, burst=2, clock=clock)
+
+        async def run():
+            waits = [await limiter.acquire("a") for _ in range(3)]
+            other = await limiter.acquire("b")
+            clock.now += 1.0
+            return waits, other, await limiter.acquire("a")
+
+        waits, other, refilled = asyncio.run(run())
+        self.assertEqual(waits[:2], [0.0, 0.0])
+        self.assertAlmostEqual(waits[2], 1.0)
+        self.assertEqual(other, 0.0)
+        self.assertEqual(refilled, 0.0)
+        self.assertEqual(limiter.stats()["limited"], 1)
+
+async def request(middleware, query=b"", headers=()):
+    messages = []
+
+    async def send(message):
+        messages.append(message)
+
+    scope = {"type": "http", "method": "POST", "path": "/upload", "query_string": query,
+             "headers": list(headers), "client": ("10.0.0.1", 1234)}
+    await middleware(scope, None, send)
+    return messages[0]["status"], dict(messages[0]["headers"])
+
+async def ok_app(scope, receive, send):
+    await send({"type": "http.response.start", "status": 200, "headers": []})
+    await send({"type": "http.response.body", "body": b""})
+
+class RateLimitMiddlewareTest(unittest.TestCase):
+    def test_rate_limits_per_client(self):
+        limiter = TokenBucketLimiter(rate=0.5, burst=1, clock=FakeClock())
+        middleware = RateLimitMiddleware(ok_app, {"/upload"}, limiter)
+        client = [(b"x-real-ip", b"1.2.3.4")]
+        self.assertEqual(asyncio.run(request(middleware, headers=client))[0], 200)
+        status, headers = asyncio.run(request(middleware, headers=client))
+        self.assertEqual((status, headers[b"retry-after"]), (429, b"2"))
+        # Queued uploads count against the same bucket
+        self.assertEqual(asyncio.run(request(middleware, query=b"async=1", headers=client))[0], 429)
+        self.assertEqual(asyncio.run(request(middleware, headers=[(b"x-real-ip", b"5.6.7.8")]))[0], 200)
+        # Without the header the peer address is the client
+        self.assertEqual(asyncio.run(request(middleware))[0], 200)
+
+if __name__ == "__main__":
+    unittest.main()
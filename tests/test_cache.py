@@ -0,0 +1,43 @@
+import unittest
+
+from cache import LRUCache
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+class LRUCacheTest(unittest.TestCase):
+    def test_evicts_least_recently_used_by_size(self):
+        cache = LRUCache(max_size=10, sizeof=len)
+        cache.set("a", "aaaa")
+        cache.set("b", "bbbb")
+        self.assertEqual(cache.get("a"), "aaaa")
+        cache.set("c", "cccc")
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(cache.get("a"), "aaaa")
+        self.assertEqual(cache.size, 8)
+        self.assertEqual(cache.evictions, 1)
+
+    def test_expires_entries_after_ttl(self):
+        clock = FakeClock()
+        cache = LRUCache(max_size=10, ttl=5, clock=clock)
+        cache.set("a", 1)
+        clock.now = 4
+        self.assertEqual(cache.get("a"), 1)
+        clock.now = 6
+        self.assertIsNone(cache.get("a"))
+        self.assertEqual(len(cache), 0)
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+
+    def test_ignores_values_larger_than_the_cache(self):
+        cache = LRUCache(max_size=3, sizeof=len)
+        cache.set("a", "aa")
+        cache.set("b", "bbbb")
+        self.assertEqual(cache.get("a"), "aa")
+        self.assertIsNone(cache.get("b"))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,192 @@
+import asyncio
+import io
+import unittest
+import zipfile
+
+import docx
+
+from benchmarks.corpus import make_pdf
+import extraction
+from extraction import ExtractionPool, ExtractionTimeout, extract_text_from_docx, read_docx, read_pdf
+
+def make_docx(paragraphs):
+    document = docx.Document()
+    for text in paragraphs:
+        document.add_paragraph(text)
+    buffer = io.BytesIO()
+    document.save(buffer)
+    return buffer.getvalue()
+
+def slow_extraction(file_type, file_content):
+    import time
+    time.sleep(5)
+
+def sleepy_extraction(file_type, file_content):
+    import os
+    import time
+    time.sleep(float(file_content))
+    return extraction.ExtractionResult(str(os.getpid()))
+
+class ExtractionPoolTest(unittest.TestCase):
+    def test_process_pool_extracts_docx(self):
+        pool = ExtractionPool(kind="process", max_workers=1, max_tasks_per_child=1)
+        content = make_docx(["Jane Doe", "Software Engineer"])
+
+        async def run():
+            # Two jobs with max_tasks_per_child=1 swap in a fresh pool between them
+            first = await pool.extract("docx", content)
+            second = await pool.extract("docx", content)
+            return first, second
+
+        try:
+            first, second = asyncio.run(run())
+        finally:
+            pool.shutdown()
+        self.assertEqual(first.text, extract_text_from_docx(content))
+        self.assertFalse(first.failed)
+        self.assertEqual(first, second)
+
+    def test_timeout_replaces_pool(self):
+        pool = ExtractionPool(kind="process", max_workers=1, timeout=0.5)
+
+        async def run():
+            import extraction
+            original = extraction.run_extraction
+            extraction.run_extraction = slow_extraction
+            try:
+                with self.assertRaises(ExtractionTimeout):
+                    await pool.extract("docx", b"")
+            finally:
+                extraction.run_extraction = original
+            return (await pool.extract("docx", make_docx(["After timeout"]))).text
+
+        try:
+            text = asyncio.run(run())
+        finally:
+            pool.shutdown()
+        self.assertIn("After timeout", text)
+
+    def test_timeout_spares_other_documents_on_the_pool(self):
+        pool = ExtractionPool(kind="process", max_workers=2, timeout=2.0)
+
+        async def run():
+            await pool.warm_up()
+            processes = list(pool._executor._processes.values())
+            original = extraction.run_extraction
+            extraction.run_extraction = sleepy_extraction
+            try:
+                stuck = asyncio.ensure_future(pool.extract("docx", b"30"))
+                await asyncio.sleep(1.5)
+                # Still running on the same pool when the stuck document times out
+                running = asyncio.ensure_future(pool.extract("docx", b"1.2"))
+                with self.assertRaises(ExtractionTimeout):
+                    await stuck
+                pid = (await running).text
+            finally:
+                extraction.run_extraction = original
+            return processes, pid
+
+        try:
+            processes, pid = asyncio.run(run())
+            # The drained pool is closed and its stuck worker killed
+            for process in processes:
+                process.join(timeout=5)
+        finally:
+            pool.shutdown()
+        self.assertIn(int(pid), [process.pid for process in processes])
+        self.assertFalse(any(process.is_alive() for process in processes))
+
+class PdfExtractionTest(unittest.TestCase):
+    def test_page_results_mark_image_pages(self):
+        result = read_pdf(make_pdf(8))
+        self.assertFalse(result.failed)
+        self.assertEqual(result.pages, 8)
+        statuses = [page.status for page in result.page_results]
+        self.assertEqual(statuses[6], "image")
+        self.assertEqual(statuses.count("text"), 7)
+        self.assertEqual(result.page_results[6].chars, 0)
+
+    def test_budgets_truncate(self):
+        full = read_pdf(make_pdf(10))
+        by_pages = read_pdf(make_pdf(10), max_pages=2)
+        self.assertTrue(by_pages.truncated)
+        self.assertEqual(len(by_pages.page_results), 2)
+        by_chars = read_pdf(make_pdf(10), max_chars=100)
+        self.assertTrue(by_chars.truncated)
+        self.assertEqual(len(by_chars.text), 100)
+        self.assertEqual(len(by_chars.page_results), 1)
+        self.assertTrue(full.text.startswith(by_chars.text))
+        self.assertFalse(full.truncated)
+
+    def test_chunked_pool_matches_serial(self):
+        content = make_pdf(11)
+        pool = ExtractionPool(kind="thread", max_workers=2, pdf_chunk_pages=2)
+        try:
+            result = asyncio.run(pool.extract("pdf", content))
+        finally:
+            pool.shutdown()
+        serial = read_pdf(content)
+        self.assertEqual(result.text, serial.text)
+        self.assertEqual([page.number for page in result.page_results], list(range(11)))
+
+    def test_chunked_pool_stops_at_char_budget(self):
+        pool = ExtractionPool(kind="thread", max_workers=2, pdf_chunk_pages=1, pdf_max_chars=500)
+        try:
+            result = asyncio.run(pool.extract("pdf", make_pdf(20)))
+        finally:
+            pool.shutdown()
+        self.assertTrue(result.truncated)
+        self.assertEqual(len(result.text), 500)
+        self.assertLess(len(result.page_results), 20)
+
+    def test_unreadable_pdf_falls_back(self):
+        pool = ExtractionPool(kind="thread", max_workers=1)
+        try:
+            result = asyncio.run(pool.extract("pdf", b"not a pdf"))
+        finally:
+            pool.shutdown()
+        self.assertTrue(result.failed)
+        self.assertTrue(read_pdf(b"not a pdf").failed)
+
+class DocxExtractionTest(unittest.TestCase):
+    def test_document_order_and_merged_cells(self):
+        document = docx.Document()
+        document.add_paragraph("Experience")
+        table = document.add_table(rows=3, cols=3)
+        table.cell(0, 0).merge(table.cell(0, 2)).text = "Acme Corp"
+        table.cell(1, 0).merge(table.cell(2, 0)).text = "2019"
+        table.cell(1, 1).text = "Engineer"
+        table.cell(2, 1).text = "Lead"
+        document.add_paragraph("Skills\tPython")
+        buffer = io.BytesIO()
+        document.save(buffer)
+
+        result = read_docx(buffer.getvalue())
+        self.assertFalse(result.failed)
+        self.assertEqual(result.text, "Experience\nAcme Corp \n2019 Engineer \nLead \nSkills\tPython\n")
+
+    def test_rejects_zip_bomb(self):
+        buffer = io.BytesIO()
+        with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as archive:
+            archive.writestr("word/document.xml", b"<w:document>" + b" " * (8 * 1024 * 1024) + b"</w:document>")
+        result = read_docx(buffer.getvalue())
+        self.assertTrue(result.failed)
+        self.assertEqual(result.text, extraction.DOCX_TOO_LARGE_MESSAGE)
+
+    def test_falls_back_to_python_docx(self):
+        content = make_docx(["Jane Doe", "Software Engineer"])
+        original = extraction.iter_docx_blocks
+
+        def broken(file_content):
+            raise ValueError("unexpected markup")
+            yield
+
+        extraction.iter_docx_blocks = broken
+        try:
+            result = read_docx(content)
+        finally:
+            extraction.iter_docx_blocks = original
+        self.assertEqual(result.text, "Jane Doe\nSoftware Engineer\n")
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,87 @@
+import unittest
+
+from features import FeatureExtractor, Rule, longest_gap, month_index, select_messages
+from text_scan import TextScanner
+
+RESUME = """Jane Doe
+jane@example.com | +1 (555) 123-4567 | linkedin.com/in/jane
+Summary:
+Results-driven team player.
+WORK EXPERIENCE
+Acme Corp, Engineer, Jan 2015 - Mar 2017
+- Responsible for the billing platform
+- Led migration to Kubernetes, cutting costs by 30%
+Globex, 2019 - Present
+• Built a pipeline handling 2,000,000 events per day
+Skills
+Python, SQL
+"""
+
+class FeatureExtractorTest(unittest.TestCase):
+    def setUp(self):
+        self.extractor = FeatureExtractor(TextScanner(["team player", "results-driven"]))
+
+    def test_extracts_all_features(self):
+        features = self.extractor.extract(RESUME)
+        self.assertEqual(features.sections, ("summary", "experience", "skills"))
+        self.assertEqual(features.missing_sections, ("education",))
+        self.assertEqual((features.bullet_count, features.action_bullet_count), (3, 2))
+        # The percentage and the event count; dates and the phone number are not results
+        self.assertEqual(features.quantified_count, 2)
+        self.assertEqual(features.buzzword_count, 2)
+        self.assertEqual(features.longest_gap_months, 22)
+        self.assertTrue(features.has_email and features.has_phone and features.has_linkedin)
+        self.assertFalse(features.has_github)
+        self.assertEqual(features.word_count, len(RESUME.split()))
+        self.assertEqual(features.non_empty_line_count, 12)
+
+    def test_dates(self):
+        self.assertEqual(month_index("Mar 2019"), 2019 * 12 + 2)
+        self.assertEqual(month_index("03/2019"), 2019 * 12 + 2)
+        self.assertEqual(month_index("sept. 2019"), 2019 * 12 + 8)
+        self.assertEqual(longest_gap([(10, 20), (15, 30), (40, 50)]), 10)
+        self.assertEqual(longest_gap([]), 0)
+
+class SelectMessagesTest(unittest.TestCase):
+    rules = [
+        Rule("a", lambda f: 5),
+        Rule("b", lambda f: 9),
+        Rule("c", lambda f: 0, filler=True),
+        Rule("d", lambda f: 0, filler=True),
+        Rule("e", lambda f: 0, filler=True),
+        Rule("missing", lambda f: 0),
+    ]
+
+    def test_best_scores_first_then_padding(self):
+        selected = select_messages(self.rules, None, "resume text")
+        self.assertEqual(selected[:2], ["b", "a"])
+        self.assertEqual(len(selected), 3)
+        self.assertIn(selected[2], {"c", "d", "e"})
+
+    def test_pads_only_with_fillers(self):
+        rules = [Rule("missing", lambda f: 0), Rule("filler", lambda f: 0, filler=True)]
+        self.assertEqual(select_messages(rules, None, "resume text"), ["filler"])
+
+    def test_complete_resume_gets_no_false_claims(self):
+        import server
+
+        # Every section, contact details, numbers and no gap: few rules apply
+        resume = RESUME.replace("2019 - Present", "2017 - Present").replace("Skills", "Education\nBSc Computer Science, 2014\nSkills")
+        features = server.feature_extractor.extract(resume)
+        for rules, messages in ((server.ROAST_RULES, server.ROAST_MESSAGES), (server.REVIEW_RULES, server.REVIEW_MESSAGES)):
+            selected = select_messages(rules, features, resume)
+            self.assertGreaterEqual(len(selected), 3)
+            scores = {rule.message_id: rule.score(features) for rule in rules}
+            for message_id in selected:
+                self.assertTrue(scores[message_id] > 0 or "{" not in messages[message_id], message_id)
+            for message_id in ("roast.tenure_gap", "roast.passive_bullets", "roast.wall_of_text", "roast.buzzword_bingo",
+                               "roast.no_contact", "review.add_experience", "review.add_education", "review.add_contact"):
+                self.assertNotIn(message_id, selected)
+
+    def test_deterministic(self):
+        self.assertEqual(select_messages(self.rules, None, "same"), select_messages(self.rules, None, "same"))
+        paddings = {select_messages(self.rules, None, f"text {n}")[2] for n in range(20)}
+        self.assertGreater(len(paddings), 1)
+
+if __name__ == "__main__":
+    unittest.main()
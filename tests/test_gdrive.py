@@ -0,0 +1,82 @@
+import asyncio
+import unittest
+
+from external_integrations.gdrive import (
+    DriveError, DriveFileTooLarge, DriveLink, GoogleDriveClient, parse_drive_link,
+)
+from tests.stub_drive_server import StubDriveServer
+
+FILE_ID = "1AbCdEfGhIjKlMnOpQrStUvWxYz"
+
+class ParseDriveLinkTest(unittest.TestCase):
+    def test_common_link_forms(self):
+        for link in (
+            f"https://drive.google.com/file/d/{FILE_ID}/view?usp=sharing",
+            f"https://drive.google.com/file/u/0/d/{FILE_ID}/view",
+            f"https://drive.google.com/open?id={FILE_ID}",
+            f"https://drive.google.com/uc?id={FILE_ID}&export=download",
+            f"  {FILE_ID}  ",
+        ):
+            self.assertEqual(parse_drive_link(link), DriveLink(FILE_ID), link)
+        self.assertEqual(
+            parse_drive_link(f"https://docs.google.com/document/d/{FILE_ID}/edit"),
+            DriveLink(FILE_ID, is_document=True),
+        )
+
+    def test_rejects_other_links(self):
+        for link in ("https://example.com/file/d/1AbCdEfGhIjK/view", "https://drive.google.com/drive/my-drive", "", None):
+            with self.assertRaises(DriveError):
+                parse_drive_link(link)
+
+class GoogleDriveClientTest(unittest.TestCase):
+    def setUp(self):
+        self.server = StubDriveServer().start()
+        self.addCleanup(self.server.stop)
+
+    def download(self, *links, **kwargs):
+        client = GoogleDriveClient(drive_url=self.server.base_url, docs_url=self.server.base_url, **kwargs)
+
+        async def run():
+            try:
+                return [await client.download(link) for link in links]
+            finally:
+                await client.aclose()
+        return client, asyncio.run(run())
+
+    def test_follows_redirect_to_file(self):
+        self.server.add_file(FILE_ID, b"%PDF-1.4 resume")
+        _, (drive_file,) = self.download(f"https://drive.google.com/file/d/{FILE_ID}/view")
+        self.assertEqual(drive_file.content, b"%PDF-1.4 resume")
+        self.assertTrue(drive_file.etag)
+
+    def test_confirms_virus_scan_warning(self):
+        self.server.add_file(FILE_ID, b"%PDF-1.4 large resume", confirm=True)
+        _, (drive_file,) = self.download(FILE_ID)
+        self.assertEqual(drive_file.content, b"%PDF-1.4 large resume")
+        path, query, _ = self.server.requests[-1]
+        self.assertEqual((path, query["confirm"], query["uuid"]), ("/download", "t0ken", "0f1e2d3c"))
+
+    def test_revalidates_cached_file(self):
+        self.server.add_file(FILE_ID, b"%PDF-1.4 resume")
+        client, (first, second) = self.download(FILE_ID, FILE_ID)
+        self.assertEqual(first, second)
+        self.assertEqual((client.downloads, client.revalidated), (1, 1))
+        _, _, headers = self.server.requests[-1]
+        self.assertEqual(headers["If-None-Match"], first.etag)
+
+    def test_exports_google_docs_as_docx(self):
+        self.server.add_document(FILE_ID, b"PK\x03\x04 docx")
+        _, (drive_file,) = self.download(f"https://docs.google.com/document/d/{FILE_ID}/edit")
+        self.assertEqual(drive_file.content, b"PK\x03\x04 docx")
+
+    def test_size_limit(self):
+        self.server.add_file(FILE_ID, b"x" * 2048)
+        with self.assertRaises(DriveFileTooLarge):
+            self.download(FILE_ID, max_size=1024)
+
+    def test_missing_file(self):
+        with self.assertRaises(DriveError):
+            self.download(FILE_ID)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,88 @@
+import asyncio
+import hashlib
+import io
+import os
+import unittest
+import zipfile
+
+import docx
+
+from extraction import extract_text_from_docx
+from ingestion import ArchiveTooLarge, SpooledUpload, UnsupportedFormat, UploadTooLarge, expand_zip, ingest_upload
+
+class FakeUploadFile:
+    def __init__(self, content):
+        self._stream = io.BytesIO(content)
+        self.closed = False
+
+    async def read(self, size=-1):
+        return self._stream.read(size)
+
+    async def close(self):
+        self.closed = True
+
+def make_docx(text):
+    document = docx.Document()
+    document.add_paragraph(text)
+    buffer = io.BytesIO()
+    document.save(buffer)
+    return buffer.getvalue()
+
+class IngestUploadTest(unittest.TestCase):
+    def ingest(self, content, max_size=1024 * 1024, spool_size=1024 * 1024):
+        file = FakeUploadFile(content)
+        upload = asyncio.run(ingest_upload(file, max_size=max_size, spool_size=spool_size, chunk_size=1024))
+        self.assertTrue(file.closed)
+        return upload
+
+    def test_docx_in_memory(self):
+        content = make_docx("Jane Doe")
+        upload = self.ingest(content)
+        try:
+            self.assertEqual(upload.file_type, "docx")
+            self.assertEqual(upload.digest, hashlib.sha256(content).hexdigest())
+            self.assertIsNone(upload.path)
+            self.assertEqual(extract_text_from_docx(upload.payload()), extract_text_from_docx(content))
+        finally:
+            upload.close()
+
+    def test_spills_to_disk_above_spool_size(self):
+        content = make_docx("Jane Doe")
+        upload = self.ingest(content, spool_size=2048)
+        path = upload.path
+        self.assertTrue(os.path.exists(path))
+        self.assertEqual(extract_text_from_docx(upload.payload()), extract_text_from_docx(content))
+        upload.close()
+        self.assertFalse(os.path.exists(path))
+
+    def test_sniffs_pdf_regardless_of_name(self):
+        upload = self.ingest(b"%PDF-1.4\n%%EOF")
+        self.assertEqual(upload.file_type, "pdf")
+        upload.close()
+
+    def test_rejects_unknown_and_oversized_content(self):
+        with self.assertRaises(UnsupportedFormat):
+            self.ingest(b"PK\x03\x04 not really a zip")
+        with self.assertRaises(UploadTooLarge):
+            self.ingest(b"%PDF-" + b"0" * 4096, max_size=4096)
+
+class ExpandZipTest(unittest.TestCase):
+    def archive(self, members):
+        buffer = io.BytesIO()
+        with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as archive:
+            for name, content in members:
+                archive.writestr(name, content)
+        upload = SpooledUpload(max_size=1024 * 1024, spool_size=1024 * 1024)
+        upload.write(buffer.getvalue())
+        return upload
+
+    def test_caps_total_inflated_size(self):
+        # Each file is under the per-file limit, together they are not
+        members = [(f"{number}.pdf", b"%PDF-" + b"0" * 3000) for number in range(4)]
+        items = expand_zip(self.archive(members), max_size=4096, spool_size=4096, max_members=10, max_total=12_100)
+        self.assertEqual([upload.file_type for _, upload in items], ["pdf"] * 4)
+        with self.assertRaises(ArchiveTooLarge):
+            expand_zip(self.archive(members), max_size=4096, spool_size=4096, max_members=10, max_total=10_000)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,104 @@
+import asyncio
+import unittest
+
+from jobs import InProcessJobQueue, JobFailed, JobWorkerPool, RedisJobQueue
+
+try:
+    import fakeredis
+except ImportError:
+    fakeredis = None
+
+class JobWorkerPoolTest(unittest.TestCase):
+    def run_jobs(self, queue, handler, payloads, wait=0.3):
+        async def run():
+            ids = [await queue.enqueue({"n": n}, payload) for n, payload in enumerate(payloads)]
+            workers = JobWorkerPool(queue, handler, concurrency=2, poll_interval=0.01)
+            workers.start()
+            await asyncio.sleep(wait)
+            await workers.stop()
+            return ids, [await queue.get_status(job_id) for job_id in ids], workers.stats(), await queue.metrics()
+        return asyncio.run(run())
+
+    def test_completes_jobs(self):
+        async def handler(job):
+            return {"length": len(job.payload)}
+
+        ids, statuses, stats, metrics = self.run_jobs(InProcessJobQueue(), handler, [b"a", b"bb"])
+        self.assertEqual([status["result"] for status in statuses], [{"length": 1}, {"length": 2}])
+        self.assertEqual(stats["processed"], 2)
+        self.assertEqual(metrics["depth"], 0)
+
+    def test_retries_until_max_attempts(self):
+        async def handler(job):
+            raise RuntimeError("flaky")
+
+        _, statuses, stats, _ = self.run_jobs(InProcessJobQueue(max_attempts=3), handler, [b"a"])
+        self.assertEqual(statuses[0]["status"], "failed")
+        self.assertEqual(statuses[0]["attempts"], 3)
+        self.assertEqual((stats["retried"], stats["failed"]), (2, 1))
+
+    def test_permanent_failure_is_not_retried(self):
+        async def handler(job):
+            raise JobFailed({"status_code": 400, "detail": "bad file"})
+
+        _, statuses, _, _ = self.run_jobs(InProcessJobQueue(), handler, [b"a"])
+        self.assertEqual(statuses[0]["attempts"], 1)
+        self.assertEqual(statuses[0]["error"]["detail"], "bad file")
+
+    def test_expired_visibility_timeout_requeues(self):
+        queue = InProcessJobQueue(visibility_timeout=0.05)
+
+        async def run():
+            job_id = await queue.enqueue({}, b"a")
+            first = await queue.reserve()
+            self.assertIsNone(await queue.reserve())
+            await asyncio.sleep(0.1)
+            self.assertEqual(await queue.requeue_expired(), 1)
+            second = await queue.reserve()
+            return job_id, first, second
+
+        job_id, first, second = asyncio.run(run())
+        self.assertEqual((first.id, second.id), (job_id, job_id))
+        self.assertEqual(second.attempts, 2)
+
+class LateCompletionTest(unittest.TestCase):
+    """A job requeued after its visibility timeout whose first worker then finishes it."""
+
+    def late_completion(self, queue):
+        async def run():
+            job_id = await queue.enqueue({"file_type": "pdf"}, b"a")
+            first = await queue.reserve()
+            await asyncio.sleep(0.1)
+            self.assertEqual(await queue.requeue_expired(), 1)
+            await queue.complete(first, {"analysis_id": job_id})
+            # The requeued id is still pending but must not be handed out again
+            return job_id, await queue.reserve(), await queue.get_status(job_id)
+
+        return asyncio.run(run())
+
+    def test_in_process_queue(self):
+        job_id, again, status = self.late_completion(InProcessJobQueue(visibility_timeout=0.05))
+        self.assertIsNone(again)
+        self.assertEqual((status["status"], status["result"]), ("done", {"analysis_id": job_id}))
+
+    @unittest.skipIf(fakeredis is None, "fakeredis is not installed")
+    def test_redis_queue(self):
+        queue = RedisJobQueue(None, visibility_timeout=0.05, client=fakeredis.FakeAsyncRedis())
+        job_id, again, status = self.late_completion(queue)
+        self.assertIsNone(again)
+        self.assertEqual((status["status"], status["result"], status["attempts"]), ("done", {"analysis_id": job_id}, 1))
+
+    @unittest.skipIf(fakeredis is None, "fakeredis is not installed")
+    def test_redis_queue_skips_expired_jobs(self):
+        queue = RedisJobQueue(None, client=fakeredis.FakeAsyncRedis())
+
+        async def run():
+            job_id = await queue.enqueue({"file_type": "pdf"}, b"a")
+            # The job's status expired (result_ttl) while its id was still pending
+            await queue.redis.delete(queue.job_prefix + job_id)
+            return await queue.reserve(), await queue.redis.exists(queue.job_prefix + job_id)
+
+        self.assertEqual(asyncio.run(run()), (None, 0))
+
+if __name__ == "__main__":
+    unittest.main()
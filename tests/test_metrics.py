@@ -0,0 +1,36 @@
+import asyncio
+import unittest
+
+from metrics import REQUEST_SECONDS, REQUESTS_IN_FLIGHT, RequestMetricsMiddleware
+
+def sample(metric, name, **labels):
+    for collected in metric.collect():
+        for s in collected.samples:
+            if s.name == name and s.labels == labels:
+                return s.value
+    return 0.0
+
+class RequestMetricsMiddlewareTest(unittest.TestCase):
+    def test_tracks_requests_until_the_response_ends(self):
+        seen_in_flight = []
+
+        async def app(scope, receive, send):
+            seen_in_flight.append(sample(REQUESTS_IN_FLIGHT, "resume_requests_in_flight", endpoint=scope["path"]))
+            await send({"type": "http.response.start", "status": 200, "headers": []})
+            await send({"type": "http.response.body", "body": b""})
+
+        async def send(message):
+            pass
+
+        middleware = RequestMetricsMiddleware(app, endpoints={"/tracked"})
+        before = sample(REQUEST_SECONDS, "resume_request_duration_seconds_count", endpoint="/tracked")
+        asyncio.run(middleware({"type": "http", "path": "/tracked"}, None, send))
+        asyncio.run(middleware({"type": "http", "path": "/other"}, None, send))
+
+        self.assertEqual(seen_in_flight[0], 1.0)
+        self.assertEqual(sample(REQUESTS_IN_FLIGHT, "resume_requests_in_flight", endpoint="/tracked"), 0.0)
+        self.assertEqual(sample(REQUEST_SECONDS, "resume_request_duration_seconds_count", endpoint="/tracked"), before + 1)
+        self.assertEqual(sample(REQUEST_SECONDS, "resume_request_duration_seconds_count", endpoint="/other"), 0.0)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,69 @@
+import asyncio
+import unittest
+
+from benchmarks.corpus import make_pdf
+from extraction import ExtractionPool
+from ocr import OcrPool
+
+class FakeOcrPool(OcrPool):
+    """OcrPool with a canned page reader in place of pdftoppm and tesseract."""
+
+    def __init__(self, delay=0.0, **kwargs):
+        super().__init__(**kwargs)
+        self.pdftoppm = self.tesseract = "/bin/true"
+        self.delay = delay
+        self.calls = []
+
+    async def recognize_page(self, path, number):
+        self.calls.append(number)
+        await asyncio.sleep(self.delay)
+        return f"  Scanned page {number + 1}\n"
+
+def extract(pool, content, times=1):
+    async def run():
+        return [await pool.extract("pdf", content) for _ in range(times)]
+
+    try:
+        return asyncio.run(run())
+    finally:
+        pool.shutdown()
+
+class OcrFallbackTest(unittest.TestCase):
+    def test_image_pages_are_ocred_and_recorded(self):
+        ocr = FakeOcrPool()
+        result, = extract(ExtractionPool(kind="thread", max_workers=2, ocr=ocr), make_pdf(8))
+        self.assertEqual(result.ocr_pages, (6,))
+        self.assertEqual(result.page_results[6].status, "ocr")
+        self.assertIn("Scanned page 7\n", result.text)
+        self.assertFalse(result.failed)
+
+    def test_cached_by_page_digest(self):
+        ocr = FakeOcrPool()
+        first, second = extract(ExtractionPool(kind="thread", max_workers=2, ocr=ocr), make_pdf(8), times=2)
+        self.assertEqual(ocr.calls, [6])
+        self.assertEqual(first.text, second.text)
+        self.assertEqual(second.ocr_pages, (6,))
+
+    def test_page_and_time_budgets(self):
+        # Image pages are 7 and 14; only the first fits the page budget
+        ocr = FakeOcrPool(max_pages=1)
+        result, = extract(ExtractionPool(kind="thread", max_workers=2, ocr=ocr), make_pdf(14))
+        self.assertEqual(result.ocr_pages, (6,))
+        self.assertEqual(result.page_results[13].status, "image")
+
+        slow = FakeOcrPool(delay=5, timeout=0.1)
+        result, = extract(ExtractionPool(kind="thread", max_workers=2, ocr=slow), make_pdf(8))
+        self.assertEqual(result.ocr_pages, ())
+        self.assertEqual(result.page_results[6].status, "image")
+
+    def test_disabled_without_engines(self):
+        ocr = OcrPool(pdftoppm="no-such-pdftoppm")
+        self.assertFalse(ocr.enabled)
+        result, = extract(ExtractionPool(kind="thread", max_workers=1, ocr=ocr), make_pdf(8))
+        self.assertEqual(result.ocr_pages, ())
+        # Nothing will read the image page, so it is not hashed either
+        self.assertEqual(result.page_results[6].status, "image")
+        self.assertIsNone(result.page_results[6].digest)
+
+if __name__ == "__main__":
+    unittest.main()
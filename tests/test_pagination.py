@@ -0,0 +1,37 @@
+import json
+import unittest
+import uuid
+from datetime import datetime
+
+from bson import Binary, ObjectId
+
+from pagination import InvalidCursor, decode_cursor, encode_cursor, keyset_filter, stream_json_array
+
+class CursorTest(unittest.TestCase):
+    def test_round_trips_bson_values(self):
+        timestamp = datetime(2024, 5, 1, 12, 30, 15, 123000)
+        for _id in (ObjectId(), Binary.from_uuid(uuid.uuid4())):
+            cursor = encode_cursor({"timestamp": timestamp, "_id": _id, "roast": "ignored"})
+            self.assertEqual(decode_cursor(cursor), [timestamp, _id])
+
+    def test_rejects_garbage(self):
+        for cursor in ("not a cursor", "bm9wZQ", encode_cursor({"a": 1}, fields=("a",))):
+            with self.assertRaises(InvalidCursor):
+                decode_cursor(cursor)
+
+    def test_keyset_filter_breaks_ties_on_later_fields(self):
+        self.assertEqual(keyset_filter([5, 9]), {"$or": [
+            {"timestamp": {"$lt": 5}},
+            {"timestamp": 5, "_id": {"$lt": 9}},
+        ]})
+
+class StreamJsonArrayTest(unittest.TestCase):
+    def test_encodes_a_valid_array_in_chunks(self):
+        items = [{"id": str(n), "timestamp": datetime(2024, 1, 1)} for n in range(5)]
+        chunks = list(stream_json_array(iter(items), chunk_size=2))
+        self.assertEqual(json.loads("".join(chunks)), [{"id": str(n), "timestamp": "2024-01-01T00:00:00"} for n in range(5)])
+        self.assertEqual(len(chunks), 4)
+        self.assertEqual("".join(stream_json_array([])), "[]")
+
+if __name__ == "__main__":
+    unittest.main()
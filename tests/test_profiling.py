@@ -0,0 +1,80 @@
+import asyncio
+import time
+import unittest
+
+from metrics import stage
+from profiling import ProfilingMiddleware, RequestProfiler, folded
+
+class RecordingLogger:
+    def __init__(self):
+        self.events = []
+
+    def info(self, event, **fields):
+        self.events.append((event, fields))
+
+def busy(seconds):
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        pass
+
+async def app(scope, receive, send):
+    with stage("extract"):
+        busy(0.05 if scope["path"] == "/slow" else 0.001)
+    with stage("roast"):
+        await asyncio.sleep(0)
+    await send({"type": "http.response.start", "status": 201, "headers": []})
+    await send({"type": "http.response.body", "body": b""})
+
+async def send(message):
+    pass
+
+class ProfilingMiddlewareTest(unittest.TestCase):
+    def setUp(self):
+        self.profiler = RequestProfiler(slow_seconds=0.02, interval=0.001)
+        self.logger = RecordingLogger()
+        self.middleware = ProfilingMiddleware(app, {"/fast", "/slow"}, self.profiler, logger=self.logger)
+
+    def request(self, path):
+        async def run():
+            await self.middleware({"type": "http", "method": "POST", "path": path}, None, send)
+            # Past the slow threshold, to check a finished request's deadline was dropped
+            await asyncio.sleep(0.03)
+        asyncio.run(run())
+
+    def test_logs_stage_timings(self):
+        self.request("/fast")
+        event, fields = self.logger.events[0]
+        self.assertEqual(event, "request")
+        self.assertEqual(fields["status"], 201)
+        self.assertEqual(set(fields["stages_ms"]), {"extract", "roast"})
+        self.assertIsNone(fields["profiled"])
+        self.assertEqual(list(self.profiler.profiles), [])
+        self.assertEqual(self.profiler.sampler.sampling, 0)
+
+    def test_profiles_slow_requests(self):
+        self.request("/slow")
+        profile, = self.profiler.profiles
+        self.assertEqual(profile.reason, "slow")
+        self.assertGreater(sum(profile.stacks.values()), 0)
+        self.assertTrue(any("busy (test_profiling.py" in stack for stack in profile.stacks))
+        self.assertEqual(self.logger.events[0][1]["profiled"], "slow")
+
+    def test_armed_requests_are_profiled_from_the_start(self):
+        self.profiler.arm(1)
+        self.request("/fast")
+        self.request("/fast")
+        self.assertEqual([profile.reason for profile in self.profiler.profiles], ["requested"])
+        self.assertEqual(self.profiler.armed, 0)
+        self.assertEqual(self.profiler.select("requested", -1), list(self.profiler.profiles))
+        self.assertEqual(self.profiler.select("slow"), [])
+
+    def test_other_paths_pass_through(self):
+        self.request("/other")
+        self.assertEqual(self.logger.events, [])
+
+class FoldedTest(unittest.TestCase):
+    def test_folded_format(self):
+        self.assertEqual(folded({"a;b": 2, "a": 1}), "a 1\na;b 2\n")
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,126 @@
+import asyncio
+import os
+import tempfile
+import unittest
+from datetime import datetime, timedelta
+
+from retention import DAY, Archiver, RetentionPolicy, archive_files, expire_texts, restore
+from storage import AnalysisStore, MessageCatalog
+from tests.fakes import MemoryDatabase, analysis
+
+NOW = datetime(2026, 10, 1, 12)
+
+def aged(number, age_days):
+    return analysis(number, NOW - timedelta(days=age_days))
+
+class IndexRecorder:
+    """Records the TTL indexes created on each collection."""
+
+    def __init__(self):
+        self.ttls = {}
+
+    def __getitem__(self, name):
+        recorder = self
+
+        class Collection:
+            async def create_index(self, keys, name=None, expireAfterSeconds=None):
+                recorder.ttls[collection] = expireAfterSeconds
+
+            async def drop_index(self, name):
+                recorder.ttls.pop(collection, None)
+
+        collection = name
+        return Collection()
+
+class CountingStore(AnalysisStore):
+    """An AnalysisStore counting GridFS uploads and deletes (GridFS itself is not emulated)."""
+
+    spilled = 0
+    deleted = ()
+
+    async def spill_text(self, document):
+        self.spilled += 1
+        return document
+
+    @property
+    def gridfs(self):
+        store = self
+
+        class Bucket:
+            async def delete(self, file_id):
+                store.deleted += (file_id,)
+                await store.db["resume_texts.files"].delete_many({"_id": file_id})
+
+        return Bucket()
+
+class RetentionPolicyTest(unittest.TestCase):
+    def test_defaults_keep_everything(self):
+        self.assertEqual(RetentionPolicy.from_env().retention, {})
+
+    def test_dependent_collections_expire_with_analyses(self):
+        db = IndexRecorder()
+        asyncio.run(RetentionPolicy({"resume_analyses": 30 * DAY}, archive_dir="/archive", grace=DAY).ensure_indexes(db))
+        self.assertEqual(db.ttls, {"resume_analyses": 31 * DAY, "resume_signatures": 31 * DAY, "extracted_texts": 31 * DAY})
+
+    def test_expire_texts(self):
+        async def scenario():
+            db = MemoryDatabase()
+            store = CountingStore(db, MessageCatalog({}))
+            for number, age in enumerate([40, 31, 20]):
+                await db["resume_texts.files"].insert_one({"_id": number, "uploadDate": NOW - timedelta(days=age)})
+            policy = RetentionPolicy({"resume_analyses": 30 * DAY})
+            return await expire_texts(store, policy, now=NOW, batch_size=1, pause=0), store.deleted
+
+        self.assertEqual(asyncio.run(scenario()), (2, (0, 1)))
+
+    def test_ttl_waits_for_the_archiver(self):
+        policy = RetentionPolicy({"resume_analyses": 30 * DAY, "status_checks": 0})
+        self.assertEqual(policy.ttl_seconds("resume_analyses"), 30 * DAY)
+        self.assertEqual(policy.ttl_seconds("status_checks"), 0)
+        self.assertIsNone(policy.cutoff("status_checks"))
+        archived = RetentionPolicy({"resume_analyses": 30 * DAY}, archive_dir="/archive", grace=DAY)
+        self.assertEqual(archived.ttl_seconds("resume_analyses"), 31 * DAY)
+
+class ArchiverTest(unittest.TestCase):
+    def test_archive_and_restore(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+
+        async def scenario():
+            db = MemoryDatabase()
+            store = AnalysisStore(db, MessageCatalog({}))
+            for number, age in enumerate([40, 40, 35, 10, 1]):
+                await store.save(aged(number, age))
+                await db.resume_signatures.insert_one({"_id": aged(number, age)["id"]})
+            await store.writer.flush()
+            await db.status_checks.insert_one({"client_name": "probe", "timestamp": NOW - timedelta(days=100)})
+            policy = RetentionPolicy({"resume_analyses": 30 * DAY, "status_checks": 90 * DAY}, archive_dir=directory.name)
+            archiver = Archiver(db, store, policy, batch_size=2, pause=0)
+            counts = await archiver.run_once(now=NOW)
+            remaining = sorted(item["id"] for item in (await store.list_page(10))[0])
+            signatures = sorted(db.resume_signatures.documents)
+
+            restored = MemoryDatabase()
+            restored_store = CountingStore(restored, MessageCatalog({}))
+            count = await restore(restored, restored_store, [directory.name], batch_size=2)
+            spilled = restored_store.spilled
+            # Restoring twice skips what is already there, before touching GridFS
+            await restore(restored, restored_store, [directory.name], batch_size=2)
+            self.assertEqual(restored_store.spilled, spilled)
+            back = await restored_store.get(aged(2, 35)["id"], include_text=True)
+            return counts, remaining, signatures, count, back, restored
+
+        counts, remaining, signatures, count, back, restored = asyncio.run(scenario())
+        self.assertEqual(counts, {"resume_analyses": 3, "status_checks": 1})
+        self.assertEqual(remaining, [aged(3, 10)["id"], aged(4, 1)["id"]])
+        self.assertEqual(signatures, remaining)
+        self.assertEqual(count, 4)
+        self.assertEqual(back["resume_text"], "Resume number 2")
+        self.assertEqual(back["timestamp"], NOW - timedelta(days=35))
+        self.assertEqual(len(restored.resume_analyses.documents), 3)
+        self.assertEqual(len(restored.status_checks.documents), 1)
+        days = sorted(os.path.basename(os.path.dirname(path)) for path in archive_files([directory.name]))
+        self.assertEqual(days, ["2026-06-23", "2026-08-22", "2026-08-27"])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,113 @@
+import asyncio
+import time
+import unittest
+
+from roast_engines import LLMRoastEngine, LocalRoastEngine, SectionSplitter, truncate_to_token_budget
+from tests.stub_llm_server import StubLLMServer
+
+def local_generator(resume_text):
+    return "local roast", "local review"
+
+class LLMRoastEngineTest(unittest.TestCase):
+    def start_server(self, **kwargs):
+        server = StubLLMServer(**kwargs).start()
+        self.addCleanup(server.stop)
+        return server
+
+    def make_engine(self, server, **kwargs):
+        return LLMRoastEngine(base_url=server.base_url, model="stub", fallback=LocalRoastEngine(local_generator), **kwargs)
+
+    def run_engine(self, engine, *texts):
+        async def run():
+            try:
+                return await asyncio.gather(*(engine.generate(text) for text in texts))
+            finally:
+                await engine.aclose()
+        results = asyncio.run(run())
+        return results if len(results) > 1 else results[0]
+
+    def test_returns_model_output(self):
+        server = self.start_server()
+        engine = self.make_engine(server)
+        result = self.run_engine(engine, "Jane Doe, engineer")
+        self.assertEqual(result.engine, "llm")
+        self.assertIn("beehive", result.roast)
+        self.assertEqual(server.requests[0]["messages"][1]["content"], "Jane Doe, engineer")
+
+    def test_slow_model_falls_back_to_local(self):
+        server = self.start_server(delay=2)
+        engine = self.make_engine(server, timeout=0.2)
+        started = time.monotonic()
+        result = self.run_engine(engine, "Jane Doe")
+        self.assertLess(time.monotonic() - started, 1.5)
+        self.assertEqual(result, ("local roast", "local review", "local"))
+        self.assertEqual(engine.fallbacks, 1)
+
+    def test_unparseable_reply_falls_back_to_local(self):
+        server = self.start_server(content="I refuse to answer in JSON")
+        engine = self.make_engine(server)
+        result = self.run_engine(engine, "Jane Doe")
+        self.assertEqual(result.engine, "local")
+
+    def test_identical_prompts_are_coalesced(self):
+        server = self.start_server(delay=0.3)
+        engine = self.make_engine(server)
+        results = self.run_engine(engine, *["Same resume"] * 5)
+        self.assertEqual(len(server.requests), 1)
+        self.assertEqual(engine.coalesced, 4)
+        self.assertTrue(all(result.engine == "llm" for result in results))
+
+    def test_concurrency_is_bounded(self):
+        server = self.start_server(delay=0.3)
+        engine = self.make_engine(server, max_concurrency=2, timeout=0.5)
+        results = self.run_engine(engine, *(f"Resume {i}" for i in range(4)))
+        # Two calls fit in the timeout; the other two wait on the semaphore and fall back
+        self.assertEqual(sorted(result.engine for result in results), ["llm", "llm", "local", "local"])
+
+    def collect_stream(self, engine, text):
+        async def run():
+            try:
+                return [chunk async for chunk in engine.stream(text)]
+            finally:
+                await engine.aclose()
+        return asyncio.run(run())
+
+    def test_stream_splits_sections(self):
+        server = self.start_server()
+        engine = self.make_engine(server)
+        chunks = self.collect_stream(engine, "Jane Doe")
+        self.assertTrue(server.requests[0]["stream"])
+        self.assertGreater(len(chunks), 2)
+        roast = "".join(chunk.text for chunk in chunks if chunk.section == "roast")
+        review = "".join(chunk.text for chunk in chunks if chunk.section == "review")
+        self.assertEqual(roast, "Your resume has more buzzwords than a beehive.\n\nEven your hobbies sound like KPIs.")
+        self.assertEqual(review, "Quantify your achievements.")
+
+    def test_stream_falls_back_before_first_chunk(self):
+        server = self.start_server(delay=2)
+        engine = self.make_engine(server, timeout=0.2)
+        chunks = self.collect_stream(engine, "Jane Doe")
+        self.assertEqual([(chunk.section, chunk.engine) for chunk in chunks], [("roast", "local"), ("review", "local")])
+
+class SectionSplitterTest(unittest.TestCase):
+    def test_markers_split_across_deltas(self):
+        splitter = SectionSplitter()
+        chunks = []
+        for delta in ["pre", "amble ##", "# RO", "AST\nfunny", " bit\n#", "## REVIEW\n", "serious"]:
+            chunks += splitter.feed(delta)
+        chunks += splitter.close()
+        joined = {}
+        for section, text in chunks:
+            joined[section] = joined.get(section, "") + text
+        self.assertEqual(joined, {"roast": "funny bit", "review": "serious"})
+
+class TruncateTest(unittest.TestCase):
+    def test_truncates_on_whitespace(self):
+        text = "word " * 100
+        truncated = truncate_to_token_budget(text, 10)
+        self.assertLessEqual(len(truncated), 40)
+        self.assertTrue(truncated.endswith("word"))
+        self.assertEqual(truncate_to_token_budget("short", 10), "short")
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,95 @@
+import asyncio
+import unittest
+from datetime import datetime
+
+from features import FeatureExtractor
+from rollups import Rollups, day_range
+from storage import AnalysisStore, MessageCatalog
+from tests.fakes import MemoryDatabase, analysis
+from text_scan import TextScanner
+
+DAY_ONE = datetime(2026, 10, 1, 9)
+DAY_TWO = datetime(2026, 10, 2, 9)
+TEXTS = [
+    (DAY_ONE, "pdf", "A synergy driven team player with synergy"),
+    (DAY_ONE, "docx", "Shipped the billing service"),
+    (DAY_TWO, "pdf", "Team player"),
+]
+
+class RollupsTest(unittest.TestCase):
+    def setUp(self):
+        self.scanner = TextScanner(["synergy", "team player"])
+
+    def test_records_flushes_and_reads(self):
+        async def scenario():
+            rollups = Rollups(MemoryDatabase(), self.scanner)
+            for timestamp, file_type, text in TEXTS:
+                rollups.record_extraction(timestamp, file_type, "ok")
+                rollups.record_analysis(timestamp, file_type, self.scanner.scan(text))
+            await rollups.flush()
+            rollups.record_extraction(DAY_TWO, "pdf", "failed")
+            await rollups.flush()
+            return await rollups.read("2026-10-01", "2026-10-02")
+
+        stats = asyncio.run(scenario())
+        first, second = stats["days"]
+        self.assertEqual(first["analyses"], 2)
+        self.assertEqual(first["average_words"], 5.5)
+        self.assertEqual(first["file_types"], {"pdf": 1, "docx": 1})
+        self.assertEqual(second["extraction_failure_rate"], 0.5)
+        self.assertEqual(stats["totals"]["analyses"], 3)
+        self.assertEqual(stats["totals"]["extractions"], {"pdf": {"ok": 2, "failed": 1}, "docx": {"ok": 1}})
+        self.assertEqual(stats["top_buzzwords"], [
+            {"term": "synergy", "count": 2, "resumes": 1},
+            {"term": "team player", "count": 2, "resumes": 2},
+        ])
+
+    def test_backfill_matches_live_counts(self):
+        async def scenario():
+            db = MemoryDatabase()
+            store = AnalysisStore(db, MessageCatalog({}))
+            live = Rollups(MemoryDatabase(), self.scanner)
+            for number, (timestamp, file_type, text) in enumerate(TEXTS):
+                await store.save(analysis(number, timestamp, text, file_hash=f"hash{number}"))
+                await db.extracted_texts.insert_one({"_id": f"hash{number}", "file_type": file_type})
+                live.record_analysis(timestamp, file_type, self.scanner.scan(text))
+            await store.writer.flush()
+            await live.flush()
+            rollups = Rollups(db, self.scanner)
+            # Stale counters are replaced, extraction outcomes kept
+            await db.stats_daily.insert_one({"_id": "2026-10-01", "analyses": 7, "extractions": {"pdf": {"ok": 1}}})
+            count = await rollups.backfill(store, until=datetime(2026, 10, 3), batch_size=2, pause=0)
+            # Rerunning gives the same counts
+            await rollups.backfill(store, until=datetime(2026, 10, 3), batch_size=2, pause=0)
+            return count, await rollups.read("2026-10-01", "2026-10-02"), await live.read("2026-10-01", "2026-10-02")
+
+        count, backfilled, live = asyncio.run(scenario())
+        self.assertEqual(count, 3)
+        self.assertEqual(backfilled["top_buzzwords"], live["top_buzzwords"])
+        for rebuilt, recorded in zip(backfilled["days"], live["days"]):
+            self.assertEqual(
+                {key: rebuilt[key] for key in ("day", "analyses", "average_words", "average_buzzwords", "file_types")},
+                {key: recorded[key] for key in ("day", "analyses", "average_words", "average_buzzwords", "file_types")},
+            )
+        self.assertEqual(backfilled["days"][0]["extractions"], {"pdf": {"ok": 1}})
+
+    def test_features_count_like_a_scan(self):
+        extractor = FeatureExtractor(self.scanner)
+
+        async def record(stats):
+            rollups = Rollups(MemoryDatabase(), self.scanner)
+            for timestamp, file_type, text in TEXTS:
+                rollups.record_analysis(timestamp, file_type, stats(text))
+            await rollups.flush()
+            return await rollups.read("2026-10-01", "2026-10-02")
+
+        self.assertEqual(asyncio.run(record(extractor.extract)), asyncio.run(record(self.scanner.scan)))
+
+    def test_day_range(self):
+        self.assertEqual(day_range(until="2026-10-30"), ("2026-10-01", "2026-10-30"))
+        self.assertEqual(day_range("2026-09-01", "2026-09-02"), ("2026-09-01", "2026-09-02"))
+        with self.assertRaises(ValueError):
+            day_range("yesterday")
+
+if __name__ == "__main__":
+    unittest.main()
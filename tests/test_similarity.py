@@ -0,0 +1,171 @@
+import asyncio
+import random
+import unittest
+from datetime import datetime, timedelta
+
+from benchmarks.corpus import resume_lines
+from similarity import SimilarityIndex, choose_rows, estimate_similarity, minhash, shingle_hashes
+from storage import AnalysisStore, MessageCatalog
+from tests.fakes import MemoryDatabase, analysis
+
+def resume(seed, lines=120):
+    return "\n".join(resume_lines(random.Random(seed), lines))
+
+def edit(text, count, seed=0):
+    """`text` with `count` of its lines rewritten."""
+    rng = random.Random(seed)
+    lines = text.split("\n")
+    for _ in range(count):
+        lines[rng.randrange(len(lines))] = "volunteered at the local animal shelter on weekends"
+    return "\n".join(lines)
+
+def jaccard(a, b):
+    a, b = shingle_hashes(a), shingle_hashes(b)
+    return len(a & b) / len(a | b)
+
+class MinHashTest(unittest.TestCase):
+    def test_estimate_tracks_jaccard(self):
+        original = resume(1)
+        for count in (2, 10, 40):
+            edited = edit(original, count)
+            estimate = estimate_similarity(minhash(shingle_hashes(original)), minhash(shingle_hashes(edited)))
+            self.assertAlmostEqual(estimate, jaccard(original, edited), delta=0.12)
+
+    def test_signature_is_stable_and_densified(self):
+        hashes = shingle_hashes("one two three four five six seven eight")
+        signature = minhash(hashes)
+        self.assertEqual(signature, minhash(set(hashes)))
+        # Four shingles over 128 bins: every bin is filled by densification
+        self.assertEqual(len(signature), 128)
+        self.assertIsNone(minhash(set()))
+
+    def test_choose_rows(self):
+        self.assertEqual(choose_rows(128, 0.9), 8)
+        self.assertEqual(choose_rows(128, 0.8), 4)
+
+class SimilarityIndexTest(unittest.TestCase):
+    def setUp(self):
+        self.index = SimilarityIndex(MemoryDatabase(), threshold=0.9)
+        self.texts = [resume(seed) for seed in range(50)]
+        for number, text in enumerate(self.texts):
+            self.index.insert(str(number), self.index.signature(text), "3:local", datetime(2026, 10, 1) + timedelta(minutes=number))
+
+    def test_finds_lightly_edited_resume(self):
+        match = self.index.find(edit(self.texts[7], 2), "3:local")
+        self.assertEqual(match.analysis_id, "7")
+        self.assertGreaterEqual(match.similarity, 0.9)
+
+    def test_ignores_rewritten_resumes_and_other_versions(self):
+        self.assertIsNone(self.index.find(edit(self.texts[7], 40), "3:local"))
+        self.assertIsNone(self.index.find(self.texts[7], "2:local"))
+        self.assertIsNone(self.index.find(resume(1000), "3:local"))
+
+    def test_short_texts_are_not_indexed(self):
+        self.assertIsNone(self.index.signature("Jane Doe, engineer"))
+        self.assertIsNone(self.index.find("Jane Doe, engineer", "3:local"))
+
+    def test_discard(self):
+        self.index.discard("7")
+        self.assertIsNone(self.index.find(self.texts[7], "3:local"))
+
+    def test_disabled(self):
+        index = SimilarityIndex(threshold=0)
+        self.assertIsNone(index.find(self.texts[0], "3:local"))
+        self.assertEqual(index.stats()["entries"], 0)
+
+class PersistenceTest(unittest.TestCase):
+    def test_add_load_and_refresh(self):
+        async def scenario():
+            db = MemoryDatabase()
+            writer = SimilarityIndex(db)
+            reader = SimilarityIndex(db)
+            started = datetime(2026, 10, 1)
+            await writer.add("a", resume(1), "3:local", started)
+            self.assertEqual(await reader.refresh(), 1)
+            await writer.add("b", resume(2), "3:local", started + timedelta(seconds=1))
+            await reader.refresh()
+            return reader
+
+        reader = asyncio.run(scenario())
+        self.assertEqual(set(reader.entries), {"a", "b"})
+        self.assertEqual(reader.find(edit(resume(2), 1), "3:local").analysis_id, "b")
+
+    def test_refresh_drops_expired_signatures(self):
+        async def scenario():
+            db = MemoryDatabase()
+            writer = SimilarityIndex(db)
+            reader = SimilarityIndex(db)
+            started = datetime(2026, 10, 1)
+            await writer.add("a", resume(1), "3:local", started)
+            await writer.add("b", resume(2), "3:local", started + timedelta(days=1))
+            await reader.refresh(expired_before=started - timedelta(days=1))
+            loaded = set(reader.entries)
+            await reader.refresh(expired_before=started + timedelta(hours=1))
+            return loaded, reader
+
+        loaded, reader = asyncio.run(scenario())
+        self.assertEqual(loaded, {"a", "b"})
+        self.assertEqual(set(reader.entries), {"b"})
+        self.assertIsNone(reader.find(edit(resume(1), 1), "3:local"))
+        self.assertEqual(reader.stats()["expired"], 1)
+        self.assertFalse(any("a" in ids for buckets in reader.buckets for ids in buckets.values()))
+
+    def test_rebuild_from_stored_analyses(self):
+        async def scenario():
+            db = MemoryDatabase()
+            store = AnalysisStore(db, MessageCatalog({}))
+            ids = []
+            for seed in range(5):
+                document = analysis(seed, datetime(2026, 10, 1) + timedelta(minutes=seed), resume(seed))
+                ids.append(document["id"])
+                await store.save(document)
+            await store.close()
+            index = SimilarityIndex(db)
+            await db.resume_signatures.insert_one({"_id": "stale", "signature": b"", "timestamp": datetime(2026, 1, 1)})
+            count = await index.rebuild(store, batch_size=2)
+            reloaded = SimilarityIndex(db)
+            await reloaded.load()
+            return ids, count, index, reloaded
+
+        ids, count, index, reloaded = asyncio.run(scenario())
+        self.assertEqual(count, 5)
+        self.assertEqual(set(index.entries), set(ids))
+        self.assertEqual(set(reloaded.entries), set(ids))
+        self.assertEqual(reloaded.find(edit(resume(3), 1), "3:local").analysis_id, ids[3])
+
+class ReuseTest(unittest.TestCase):
+    """The API reuses a near-duplicate's analysis only when nothing the rules look at changed."""
+
+    def setUp(self):
+        import server
+
+        self.server = server
+        originals = server.analysis_store, server.similarity_index
+        db = MemoryDatabase()
+        server.analysis_store = AnalysisStore(db, MessageCatalog({**server.ROAST_MESSAGES, **server.REVIEW_MESSAGES}))
+        server.similarity_index = SimilarityIndex(db)
+        self.addCleanup(lambda: setattr(server, "analysis_store", originals[0]))
+        self.addCleanup(lambda: setattr(server, "similarity_index", originals[1]))
+
+    def test_changed_contact_details_are_analyzed_again(self):
+        server = self.server
+        text = resume(3, 60)
+        name, rest = text.split("\n", 1)
+
+        async def scenario():
+            response, resume_analysis = await server.analyze_text(text, "pdf")
+            await server.save_analysis(resume_analysis, response)
+            # One word of a bullet point reworded: the same features
+            reworded = await server.find_similar_analysis(text.replace("the mobile app", "the mobile apps", 1))
+            with_contact = f"{name}\nwei.patel@example.com | +1 (555) 123-4567\n{rest}"
+            self.assertIsNotNone(server.similarity_index.find(with_contact, server.ANALYSIS_KEY))
+            return response, reworded, await server.find_similar_analysis(with_contact), await server.analyze_text(with_contact, "pdf")
+
+        response, reworded, similar, (edited, _) = asyncio.run(scenario())
+        self.assertIn("No email, no phone number", response.roast)
+        self.assertEqual(reworded["id"], response.id)
+        self.assertIsNone(similar)
+        self.assertNotIn("No email, no phone number", edited.roast)
+
+if __name__ == "__main__":
+    unittest.main()
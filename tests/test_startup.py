@@ -0,0 +1,71 @@
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import unittest
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent / "backend"
+
+# Generous, so the test only catches real regressions like an eager heavy import
+IMPORT_TIME_BUDGET = float(os.environ.get("SERVER_IMPORT_BUDGET_SECONDS", "5"))
+
+IMPORT_PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import server
+elapsed = time.perf_counter() - start
+lazy = ("PyPDF2", "docx", "httpx", "redis", "gdown", "requests")
+print(json.dumps({"seconds": elapsed, "loaded": [name for name in lazy if name in sys.modules]}))
+"""
+
+class PingDB:
+    def __init__(self, reachable):
+        self.reachable = reachable
+
+    async def command(self, name):
+        if not self.reachable:
+            raise ConnectionError("no Mongo")
+        return {"ok": 1}
+
+class StartupTest(unittest.TestCase):
+    def test_import_is_fast_and_defers_heavy_modules(self):
+        output = subprocess.run(
+            [sys.executable, "-c", IMPORT_PROBE],
+            cwd=BACKEND_DIR, env={**os.environ, "PYTHONPATH": str(BACKEND_DIR)},
+            capture_output=True, text=True, check=True,
+        ).stdout
+        result = json.loads(output.strip().splitlines()[-1])
+        self.assertEqual(result["loaded"], [])
+        self.assertLess(result["seconds"], IMPORT_TIME_BUDGET)
+
+    def test_readiness_needs_warm_parsers_and_mongo(self):
+        import server
+        from extraction import ExtractionPool
+
+        original_db, original_pool = server.db, server.extraction_pool
+        server.extraction_pool = ExtractionPool(kind="thread", max_workers=1)
+        server.readiness["parsers"] = False
+
+        async def probe(reachable):
+            server.db = PingDB(reachable)
+            response = await server.readyz()
+            return response.status_code, json.loads(response.body)["checks"]
+
+        async def run():
+            before = await probe(True)
+            await server.warm_up()
+            return before, await probe(False), await probe(True)
+
+        try:
+            before, unreachable, ready = asyncio.run(run())
+        finally:
+            server.extraction_pool.shutdown()
+            server.db, server.extraction_pool = original_db, original_pool
+        self.assertEqual(before, (503, {"parsers": False, "mongo": True}))
+        self.assertEqual(unreachable, (503, {"parsers": True, "mongo": False}))
+        self.assertEqual(ready, (200, {"parsers": True, "mongo": True}))
+
+if __name__ == "__main__":
+    unittest.main()
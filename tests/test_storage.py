@@ -0,0 +1,137 @@
+import asyncio
+import unittest
+import uuid
+from datetime import datetime
+
+from storage import AnalysisStore, BatchWriter, MessageCatalog, compress_text, decompress_text
+
+CATALOG = MessageCatalog({
+    "roast.count": "You used {count} buzzwords.",
+    "roast.lines": "{lines} lines, {extra} too many. Yes, {lines}.",
+    "review.plain": "Add metrics (e.g. 10%).",
+})
+
+class FakeCollection:
+    def __init__(self, fail_times=0):
+        self.documents = []
+        self.batches = []
+        self.fail_times = fail_times
+
+    async def insert_many(self, documents, ordered=True):
+        if self.fail_times:
+            self.fail_times -= 1
+            raise ConnectionError("not connected")
+        self.batches.append(len(documents))
+        self.documents.extend(documents)
+
+    async def find_one(self, query, projection=None):
+        for document in self.documents:
+            if all(document.get(key) == value for key, value in query.items()):
+                return document
+        return None
+
+class FakeDB:
+    def __init__(self):
+        self.resume_analyses = FakeCollection()
+
+class MessageCatalogTest(unittest.TestCase):
+    def test_round_trips_templates_and_free_text(self):
+        text = "You used 7 buzzwords.\n\nSomething else entirely\n\n-3 lines, -13 too many. Yes, -3.\n\nAdd metrics (e.g. 10%)."
+        parts = CATALOG.encode(text)
+        self.assertEqual(parts, [
+            ["roast.count", {"count": 7}],
+            "Something else entirely",
+            ["roast.lines", {"lines": -3, "extra": -13}],
+            ["review.plain"],
+        ])
+        self.assertEqual(CATALOG.decode(parts), text)
+
+    def test_leaves_text_without_templates_alone(self):
+        self.assertIsNone(CATALOG.encode("You used many buzzwords."))
+        # A repeated field must repeat the same value
+        self.assertIsNone(CATALOG.encode("3 lines, -7 too many. Yes, 4."))
+        self.assertIsNone(CATALOG.encode("You used 007 buzzwords."))
+
+class CompressionTest(unittest.TestCase):
+    def test_zlib_round_trip(self):
+        text = "Résumé — team player " * 100
+        data = compress_text(text, "zlib")
+        self.assertLess(len(data), len(text))
+        self.assertEqual(decompress_text(data, "zlib"), text)
+
+class BatchWriterTest(unittest.TestCase):
+    def test_coalesces_writes_and_flushes_on_close(self):
+        async def run():
+            collection = FakeCollection()
+            writer = BatchWriter(collection, batch_size=3, max_latency=10)
+            for n in range(5):
+                await writer.submit({"_id": n})
+            await asyncio.sleep(0)
+            self.assertEqual(collection.batches, [3])
+            self.assertEqual(set(writer.pending), {3, 4})
+            await writer.close()
+            self.assertEqual(collection.batches, [3, 2])
+            self.assertEqual(writer.stats()["pending"], 0)
+
+        asyncio.run(run())
+
+    def test_writes_after_max_latency(self):
+        async def run():
+            collection = FakeCollection()
+            writer = BatchWriter(collection, batch_size=100, max_latency=0.01)
+            await writer.submit({"_id": 1})
+            await asyncio.sleep(0.05)
+            self.assertEqual(collection.batches, [1])
+
+        asyncio.run(run())
+
+    def test_retries_failed_batches(self):
+        async def run():
+            collection = FakeCollection(fail_times=1)
+            writer = BatchWriter(collection, batch_size=1, max_latency=10)
+            await writer.submit({"_id": 1})
+            await writer.flush()
+            self.assertEqual(collection.batches, [1])
+            self.assertEqual((writer.written, writer.failed), (1, 0))
+
+        asyncio.run(run())
+
+class AnalysisStoreTest(unittest.TestCase):
+    def test_saved_analysis_is_readable_before_and_after_flush(self):
+        async def run():
+            db = FakeDB()
+            store = AnalysisStore(db, CATALOG, codec="zlib", writer=BatchWriter(db.resume_analyses, max_latency=10))
+            analysis = {
+                "id": str(uuid.uuid4()),
+                "resume_text": "Python developer " * 50,
+                "roast": "You used 2 buzzwords.",
+                "review": "Add metrics (e.g. 10%).",
+                "file_hash": "abc",
+                "analysis_version": "2:local",
+                "timestamp": datetime(2024, 1, 1),
+            }
+            await store.save(analysis)
+            pending = await store.get(analysis["id"], include_text=True)
+            await store.close()
+            stored = db.resume_analyses.documents[0]
+            self.assertNotIn("roast", stored)
+            self.assertNotIn("resume_text", stored)
+            return pending, await store.get(analysis["id"], include_text=True), analysis
+
+        pending, written, analysis = asyncio.run(run())
+        self.assertEqual(pending, analysis)
+        self.assertEqual(written, analysis)
+
+    def test_reads_documents_from_before_the_compact_format(self):
+        async def run():
+            db = FakeDB()
+            db.resume_analyses.documents.append({
+                "id": "legacy-id", "resume_text": "text", "roast": "r", "review": "v", "timestamp": datetime(2024, 1, 1),
+            })
+            return await AnalysisStore(db, CATALOG, codec="zlib").get("legacy-id", include_text=True)
+
+        analysis = asyncio.run(run())
+        self.assertEqual((analysis["id"], analysis["roast"], analysis["resume_text"]), ("legacy-id", "r", "text"))
+
+if __name__ == "__main__":
+    unittest.main()
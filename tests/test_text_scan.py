@@ -0,0 +1,26 @@
+import unittest
+
+from text_scan import TextScanner
+
+class TextScannerTest(unittest.TestCase):
+    def setUp(self):
+        self.scanner = TextScanner(["leverage", "team player", "self-starter", "team"])
+
+    def test_counts_whole_word_occurrences(self):
+        stats = self.scanner.scan("Leverage, leveraged and LEVERAGE.\nA self starter and a Self-Starter.")
+        self.assertEqual(stats.term_counts, {"leverage": 2, "self-starter": 2})
+        self.assertEqual(stats.term_total, 4)
+
+    def test_overlapping_phrases_count_each_term(self):
+        stats = self.scanner.scan("Great team player on every team")
+        self.assertEqual(stats.term_counts, {"team": 2, "team player": 1})
+
+    def test_word_and_line_stats_match_str_split(self):
+        text = "First line here\n\n   \n• Second line\nthird"
+        stats = self.scanner.scan(text)
+        self.assertEqual(stats.word_count, len(text.split()))
+        self.assertEqual(stats.line_count, 5)
+        self.assertEqual(stats.non_empty_line_count, 3)
+
+if __name__ == "__main__":
+    unittest.main()